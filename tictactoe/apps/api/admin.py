@@ -15,8 +15,8 @@ class GameRoomAdmin(admin.ModelAdmin):
 @admin.register(PlayedGame)
 class PlayedGameAdmin(admin.ModelAdmin):
     """Admin interface for managing played games."""
-    list_display = ('code', 'winner', 'player_x', 'player_o', 'is_finished', 'created_at')
-    list_filter = ('is_finished', 'created_at')
+    list_display = ('code', 'winner', 'result', 'player_x', 'player_o', 'is_finished', 'created_at')
+    list_filter = ('is_finished', 'result', 'created_at')
     search_fields = ('code', 'winner__username', 'player_x__username', 'player_o__username')
     ordering = ('-created_at',)
     readonly_fields = ('code', 'created_at')
@@ -0,0 +1,43 @@
+"""
+Pairing of queued players for the matchmaking sweep.
+
+Kept free of Redis and the ORM: the sweep reads the whole skill sorted queue once, pairs it here
+and removes the pairs in one script call (see take_pairs in apps.utils.redis_scripts).
+
+The skill range a player accepts widens with the time they have waited, up to a cap, so a player
+at either end of the rating scale is matched after a bounded wait instead of being rescanned by
+every sweep. Two players are compatible when the one who has waited longer accepts the other.
+The pair script applies the same rule on enqueue.
+"""
+
+from collections import namedtuple
+
+SkillWindow = namedtuple('SkillWindow', ('base', 'growth', 'cap'))
+
+# 100 points when joining, 20 more per second waited, at most 1000 (reached after 45 seconds)
+SKILL_WINDOW = SkillWindow(base=100, growth=20, cap=1000)
+
+
+def skill_range(waited, window=SKILL_WINDOW):
+    """ Largest skill difference accepted by a player who has waited this many seconds. """
+    return min(window.base + window.growth * max(0, waited), window.cap)
+
+
+def pair_players(players, now, window=SKILL_WINDOW):
+    """
+    Greedily pairs neighbours of players, a list of (player_id, skill, joined) sorted by skill,
+    joined being the enqueue time in seconds (None if unknown, counted as now). Only neighbours are
+    compared, so a player whose widened window reaches past the next player is left for a later
+    sweep or enqueue rather than searched for. Returns the index pairs into players.
+    """
+    pairs = []
+    index = 0
+    while index < len(players) - 1:
+        (_, skill_1, joined_1), (_, skill_2, joined_2) = players[index], players[index + 1]
+        longest_wait = now - min(now if joined_1 is None else joined_1, now if joined_2 is None else joined_2)
+        if skill_2 - skill_1 <= skill_range(longest_wait, window):
+            pairs.append((index, index + 1))
+            index += 2
+        else:
+            index += 1
+    return pairs
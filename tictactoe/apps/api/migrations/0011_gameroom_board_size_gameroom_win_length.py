@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:29
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_alter_gameroom_options_alter_playedgame_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameroom',
+            name='board_size',
+            field=models.PositiveSmallIntegerField(default=3, help_text='Number of rows and columns of the board.', validators=[django.core.validators.MinValueValidator(3), django.core.validators.MaxValueValidator(15)]),
+        ),
+        migrations.AddField(
+            model_name='gameroom',
+            name='win_length',
+            field=models.PositiveSmallIntegerField(default=3, help_text='Marks in a row needed to win.', validators=[django.core.validators.MinValueValidator(3), django.core.validators.MaxValueValidator(15)]),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_gameroom_board_size_gameroom_win_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playedgame',
+            name='board_size',
+            field=models.PositiveSmallIntegerField(default=3, help_text='Number of rows and columns of the board.'),
+        ),
+        migrations.AddField(
+            model_name='playedgame',
+            name='moves',
+            field=models.BinaryField(default=b'', help_text='Cell index of every move in order, one byte each. X moves first, so players alternate by position.'),
+        ),
+        migrations.AddField(
+            model_name='playedgame',
+            name='win_length',
+            field=models.PositiveSmallIntegerField(default=3, help_text='Marks in a row needed to win.'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_playedgame_board_size_win_length_moves'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameroom',
+            name='bot_level',
+            field=models.CharField(blank=True, choices=[('easy', 'easy'), ('medium', 'medium'), ('perfect', 'perfect')], default='', help_text='Level of the bot playing the seat the host left free, empty when both seats are for humans.', max_length=8),
+        ),
+    ]
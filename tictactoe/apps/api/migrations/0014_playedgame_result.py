@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:33
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_human_wins(apps, schema_editor):
+    # Finished games without a winner were either draws or bot wins and stay unknown.
+    PlayedGame = apps.get_model('api', 'PlayedGame')
+    PlayedGame.objects.filter(is_finished=True, winner=F('player_x')).update(result='x')
+    PlayedGame.objects.filter(is_finished=True, winner=F('player_o')).update(result='o')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_gameroom_bot_level'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playedgame',
+            name='result',
+            field=models.CharField(blank=True, choices=[('x', 'X won'), ('o', 'O won'), ('draw', 'Draw')], default='', help_text="Seat that won the game or 'draw', empty until the game is finished. A bot has no user, so only this tells a bot win from a draw.", max_length=4),
+        ),
+        migrations.RunPython(backfill_human_wins, migrations.RunPython.noop),
+    ]
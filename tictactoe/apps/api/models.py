@@ -1,6 +1,9 @@
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from django.db.models import SET_DEFAULT
+from django.db.models import SET_DEFAULT, Subquery
 from apps.accounts.models import User
+from apps.core.bots import BOT_LEVELS
+from apps.core.engine import BOARD_SIZE, MAX_BOARD_SIZE, MIN_BOARD_SIZE, MIN_WIN_LENGTH
 import string
 import random
 
@@ -12,6 +15,24 @@ def generate_unique_code(length=6):
             return code
 
 
+class PlayedGameManager(models.Manager):
+    def start_from_gameroom(self, room_code):
+        """
+        Create the PlayedGame of a room in a single INSERT ... ON CONFLICT DO NOTHING.
+        The players are read from the GameRoom inside the same statement, and a second call for the
+        same room (both clients report the start) is a no-op instead of an IntegrityError.
+        """
+        seats = GameRoom.objects.filter(code=room_code)
+        self.bulk_create(
+            [self.model(code=room_code,
+                        player_x_id=Subquery(seats.values('player_x_id')[:1]),
+                        player_o_id=Subquery(seats.values('player_o_id')[:1]),
+                        board_size=Subquery(seats.values('board_size')[:1]),
+                        win_length=Subquery(seats.values('win_length')[:1]))],
+            ignore_conflicts=True,
+        )
+
+
 class PlayedGame(models.Model):
     code = models.CharField(
         max_length=8,
@@ -50,11 +71,33 @@ class PlayedGame(models.Model):
         default=False,
         help_text="Whether the game has been completed."
     )
+    result = models.CharField(
+        max_length=4,
+        blank=True,
+        default="",
+        choices=[('x', 'X won'), ('o', 'O won'), ('draw', 'Draw')],
+        help_text="Seat that won the game or 'draw', empty until the game is finished. "
+                  "A bot has no user, so only this tells a bot win from a draw."
+    )
+    board_size = models.PositiveSmallIntegerField(
+        default=BOARD_SIZE,
+        help_text="Number of rows and columns of the board."
+    )
+    win_length = models.PositiveSmallIntegerField(
+        default=BOARD_SIZE,
+        help_text="Marks in a row needed to win."
+    )
+    moves = models.BinaryField(
+        default=b'',
+        help_text="Cell index of every move in order, one byte each. X moves first, so players alternate by position."
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         help_text="Timestamp when the game was created."
     )
 
+    objects = PlayedGameManager()
+
     class Meta:
         verbose_name = "Played Game"
         verbose_name_plural = "Played Games"
@@ -62,6 +105,15 @@ class PlayedGame(models.Model):
     def __str__(self):
         return f"PlayedGame {self.code} - Winner: {self.winner}"
 
+    @staticmethod
+    def pack_moves(indexes):
+        """ One byte per move; every cell of the largest board (15x15) has an index below 256. """
+        return bytes(indexes)
+
+    @staticmethod
+    def unpack_moves(moves):
+        return list(bytes(moves))
+
 
 class GameRoom(models.Model):
     code = models.CharField(
@@ -105,6 +157,23 @@ class GameRoom(models.Model):
         default=False,
         help_text="Whether the game has started."
     )
+    board_size = models.PositiveSmallIntegerField(
+        default=BOARD_SIZE,
+        validators=[MinValueValidator(MIN_BOARD_SIZE), MaxValueValidator(MAX_BOARD_SIZE)],
+        help_text="Number of rows and columns of the board."
+    )
+    win_length = models.PositiveSmallIntegerField(
+        default=BOARD_SIZE,
+        validators=[MinValueValidator(MIN_WIN_LENGTH), MaxValueValidator(MAX_BOARD_SIZE)],
+        help_text="Marks in a row needed to win."
+    )
+    bot_level = models.CharField(
+        max_length=8,
+        blank=True,
+        default="",
+        choices=[(level, level) for level in BOT_LEVELS],
+        help_text="Level of the bot playing the seat the host left free, empty when both seats are for humans."
+    )
 
     class Meta:
         verbose_name = "Game Room"
@@ -1,6 +1,9 @@
 from rest_framework import serializers
+from apps.core.engine import BOARD_SIZE, is_valid_geometry
 from .models import GameRoom
 
+DEFAULT_WIN_LENGTH = 5  # gomoku style rooms when only a board size is given
+
 
 class GameRoomSerializer(serializers.ModelSerializer):
     player_x_username = serializers.SerializerMethodField()
@@ -15,6 +18,9 @@ class GameRoomSerializer(serializers.ModelSerializer):
             'player_x_username',
             'player_o_username',
             'game_option',
+            'board_size',
+            'win_length',
+            'bot_level',
             'created_at'
         )
 
@@ -28,9 +34,14 @@ class GameRoomSerializer(serializers.ModelSerializer):
 class CreateGameRoomSerializer(serializers.ModelSerializer):
     class Meta:
         model = GameRoom
-        fields = ['game_option', 'player_x', 'player_o']
+        fields = ['game_option', 'player_x', 'player_o', 'board_size', 'win_length', 'bot_level']
 
     def validate(self, data):
         if data.get('player_x') and data.get('player_o') and data['player_x'] == data['player_o']:
             raise serializers.ValidationError("Player X and Player O cannot be the same user.")
+
+        board_size = data.setdefault('board_size', BOARD_SIZE)
+        win_length = data.setdefault('win_length', min(board_size, DEFAULT_WIN_LENGTH))
+        if not is_valid_geometry(board_size, win_length):
+            raise serializers.ValidationError("Win length must fit on the board.")
         return data
\ No newline at end of file
@@ -1,7 +1,7 @@
-import json
 import logging
 import random
 
+from django.db import transaction
 from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
 from datetime import timedelta
@@ -9,10 +9,11 @@ from celery import shared_task
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
-from apps.api.models import User, GameRoom
+from apps.api.matchmaking import pair_players
+from apps.api.models import User, GameRoom, PlayedGame
 from apps.utils.redis_client import redis_client
-
-PLAYERS_SKILL_RANGE = 200
+from apps.utils.redis_scripts import expire_queue_leases, take_pairs
+from apps.utils.redis_utils import purge_rooms, queue_keys, requeue_players
 
 logger = logging.getLogger('tictactoe')
 
@@ -22,61 +23,79 @@ def delete_unused_gamerooms():
     """Delete game rooms that were created but not started within 12 hours."""
     try:
         twelve_hours_ago = timezone.now() - timedelta(hours=12)
-        deleted_count, _ = GameRoom.objects.filter(game_started=False, created_at__lte=twelve_hours_ago).delete()
+        unused_gamerooms = GameRoom.objects.filter(game_started=False, created_at__lte=twelve_hours_ago)
+        room_codes = list(unused_gamerooms.values_list('code', flat=True))
+        deleted_count, _ = unused_gamerooms.delete()
+        purge_rooms(room_codes)
         logger.info(f"Deleted {deleted_count} unstarted game rooms older than 12 hours.")
     except Exception as e:
         logger.error(f"Failed to delete unused game rooms: {e}")
 
 
 @shared_task
-def process_queue(game_mode='1v1', skill_range=PLAYERS_SKILL_RANGE):
-    """Process the player queue and match players based on skill range."""
-    queue_key = f"game_queue_{game_mode}"
-
+def finalize_game(room_code, result, winner_id=None, moves=()):
+    """
+    Store the result and the move list of a finished game and drop its room: one UPDATE and one DELETE
+    in a single transaction. Only an unfinished game is updated, so a retried or duplicated task changes nothing.
+    result is the winning seat or 'draw'; winner_id is None when nobody or the bot won.
+    """
     try:
-        while redis_client.zcard(queue_key) > 1:
-            player_1_data, skill_score = _get_first_player_from_queue(queue_key)
-            if not player_1_data:
-                logger.info("No players found in the queue.")
-                break
-
-            player_2_member = _find_match(player_1_data['player_id'], skill_score, queue_key, skill_range)
-            if player_2_member:
-                player_2_data = json.loads(player_2_member)
-                _create_game_room(player_1_data, player_2_data)
-                redis_client.zrem(queue_key, json.dumps(player_1_data))
-                redis_client.zrem(queue_key, player_2_member)
-            else:
-                logger.info(f"No match found for Player {player_1_data['player_id']}.")
-                break
+        with transaction.atomic():
+            finished = (PlayedGame.objects.filter(code=room_code, is_finished=False)
+                        .update(result=result, winner_id=winner_id, is_finished=True,
+                                moves=PlayedGame.pack_moves(moves)))
+            GameRoom.objects.filter(code=room_code).delete()
+        # TODO: Implement players ratings
+        if finished:
+            logger.info(f"Finalized played game for room code {room_code}")
+        else:
+            logger.warning(f"No unfinished played game for room code {room_code}")
     except Exception as e:
-        logger.error(f"Error processing queue: {e}")
+        logger.error(f"Failed to finalize game for room code {room_code}: {e}", exc_info=True)
 
 
-def _get_first_player_from_queue(queue_key):
-    try:
-        players = redis_client.zrange(queue_key, 0, 0, withscores=True)
-        if players:
-            player_member, skill_score = players[0]
-            return json.loads(player_member), skill_score
-    except Exception as e:
-        logger.error(f"Error retrieving first player from queue: {e}")
-    return None, None
-
+@shared_task
+def process_queue(game_mode='1v1'):
+    """
+    Safety sweep over the player queue. Players are paired when they enqueue (see add_user_to_queue
+    in apps.utils.redis_scripts), this only catches pairs left behind, e.g. after a failed room
+    creation, and pairs whose skill windows have widened enough since they joined.
+    One read of the queue after dropping expired leases, one pairing pass and one script call to take the pairs.
+    """
+    queue_key, hosts_key, joined_key, _, _ = queue_keys(game_mode)
 
-def _find_match(player_id, player_skill, queue_key, skill_range):
     try:
-        candidates = redis_client.zrangebyscore(queue_key, player_skill - skill_range, player_skill + skill_range, withscores=True)
-        for member, _ in candidates:
-            candidate_data = json.loads(member)
-            if candidate_data['player_id'] != player_id:
-                return member
+        with redis_client.pipeline(transaction=True) as pipe:
+            # Entries of dead sockets go first, in the same transaction as the reads
+            expire_queue_leases(pipe, game_mode)
+            pipe.time()
+            pipe.zrange(queue_key, 0, -1, withscores=True)
+            pipe.hgetall(hosts_key)
+            pipe.hgetall(joined_key)
+            expired, (seconds, microseconds), entries, hosts, joined = pipe.execute()
+        now = seconds + microseconds / 1e6
+        players = [(int(player_id), skill, float(joined[player_id]) if player_id in joined else None)
+                   for player_id, skill in entries]
+        pairs = pair_players(players, now)
+        taken = take_pairs([(players[i][0], players[j][0]) for i, j in pairs], game_mode)
     except Exception as e:
-        logger.error(f"Error finding match for Player {player_id}: {e}")
-    return None
-
-
-def _create_game_room(player_1_data, player_2_data):
+        logger.error(f"Error processing queue: {e}")
+        return
+
+    for pair_index in taken:
+        matched = [(entries[index][0], entries[index][1], players[index][2] or now) for index in pairs[pair_index]]
+        player_1_data, player_2_data = ({'player_id': int(player_id), 'host': hosts.get(player_id, '')}
+                                        for player_id, _, _ in matched)
+        if create_match_room(player_1_data, player_2_data) is None:
+            with redis_client.pipeline(transaction=True) as pipe:
+                requeue_players(pipe, [(player_data, skill, joined) for player_data, (_, skill, joined)
+                                       in zip((player_1_data, player_2_data), matched)], now, game_mode)
+                pipe.execute()
+    logger.info(f"Matched {len(taken)} pairs out of {len(entries)} queued players, dropped {expired} expired entries.")
+
+
+def create_match_room(player_1_data, player_2_data):
+    """ Creates the game room of two matched players and tells both of them. Returns the room, None on failure. """
     try:
         player_1_id, player_1_host = player_1_data['player_id'], player_1_data['host']
         player_2_id, player_2_host = player_2_data['player_id'], player_2_data['host']
@@ -87,10 +106,12 @@ def _create_game_room(player_1_data, player_2_data):
         game_room = GameRoom(player_x=player_x, player_o=player_o, host=host, game_option='x')
         game_room.save()
         _notify_users(game_room)
+        return game_room
     except ObjectDoesNotExist as e:
         logger.error(f"Error creating game room: {e}")
     except Exception as e:
         logger.error(f"Unexpected error during game room creation: {e}")
+    return None
 
 
 def _assign_roles(player_1_side, player_1_id, player_2_id, player_1_host, player_2_host):
@@ -0,0 +1,33 @@
+from django.test import SimpleTestCase
+
+from ..matchmaking import SkillWindow, pair_players, skill_range
+
+WINDOW = SkillWindow(base=100, growth=10, cap=500)
+NOW = 1000.0
+
+
+class SkillRangeTest(SimpleTestCase):
+    def test_widens_with_wait_up_to_the_cap(self):
+        self.assertEqual(skill_range(0, WINDOW), 100)
+        self.assertEqual(skill_range(20, WINDOW), 300)
+        self.assertEqual(skill_range(3600, WINDOW), 500)
+
+
+class PairPlayersTest(SimpleTestCase):
+    def test_pairs_neighbours_within_range(self):
+        players = [(1, 900, NOW), (2, 950, NOW), (3, 1000, NOW), (4, 1010, NOW)]
+        self.assertEqual(pair_players(players, NOW, WINDOW), [(0, 1), (2, 3)])
+
+    def test_outlier_does_not_block_the_rest(self):
+        players = [(1, 100, NOW), (2, 900, NOW), (3, 950, NOW), (4, 2000, NOW)]
+        self.assertEqual(pair_players(players, NOW, WINDOW), [(1, 2)])
+
+    def test_longer_wait_widens_the_range(self):
+        players = [(1, 1000, NOW), (2, 1250, None)]
+        self.assertEqual(pair_players(players, NOW, WINDOW), [])
+        players = [(1, 1000, NOW - 15), (2, 1250, None)]
+        self.assertEqual(pair_players(players, NOW, WINDOW), [(0, 1)])
+
+    def test_empty_and_single_queue(self):
+        self.assertEqual(pair_players([], NOW, WINDOW), [])
+        self.assertEqual(pair_players([(1, 1000, NOW)], NOW, WINDOW), [])
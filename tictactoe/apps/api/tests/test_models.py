@@ -1,5 +1,6 @@
 from django.test import TestCase
 from ..models import GameRoom, PlayedGame, generate_unique_code
+from ..tasks import finalize_game
 from apps.accounts.models import User
 
 class GameRoomAndPlayedGameTest(TestCase):
@@ -24,4 +25,54 @@ class GameRoomAndPlayedGameTest(TestCase):
     def test_game_room_missing_player(self):
         game_room = GameRoom.objects.create(host="session_key_1")
         self.assertIsNone(game_room.player_x)
-        self.assertIsNone(game_room.player_o)
\ No newline at end of file
+        self.assertIsNone(game_room.player_o)
+
+    def test_start_from_gameroom_is_single_idempotent_insert(self):
+        player_o = User.objects.create(username="opponent", email="opponent@example.com", password="<PASSWORD>")
+        game_room = GameRoom.objects.create(host="session_key_1", player_x=self.user, player_o=player_o,
+                                            board_size=15, win_length=5)
+
+        with self.assertNumQueries(1):
+            PlayedGame.objects.start_from_gameroom(game_room.code)
+        with self.assertNumQueries(1):
+            PlayedGame.objects.start_from_gameroom(game_room.code)
+
+        game = PlayedGame.objects.get(code=game_room.code)
+        self.assertEqual(game.player_x, self.user)
+        self.assertEqual(game.player_o, player_o)
+        self.assertEqual((game.board_size, game.win_length), (15, 5))
+        self.assertFalse(game.is_finished)
+
+    def test_moves_are_stored_one_byte_each(self):
+        moves = [0, 224, 112, 14]
+        PlayedGame.objects.create(code="MOVES", moves=PlayedGame.pack_moves(moves))
+
+        stored = PlayedGame.objects.get(code="MOVES").moves
+        self.assertEqual(len(stored), len(moves))
+        self.assertEqual(PlayedGame.unpack_moves(stored), moves)
+
+
+class FinalizeGameTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="testuser", email="testuser@example.com", password="<PASSWORD>")
+
+    def test_bot_win_is_not_stored_as_a_draw(self):
+        PlayedGame.objects.create(code="BOT", player_x=self.user)
+        PlayedGame.objects.create(code="DRAW", player_x=self.user)
+
+        finalize_game("BOT", 'o', None, [4, 0, 8])
+        finalize_game("DRAW", 'draw', None, [4, 0, 8])
+
+        bot_win, draw = PlayedGame.objects.get(code="BOT"), PlayedGame.objects.get(code="DRAW")
+        self.assertEqual((bot_win.result, bot_win.winner, bot_win.is_finished), ('o', None, True))
+        self.assertEqual((draw.result, draw.winner, draw.is_finished), ('draw', None, True))
+
+    def test_finished_game_is_not_overwritten(self):
+        PlayedGame.objects.create(code="WON", player_x=self.user)
+
+        finalize_game("WON", 'x', self.user.id, [4])
+        finalize_game("WON", 'o', None, [4, 0])
+
+        game = PlayedGame.objects.get(code="WON")
+        self.assertEqual((game.result, game.winner), ('x', self.user))
+        self.assertEqual(PlayedGame.unpack_moves(game.moves), [4])
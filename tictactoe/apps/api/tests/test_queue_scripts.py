@@ -0,0 +1,166 @@
+from unittest import mock
+
+from ..matchmaking import SkillWindow
+from ..tasks import process_queue
+from apps.utils.redis_client import REDIS_QUEUE_LEASE_SECONDS, redis_client
+from apps.utils.redis_scripts import (add_user_to_queue,
+                                      delete_user_from_queue,
+                                      expire_queue_leases,
+                                      renew_queue_lease,
+                                      take_pairs)
+from apps.utils.redis_testing import RedisTestCase
+from apps.utils.redis_utils import queue_keys
+
+GAME_MODE = 'test'
+WINDOW = SkillWindow(base=100, growth=10, cap=500)
+
+
+class QueueScriptTestCase(RedisTestCase):
+    """Runs the queue scripts against the test Redis, on a game mode of their own."""
+    redis_keys = queue_keys(GAME_MODE)
+
+    def queue_player(self, player_id, skill, host, waited=0, lease=REDIS_QUEUE_LEASE_SECONDS):
+        """Writes an entry the way the pair script does, without pairing it."""
+        queue_key, hosts_key, joined_key, _, leases_key = queue_keys(GAME_MODE)
+        now = self.redis_now()
+        redis_client.zadd(queue_key, {player_id: skill})
+        redis_client.hset(hosts_key, player_id, host)
+        redis_client.hset(joined_key, player_id, now - waited)
+        redis_client.zadd(leases_key, {player_id: now + lease})
+
+    def queued(self):
+        return {int(player_id): skill for player_id, skill in
+                redis_client.zrange(queue_keys(GAME_MODE)[0], 0, -1, withscores=True)}
+
+    def hosts(self):
+        return {int(player_id): host for player_id, host in redis_client.hgetall(queue_keys(GAME_MODE)[1]).items()}
+
+    async def enqueue(self, player_id, skill, host):
+        return await add_user_to_queue(player_id, skill, host, WINDOW, GAME_MODE)
+
+
+class PairScriptTest(QueueScriptTestCase):
+    async def test_queues_when_nobody_is_compatible(self):
+        self.assertIsNone(await self.enqueue(1, 1000, 'host-1'))
+        self.assertIsNone(await self.enqueue(2, 1200, 'host-2'))
+        self.assertEqual(self.queued(), {1: 1000, 2: 1200})
+
+    async def test_pairs_with_the_closest_compatible_player_on_enqueue(self):
+        await self.enqueue(1, 1000, 'host-1')
+        await self.enqueue(2, 1150, 'host-2')
+
+        opponent, skill, _ = await self.enqueue(3, 1080, 'host-3')
+
+        self.assertEqual((opponent, skill), ({'player_id': 2, 'host': 'host-2'}, 1150))
+        self.assertEqual(self.queued(), {1: 1000})
+        self.assertEqual(self.hosts(), {1: 'host-1'})
+
+    async def test_waited_time_widens_the_window(self):
+        self.queue_player(1, 1000, 'host-1', waited=20)
+
+        opponent, _, joined = await self.enqueue(2, 1250, 'host-2')
+
+        self.assertEqual(opponent['player_id'], 1)
+        self.assertAlmostEqual(joined, self.redis_now() - 20, delta=1)
+        self.assertEqual(self.queued(), {})
+
+    async def test_enqueueing_again_hands_the_entry_to_the_new_host(self):
+        await self.enqueue(1, 1000, 'host-1')
+        joined = redis_client.hget(queue_keys(GAME_MODE)[2], 1)
+
+        self.assertIsNone(await self.enqueue(1, 1000, 'host-1b'))
+
+        self.assertEqual(self.queued(), {1: 1000})
+        self.assertEqual(self.hosts(), {1: 'host-1b'})
+        self.assertEqual(redis_client.hget(queue_keys(GAME_MODE)[2], 1), joined)
+
+
+class CancelScriptTest(QueueScriptTestCase):
+    async def test_cancel_removes_the_entry_of_its_host(self):
+        await self.enqueue(1, 1000, 'host-1')
+        await delete_user_from_queue(1, 'host-1', GAME_MODE)
+        self.assertEqual(self.queued(), {})
+        self.assertEqual(self.hosts(), {})
+
+    async def test_cancel_from_a_stale_socket_is_a_no_op(self):
+        await self.enqueue(1, 1000, 'host-1')
+        await self.enqueue(1, 1000, 'host-1b')
+
+        await delete_user_from_queue(1, 'host-1', GAME_MODE)
+
+        self.assertEqual(self.queued(), {1: 1000})
+        self.assertEqual(self.hosts(), {1: 'host-1b'})
+
+
+class LeaseScriptTest(QueueScriptTestCase):
+    def leases(self):
+        return {int(player_id): expiry for player_id, expiry in
+                redis_client.zrange(queue_keys(GAME_MODE)[4], 0, -1, withscores=True)}
+
+    async def test_expired_entries_are_dropped_before_pairing(self):
+        self.queue_player(1, 1000, 'host-1', lease=-1)
+
+        self.assertIsNone(await self.enqueue(2, 1000, 'host-2'))
+
+        self.assertEqual(self.queued(), {2: 1000})
+        self.assertEqual(self.hosts(), {2: 'host-2'})
+        self.assertEqual(list(self.leases()), [2])
+
+    async def test_renewing_extends_the_lease_of_its_host_only(self):
+        self.queue_player(1, 1000, 'host-1', lease=1)
+
+        self.assertFalse(await renew_queue_lease(1, 'host-stale', GAME_MODE))
+        self.assertLess(self.leases()[1], self.redis_now() + 2)
+        self.assertTrue(await renew_queue_lease(1, 'host-1', GAME_MODE))
+        self.assertGreater(self.leases()[1], self.redis_now() + REDIS_QUEUE_LEASE_SECONDS - 2)
+        self.assertFalse(await renew_queue_lease(2, 'host-2', GAME_MODE))
+
+    def test_sweep_drops_expired_entries(self):
+        self.queue_player(1, 1000, 'host-1', lease=-1)
+        self.queue_player(2, 1000, 'host-2')
+
+        with redis_client.pipeline(transaction=True) as pipe:
+            expire_queue_leases(pipe, GAME_MODE)
+            self.assertEqual(pipe.execute(), [1])
+
+        self.assertEqual(self.queued(), {2: 1000})
+        self.assertEqual(self.hosts(), {2: 'host-2'})
+
+    def test_take_pairs_skips_expired_members(self):
+        self.queue_player(1, 1000, 'host-1', lease=-1)
+        self.queue_player(2, 1000, 'host-2')
+
+        self.assertEqual(take_pairs([(1, 2)], GAME_MODE), [])
+        self.assertEqual(self.queued(), {2: 1000})
+
+
+class TakePairsScriptTest(QueueScriptTestCase):
+    def test_skips_pairs_matched_in_the_meantime(self):
+        for player_id in (1, 2, 3, 4):
+            self.queue_player(player_id, 1000 + player_id, f'host-{player_id}')
+        # Player 2 was matched on enqueue after the sweep read the queue.
+        redis_client.zrem(queue_keys(GAME_MODE)[0], 2)
+
+        self.assertEqual(take_pairs([(1, 2), (3, 4)], GAME_MODE), [1])
+        self.assertEqual(self.queued(), {1: 1001})
+        self.assertEqual(self.hosts(), {1: 'host-1', 2: 'host-2'})  # the pair script drops the rest of 2
+
+    def test_takes_nothing_for_no_pairs(self):
+        self.assertEqual(take_pairs([], GAME_MODE), [])
+
+
+class SweepTest(QueueScriptTestCase):
+    @mock.patch('apps.api.tasks.create_match_room', return_value=None)
+    def test_failed_room_creation_requeues_the_pair(self, create_match_room):
+        self.queue_player(1, 1000, 'host-1', waited=30, lease=1)
+        self.queue_player(2, 1010, 'host-2', waited=10, lease=1)
+        joined = redis_client.hgetall(queue_keys(GAME_MODE)[2])
+
+        process_queue(GAME_MODE)
+
+        create_match_room.assert_called_once()
+        self.assertEqual(self.queued(), {1: 1000, 2: 1010})
+        self.assertEqual(self.hosts(), {1: 'host-1', 2: 'host-2'})
+        self.assertEqual(redis_client.hgetall(queue_keys(GAME_MODE)[2]), joined)
+        leases = redis_client.zrange(queue_keys(GAME_MODE)[4], 0, -1, withscores=True)
+        self.assertTrue(all(expiry > self.redis_now() + REDIS_QUEUE_LEASE_SECONDS - 2 for _, expiry in leases))
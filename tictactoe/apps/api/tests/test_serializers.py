@@ -0,0 +1,36 @@
+from django.test import SimpleTestCase
+from ..serializers import CreateGameRoomSerializer
+
+
+class CreateGameRoomSerializerTest(SimpleTestCase):
+    def test_defaults_to_classic_board(self):
+        serializer = CreateGameRoomSerializer(data={'game_option': 'x'})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data['board_size'], 3)
+        self.assertEqual(serializer.validated_data['win_length'], 3)
+
+    def test_large_board_defaults_to_five_in_a_row(self):
+        serializer = CreateGameRoomSerializer(data={'game_option': 'x', 'board_size': 15})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data['win_length'], 5)
+
+    def test_win_length_longer_than_board_is_rejected(self):
+        serializer = CreateGameRoomSerializer(data={'game_option': 'x', 'board_size': 4, 'win_length': 5})
+        self.assertFalse(serializer.is_valid())
+
+    def test_board_size_out_of_range_is_rejected(self):
+        serializer = CreateGameRoomSerializer(data={'game_option': 'x', 'board_size': 30})
+        self.assertFalse(serializer.is_valid())
+
+    def test_bot_room_on_classic_board(self):
+        serializer = CreateGameRoomSerializer(data={'game_option': 'x', 'bot_level': 'medium'})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data['bot_level'], 'medium')
+
+    def test_bot_room_on_large_board(self):
+        serializer = CreateGameRoomSerializer(data={'game_option': 'x', 'board_size': 15, 'bot_level': 'perfect'})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_unknown_bot_level_is_rejected(self):
+        serializer = CreateGameRoomSerializer(data={'game_option': 'x', 'bot_level': 'godlike'})
+        self.assertFalse(serializer.is_valid())
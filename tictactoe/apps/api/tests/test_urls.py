@@ -9,4 +9,8 @@ class ApiURLsTests(SimpleTestCase):
 
     def test_game_room_url(self):
         url = reverse('api:GameRoom')
-        self.assertEqual(url, '/api/game-room/')
\ No newline at end of file
+        self.assertEqual(url, '/api/game-room/')
+
+    def test_played_game_replays_url(self):
+        url = reverse('api:played_game_replays')
+        self.assertEqual(url, '/api/played-games/replays/')
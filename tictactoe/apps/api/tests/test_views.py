@@ -0,0 +1,80 @@
+import json
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ..models import GameRoom, PlayedGame
+from ..views import GameRoomView
+from apps.accounts.models import User
+from apps.utils.redis_client import redis_client
+from apps.utils.redis_testing import RedisTestCase
+from apps.utils.redis_utils import room_keys
+
+
+class PlayedGameReplaysViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="testuser", email="testuser@example.com", password="<PASSWORD>")
+        self.opponent = User.objects.create(username="opponent", email="opponent@example.com", password="<PASSWORD>")
+        self.client.force_login(self.user)
+
+    def replay_lines(self):
+        response = self.client.get(reverse('api:played_game_replays'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_streams_finished_games_of_the_user(self):
+        PlayedGame.objects.create(code="WON", player_x=self.user, player_o=self.opponent, winner=self.user,
+                                  result='x', is_finished=True,
+                                  moves=PlayedGame.pack_moves([4, 0, 8, 2, 6, 1, 5, 7, 3]))
+        PlayedGame.objects.create(code="RUNNING", player_x=self.user, player_o=self.opponent)
+        PlayedGame.objects.create(code="OTHERS", player_x=self.opponent, is_finished=True)
+
+        lines = self.replay_lines()
+
+        self.assertEqual([line['code'] for line in lines], ["WON"])
+        self.assertEqual(lines[0]['moves'], [4, 0, 8, 2, 6, 1, 5, 7, 3])
+        self.assertEqual((lines[0]['playerX'], lines[0]['playerO'], lines[0]['winner'], lines[0]['result']),
+                         ("testuser", "opponent", "testuser", 'x'))
+
+    def test_bot_win_is_reported_apart_from_a_draw(self):
+        PlayedGame.objects.create(code="BOT", player_x=self.user, result='o', is_finished=True)
+        PlayedGame.objects.create(code="DRAW", player_x=self.user, result='draw', is_finished=True)
+
+        results = {line['code']: (line['playerO'], line['winner'], line['result']) for line in self.replay_lines()}
+
+        self.assertEqual(results, {"BOT": (None, None, 'o'), "DRAW": (None, None, 'draw')})
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get(reverse('api:played_game_replays'))
+        self.assertEqual(response.status_code, 302)
+
+
+class GameRoomDeleteViewTest(RedisTestCase, TestCase):
+    redis_keys = room_keys("DELROOM")
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create(username="testuser", email="testuser@example.com", password="<PASSWORD>")
+        self.client.force_login(self.user)
+        self.game_room = GameRoom.objects.create(code="DELROOM", host="host-1", game_option='x', player_x=self.user)
+        room_key, chat_key, events_key = room_keys("DELROOM")
+        redis_client.hset(room_key, 'ready_x', 1)
+        redis_client.xadd(chat_key, {'message': 'hi', 'sender': 'testuser', 'timestamp': 0})
+        redis_client.rpush(events_key, '{}')
+
+    def test_cancelled_room_drops_its_redis_keys(self):
+        response = self.client.delete(reverse('api:GameRoom') + '?gameRoomCode=DELROOM',
+                                      HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(GameRoom.objects.filter(code="DELROOM").exists())
+        self.assertEqual(redis_client.exists(*room_keys("DELROOM")), 0)
+
+    def test_replaced_room_drops_its_redis_keys(self):
+        GameRoomView._delete_existing_room("host-1")
+
+        self.assertFalse(GameRoom.objects.filter(code="DELROOM").exists())
+        self.assertEqual(redis_client.exists(*room_keys("DELROOM")), 0)
@@ -12,4 +12,5 @@ app_name = "api"
 urlpatterns = [
     path('get-tokens/', views.get_tokens, name='get_tokens'),
     path('game-room/', login_required(GameRoomView.as_view()), name='GameRoom'),
+    path('played-games/replays/', login_required(views.played_game_replays), name='played_game_replays'),
 ]
\ No newline at end of file
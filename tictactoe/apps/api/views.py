@@ -1,7 +1,9 @@
+import json
 import random
 import logging
 
-from django.http import JsonResponse
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import status
 from rest_framework.views import APIView
@@ -9,11 +11,14 @@ from rest_framework.response import Response
 from rest_framework_simplejwt.exceptions import AuthenticationFailed
 
 from apps.utils.api_utils import get_user_from_jwt_token
+from apps.utils.redis_utils import purge_rooms
 from .serializers import GameRoomSerializer, CreateGameRoomSerializer
-from .models import GameRoom
+from .models import GameRoom, PlayedGame
 
 logger = logging.getLogger("tictactoe")
 
+REPLAY_CHUNK_SIZE = 500
+
 
 """
 API
@@ -35,6 +40,38 @@ def get_tokens(request):
             return JsonResponse({'error': str(e)}, status=401)
 
 
+def played_game_replays(request):
+    """
+    Streams the finished games of the user as NDJSON, newest first, one game with its move list per line.
+    Rows are fetched in chunks, so memory stays flat however many games the user played.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    games = (PlayedGame.objects
+             .filter(Q(player_x=request.user) | Q(player_o=request.user), is_finished=True)
+             .order_by('-created_at')
+             .values_list('code', 'board_size', 'win_length', 'player_x__username', 'player_o__username',
+                          'winner__username', 'result', 'created_at', 'moves'))
+    return StreamingHttpResponse(_replay_lines(games.iterator(chunk_size=REPLAY_CHUNK_SIZE)),
+                                 content_type='application/x-ndjson')
+
+
+def _replay_lines(games):
+    for code, board_size, win_length, player_x, player_o, winner, result, created_at, moves in games:
+        yield json.dumps({
+            'code': code,
+            'boardSize': board_size,
+            'winLength': win_length,
+            'playerX': player_x,
+            'playerO': player_o,
+            'winner': winner,
+            'result': result,
+            'createdAt': created_at.isoformat(),
+            'moves': PlayedGame.unpack_moves(moves),
+        }) + '\n'
+
+
 class GameRoomView(APIView):
     serializer_class = GameRoomSerializer
 
@@ -50,6 +87,9 @@ class GameRoomView(APIView):
             return Response({'error': 'Invalid data'}, status=status.HTTP_400_BAD_REQUEST)
 
         game_option = serializer.validated_data.get('game_option')
+        board_size = serializer.validated_data.get('board_size')
+        win_length = serializer.validated_data.get('win_length')
+        bot_level = serializer.validated_data.get('bot_level', '')
         host = self.request.session.session_key
 
         self._delete_existing_room(host)
@@ -58,7 +98,7 @@ class GameRoomView(APIView):
         if game_option == 'r':
             game_option = random.choice(['x', 'o'])
 
-        game_room = self._create_game_room(game_option, host, user)
+        game_room = self._create_game_room(game_option, host, user, board_size, win_length, bot_level)
         return Response(GameRoomSerializer(game_room).data, status=status.HTTP_200_OK)
 
     def delete(self, request):
@@ -74,6 +114,7 @@ class GameRoomView(APIView):
 
         if self._can_user_delete_room(request.user, game_room):
             game_room.delete()
+            purge_rooms([game_room.code])
             return JsonResponse({'success': 'Game cancelled successfully'})
         return JsonResponse({'error': 'User does not own the game'}, status=403)
 
@@ -110,13 +151,16 @@ class GameRoomView(APIView):
         existing_room = GameRoom.objects.filter(host=host).first()
         if existing_room:
             existing_room.delete()
+            purge_rooms([existing_room.code])
 
     @staticmethod
-    def _create_game_room(game_option, host, user):
+    def _create_game_room(game_option, host, user, board_size, win_length, bot_level=''):
         if game_option == 'o':
-            return GameRoom.objects.create(host=host, game_option=game_option, player_o=user)
+            return GameRoom.objects.create(host=host, game_option=game_option, player_o=user,
+                                           board_size=board_size, win_length=win_length, bot_level=bot_level)
         if game_option == 'x':
-            return GameRoom.objects.create(host=host, game_option=game_option, player_x=user)
+            return GameRoom.objects.create(host=host, game_option=game_option, player_x=user,
+                                           board_size=board_size, win_length=win_length, bot_level=bot_level)
 
     def _get_authenticated_user(self):
         jwt_token = self.request.session.get('jwt_token')
@@ -128,6 +172,9 @@ class GameRoomView(APIView):
 
     @staticmethod
     def _is_player_unauthorized(game_room, user):
+        if game_room.bot_level:
+            # The free seat of a bot room belongs to the bot.
+            return user not in (game_room.player_x, game_room.player_o)
         return (game_room.player_x and game_room.player_o and
                 game_room.player_x != user and
                 game_room.player_o != user)
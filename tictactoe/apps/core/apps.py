@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save
+
+
+def invalidate_cached_player(sender, instance, **kwargs):
+    from apps.core.player_cache import player_cache
+    player_cache.invalidate(instance.pk)
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
+
+    def ready(self):
+        post_save.connect(invalidate_cached_player, sender='accounts.User',
+                          dispatch_uid='core_invalidate_cached_player')
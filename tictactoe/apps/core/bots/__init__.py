@@ -0,0 +1,42 @@
+"""
+Server side bot opponents.
+
+A room created with a bot level keeps its second seat for the bot. The consumer of the human
+player plays the bot's answer right after applying the human move: on the classic board from the
+position table with choose_move(), on larger boards from the search service in bots.search,
+whose worker processes keep the search off the event loop.
+"""
+
+import random
+
+from apps.core.bots.table import scored_moves
+from apps.core.engine import BOARD_SIZE
+
+BOT_LEVELS = ('easy', 'medium', 'perfect')
+
+# Chance that the bot plays a random weaker move instead of one of the best.
+MISTAKE_RATES = {
+    'easy': 0.5,
+    'medium': 0.2,
+    'perfect': 0.0,
+}
+
+
+def bot_name(level):
+    return f"Bot ({level})"
+
+
+def has_table(size, win_length):
+    """ The position table covers the classic game only; other boards are searched. """
+    return size == BOARD_SIZE and win_length == BOARD_SIZE
+
+
+def choose_move(board, level, rng=random):
+    """ Cell index the bot of the given level plays on a classic board, for the player to move. """
+    moves = scored_moves(board.x_bits, board.o_bits)
+    best_score = max(score for _, score in moves)
+    best = [index for index, score in moves if score == best_score]
+    weaker = [index for index, score in moves if score != best_score]
+    if weaker and rng.random() < MISTAKE_RATES[level]:
+        return rng.choice(weaker)
+    return rng.choice(best)
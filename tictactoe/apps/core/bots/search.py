@@ -0,0 +1,270 @@
+"""
+Bot search for boards the position table does not cover.
+
+Alpha-beta search is CPU bound, so it never runs on a consumer's event loop. SearchService owns
+one single-process pool per worker and pins every game to one of them by its room code: the
+transposition table of a game stays in that process from move to move, and a consumer only
+awaits a future. A search deepens iteratively until its time budget is spent and answers with
+the best move of the deepest finished iteration. It stops early when it finds a forced result or
+when its game is released, which a consumer does when its player leaves.
+"""
+
+import asyncio
+import itertools
+import multiprocessing
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from apps.core.engine import get_geometry
+
+SEARCH_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# level -> (time budget per move in seconds, maximum depth)
+SEARCH_LEVELS = {
+    'easy': (0.05, 1),
+    'medium': (0.3, 2),
+    'perfect': (1.5, 8),
+}
+
+TABLE_MAX_ENTRIES = 200_000  # per game; a full table is cleared rather than aged
+CHECK_EVERY_NODES = 512  # nodes between looks at the clock and the cancel token
+
+WIN_SCORE = 1 << 30
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class SearchAborted(Exception):
+    """ The time budget ran out or the search was cancelled. """
+
+
+"""
+Worker process
+"""
+
+_tables = {}  # game id -> transposition table, (own, opponent) -> (depth, score, flag, move)
+_cancel_token = None  # shared with the parent; holds the id of the search to abort
+
+
+def _init_worker(cancel_token):
+    global _cancel_token
+    _cancel_token = cancel_token
+
+
+def search_move(game_id, search_id, x_bits, o_bits, size, win_length, budget, max_depth):
+    """ Cell index to play for the side to move, or None if the search was cancelled. """
+    table = _tables.setdefault(game_id, {})
+    if len(table) > TABLE_MAX_ENTRIES:
+        table.clear()
+    search = Search(get_geometry(size, win_length), table, time.monotonic() + budget,
+                    cancelled=lambda: _cancel_token is not None and _cancel_token.value == search_id)
+    return search.best_move(x_bits, o_bits, max_depth)
+
+
+def drop_table(game_id):
+    _tables.pop(game_id, None)
+
+
+@lru_cache(maxsize=None)
+def _neighbourhoods(size):
+    """ Mask of the cells around each cell (Chebyshev distance 1). """
+    masks = []
+    for row in range(size):
+        for col in range(size):
+            mask = 0
+            for d_row in (-1, 0, 1):
+                for d_col in (-1, 0, 1):
+                    r, c = row + d_row, col + d_col
+                    if (d_row or d_col) and 0 <= r < size and 0 <= c < size:
+                        mask |= 1 << (r * size + c)
+            masks.append(mask)
+    return tuple(masks)
+
+
+class Search:
+    """
+    Negamax with alpha-beta pruning over (own, opponent) bitboards, own being the side to move.
+    Candidate moves are the empty cells next to a stone, ordered by the transposition table move
+    and then by how many open lines a stone there would extend or block.
+    """
+
+    def __init__(self, geometry, table, deadline, cancelled=lambda: False):
+        self.geometry = geometry
+        self.table = table
+        self.deadline = deadline
+        self.cancelled = cancelled
+        self.neighbourhoods = _neighbourhoods(geometry.size)
+        self.weights = tuple(4 ** count for count in range(geometry.win_length + 1))
+        self.nodes = 0
+
+    def best_move(self, x_bits, o_bits, max_depth):
+        x_to_move = x_bits.bit_count() == o_bits.bit_count()
+        own, opponent = (x_bits, o_bits) if x_to_move else (o_bits, x_bits)
+        moves = self._candidates(own, opponent)
+        if not moves:
+            return None
+
+        best = None
+        for depth in range(1, max_depth + 1):
+            try:
+                score = self._negamax(own, opponent, depth, -WIN_SCORE * 2, WIN_SCORE * 2)
+            except SearchAborted:
+                break
+            best = self.table[(own, opponent)][3]
+            if abs(score) >= WIN_SCORE:
+                break  # forced result, deeper iterations cannot change the move
+        if self.cancelled():
+            return None
+        # Out of time before depth 1 finished: any sensible move beats no move at all.
+        return moves[0] if best is None else best
+
+    def _negamax(self, own, opponent, depth, alpha, beta):
+        self.nodes += 1
+        if self.nodes % CHECK_EVERY_NODES == 0 and (time.monotonic() > self.deadline or self.cancelled()):
+            raise SearchAborted()
+
+        key = (own, opponent)
+        entry = self.table.get(key)
+        hint = None
+        if entry is not None:
+            entry_depth, entry_score, flag, hint = entry
+            if entry_depth >= depth and (flag == EXACT
+                                         or (flag == LOWER and entry_score >= beta)
+                                         or (flag == UPPER and entry_score <= alpha)):
+                return entry_score
+        if depth == 0:
+            return self._evaluate(own, opponent)
+
+        moves = self._candidates(own, opponent, hint)
+        if not moves:
+            return 0  # full board
+
+        original_alpha = alpha
+        best_score, best_move = -WIN_SCORE * 2, moves[0]
+        for index in moves:
+            placed = own | 1 << index
+            if self._completes_line(placed, index):
+                score = WIN_SCORE + depth  # sooner wins score higher
+            else:
+                score = -self._negamax(opponent, placed, depth - 1, -beta, -alpha)
+            if score > best_score:
+                best_score, best_move = score, index
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        flag = UPPER if best_score <= original_alpha else LOWER if best_score >= beta else EXACT
+        self.table[key] = (depth, best_score, flag, best_move)
+        return best_score
+
+    def _completes_line(self, bits, index):
+        return any(bits & mask == mask for mask in self.geometry.lines_through[index])
+
+    def _candidates(self, own, opponent, hint=None):
+        occupied = own | opponent
+        if not occupied:
+            return [self.geometry.cells // 2]
+
+        near = 0
+        stones = occupied
+        while stones:
+            low = stones & -stones
+            near |= self.neighbourhoods[low.bit_length() - 1]
+            stones ^= low
+        near &= ~occupied
+
+        scored = []
+        while near:
+            low = near & -near
+            index = low.bit_length() - 1
+            near ^= low
+            scored.append((self._move_score(own, opponent, index), index))
+        scored.sort(reverse=True)
+        moves = [index for _, index in scored]
+        if hint is not None and hint in moves:
+            moves.remove(hint)
+            moves.insert(0, hint)
+        return moves
+
+    def _move_score(self, own, opponent, index):
+        score = 0
+        weights = self.weights
+        for mask in self.geometry.lines_through[index]:
+            if not mask & opponent:
+                score += weights[(mask & own).bit_count()]
+            if not mask & own:
+                score += weights[(mask & opponent).bit_count()]
+        return score
+
+    def _evaluate(self, own, opponent):
+        """ Open lines weighted by their stones, from the view of the side to move. """
+        score = 0
+        weights = self.weights
+        occupied = own | opponent
+        for mask in self.geometry.lines:
+            if not mask & occupied:
+                continue
+            if not mask & opponent:
+                score += weights[(mask & own).bit_count()]
+            elif not mask & own:
+                score -= weights[(mask & opponent).bit_count()]
+        return score
+
+
+"""
+Event loop side
+"""
+
+class SearchService:
+    def __init__(self, workers=SEARCH_WORKERS):
+        self.workers = workers
+        self._pools = None  # [(executor, cancel token)], started on the first search
+        self._running = {}  # game id -> (future, search id, cancel token)
+        self._search_ids = itertools.count(1)
+
+    async def best_move(self, game_id, board, level):
+        """ Searches the move of the side to move without blocking the event loop; None if cancelled. """
+        budget, max_depth = SEARCH_LEVELS[level]
+        executor, cancel_token = self._pool_of(game_id)
+        search_id = next(self._search_ids)
+        future = executor.submit(search_move, game_id, search_id, board.x_bits, board.o_bits,
+                                 board.size, board.win_length, budget, max_depth)
+        self._running[game_id] = (future, search_id, cancel_token)
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            if self._running.get(game_id, (None,))[0] is future:
+                del self._running[game_id]
+
+    def release(self, game_id):
+        """ Aborts a running search of the game and drops its transposition table. """
+        running = self._running.pop(game_id, None)
+        if running is not None:
+            future, search_id, cancel_token = running
+            if not future.cancel():
+                cancel_token.value = search_id
+        if self._pools is not None:
+            self._pool_of(game_id)[0].submit(drop_table, game_id)
+
+    def shutdown(self):
+        if self._pools is not None:
+            for executor, _ in self._pools:
+                executor.shutdown(wait=False, cancel_futures=True)
+            self._pools = None
+
+    def _pool_of(self, game_id):
+        if self._pools is None:
+            # Spawned, not forked: the workers must not inherit the event loop and sockets of a daphne process.
+            context = multiprocessing.get_context('spawn')
+            self._pools = []
+            for _ in range(self.workers):
+                cancel_token = context.Value('q', 0, lock=False)
+                executor = ProcessPoolExecutor(max_workers=1, mp_context=context,
+                                               initializer=_init_worker, initargs=(cancel_token,))
+                self._pools.append((executor, cancel_token))
+        return self._pools[zlib.crc32(game_id.encode()) % len(self._pools)]
+
+
+search_service = SearchService()
@@ -0,0 +1,57 @@
+"""
+Perfect play for the classic 3x3 game from a precomputed position table.
+
+Every position reachable from the empty board is solved once, when the module is imported, by a
+memoised negamax over the bitboards (a few thousand positions, well under a second). A bot move
+is then one dict lookup; no search ever runs while a game is being played.
+"""
+
+from apps.core.engine import BOARD_CELLS, FULL_BOARD, has_won, popcount
+
+
+def _key(x_bits, o_bits):
+    return x_bits << BOARD_CELLS | o_bits
+
+
+def _build_move_table():
+    """
+    Maps every reachable, unfinished position to the (index, score) of each legal move.
+    Scores are from the view of the player to move: positive wins, zero draws, negative loses,
+    and a larger magnitude means the result comes sooner, so the table prefers quick wins and
+    long defences.
+    """
+    table = {}
+
+    def solve(x_bits, o_bits):
+        """ Score of the position for the player to move. """
+        key = _key(x_bits, o_bits)
+        moves = table.get(key)
+        if moves is None:
+            x_to_move = popcount(x_bits) == popcount(o_bits)
+            occupied = x_bits | o_bits
+            moves = []
+            for index in range(BOARD_CELLS):
+                bit = 1 << index
+                if occupied & bit:
+                    continue
+                own = (x_bits if x_to_move else o_bits) | bit
+                if has_won(own):
+                    score = BOARD_CELLS - popcount(occupied)
+                elif occupied | bit == FULL_BOARD:
+                    score = 0
+                else:
+                    score = -(solve(own, o_bits) if x_to_move else solve(x_bits, own))
+                moves.append((index, score))
+            moves = table[key] = tuple(moves)
+        return max(score for _, score in moves)
+
+    solve(0, 0)
+    return table
+
+
+MOVE_TABLE = _build_move_table()
+
+
+def scored_moves(x_bits, o_bits):
+    """ (index, score) of every legal move, KeyError for a finished or unreachable position. """
+    return MOVE_TABLE[_key(x_bits, o_bits)]
@@ -0,0 +1,100 @@
+"""
+Server side move clock.
+
+Every worker process runs one hashed timing wheel. A timer is hashed into the slot of the tick it
+is due on, so schedule and cancel are O(1) and a tick only looks at one slot, whatever the number
+of live rooms. The wheel's task sleeps one tick at a time while timers are pending and exits
+when the wheel is empty, so an idle worker does no work at all.
+
+Timers are not a source of truth: the deadline of a move is also stored in the room hash, and a
+firing timer only finishes the game through the seq compare-and-set of the finish script. A timer
+that fires after the opponent already moved, or that lives in a worker other than the one that
+applied the latest move, is a no-op.
+"""
+
+import asyncio
+import logging
+import math
+import time
+
+logger = logging.getLogger("tictactoe")
+
+MOVE_TIMEOUT_SECONDS = 30
+TIMER_TICK_SECONDS = 0.5
+TIMER_WHEEL_SLOTS = 512  # one revolution covers 256 seconds, longer timers wait for their round
+
+
+class TimerWheel:
+    def __init__(self, tick=TIMER_TICK_SECONDS, slots=TIMER_WHEEL_SLOTS, clock=time.monotonic):
+        self.tick = tick
+        self._clock = clock
+        self._slots = [{} for _ in range(slots)]
+        self._slot_of = {}  # key -> slot index
+        self._cursor = self._tick_of(clock())  # next tick to process
+        self._task = None
+        self._running = set()
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __contains__(self, key):
+        return key in self._slot_of
+
+    def schedule(self, key, delay, callback, *args):
+        """
+        Run the coroutine function callback(*args) after delay seconds, replacing any timer under key.
+        Must be called from the event loop thread.
+        """
+        self.cancel(key)
+        due_tick = max(math.ceil((self._clock() + delay) / self.tick), self._cursor)
+        slot = due_tick % len(self._slots)
+        self._slots[slot][key] = (due_tick, callback, args)
+        self._slot_of[key] = slot
+        self._ensure_running()
+
+    def cancel(self, key):
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            del self._slots[slot][key]
+
+    def advance(self):
+        """ Removes and returns the (callback, args) of every timer that is due by now. """
+        now_tick = self._tick_of(self._clock())
+        if now_tick < self._cursor:
+            return []
+
+        due = []
+        first = self._cursor
+        # After a long stall every slot is visited once instead of every missed tick.
+        for step in range(min(now_tick - first + 1, len(self._slots))):
+            bucket = self._slots[(first + step) % len(self._slots)]
+            for key, (due_tick, callback, args) in list(bucket.items()):
+                if due_tick <= now_tick:
+                    del bucket[key]
+                    del self._slot_of[key]
+                    due.append((callback, args))
+        self._cursor = now_tick + 1
+        return due
+
+    def _tick_of(self, moment):
+        return int(moment / self.tick)
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while self._slot_of:
+            await asyncio.sleep(self.tick)
+            for callback, args in self.advance():
+                task = asyncio.create_task(callback(*args))
+                self._running.add(task)
+                task.add_done_callback(self._on_timer_done)
+
+    def _on_timer_done(self, task):
+        self._running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Move clock timer failed: {task.exception()}", exc_info=task.exception())
+
+
+timer_wheel = TimerWheel()
@@ -1,51 +1,111 @@
+import asyncio
 import json
 import logging
+from urllib.parse import parse_qs
 
-from django.core.exceptions import ObjectDoesNotExist
-from django.db import IntegrityError
-from channels.generic.websocket import WebsocketConsumer
-from asgiref.sync import async_to_sync
-from selenium.webdriver.remote.utils import load_json
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from asgiref.sync import sync_to_async
 
 from apps.api.models import *
+from apps.api.matchmaking import SKILL_WINDOW
+from apps.api.tasks import create_match_room, finalize_game
 from apps.api.views import get_user_from_jwt_token
-from apps.utils.redis_client import (REDIS_CHAT_EXPIRATION_SECONDS,
-                                     REDIS_GAMECHAT_EXPIRATION_SECONDS,
-                                     REDIS_CHAT_MESSAGES_LIST,
-                                     redis_client)
-from apps.utils.redis_utils import (set_redis_expiation,
-                                    add_user_to_queue,
-                                    delete_user_from_queue,
-                                    fetch_redis_list,
-                                    store_message_in_redis_list)
-from apps.utils.utils import get_current_timestamp
+from apps.core.bots import bot_name, choose_move, has_table
+from apps.core.bots.search import search_service
+from apps.core.clock import MOVE_TIMEOUT_SECONDS, timer_wheel
+from apps.core.engine import BOARD_SIZE, Board
+from apps.core.player_cache import player_cache
+from apps.core.protocol import (BINARY_SUBPROTOCOL,
+                                ProtocolError,
+                                decode_client_frame,
+                                encode_group_frame,
+                                encode_server_frame)
+from apps.core.ratelimit import RateLimiter, admit
+from apps.utils.redis_client import (REDIS_CHAT_MESSAGES_STREAM,
+                                     REDIS_CHAT_SHARD_CAPACITY,
+                                     REDIS_CHAT_SHARD_LEASE_RENEW_SECONDS,
+                                     REDIS_CHAT_STREAM_MAXLEN,
+                                     REDIS_GAMEROOM_EXPIRATION_SECONDS,
+                                     REDIS_QUEUE_LEASE_RENEW_SECONDS,
+                                     REDIS_ROOM_CHAT_STREAM_MAXLEN,
+                                     async_redis_client)
+from apps.utils.redis_scripts import (MOVE_APPLIED,
+                                      MOVE_STALE,
+                                      add_user_to_queue,
+                                      delete_user_from_queue,
+                                      apply_move,
+                                      chat_shards,
+                                      finish_game,
+                                      join_chat_shard,
+                                      leave_chat_shard,
+                                      renew_chat_shard,
+                                      renew_queue_lease,
+                                      resume_room,
+                                      start_game,
+                                      store_ready)
+from apps.utils.redis_utils import (chat_frame,
+                                    expected_wait,
+                                    fetch_chat_history,
+                                    purge_room,
+                                    requeue_players,
+                                    refresh_room_ttl,
+                                    room_chat_key,
+                                    room_key,
+                                    room_keys,
+                                    store_chat_message)
+from apps.utils.utils import get_current_time_ms, get_current_timestamp
 
 
 logger = logging.getLogger("tictactoe")
 
-class ChatConsumer(WebsocketConsumer):
+class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    Lobby chat. Sockets are spread over shards of at most REDIS_CHAT_SHARD_CAPACITY members, each
+    its own group, and a message is relayed to every active shard. All shards share one stream, so
+    the history is the same whichever shard a user lands in.
+    """
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.user = None
-        self.room_group_name = 'main_chat'
+        self.shard = None
+        self.room_group_name = None
+        self.lease_task = None
 
-    def connect(self):
-        async_to_sync(self.channel_layer.group_add)(
+    @staticmethod
+    def shard_group_name(shard):
+        return f'main_chat_{shard}'
+
+    async def connect(self):
+        self.rate_limiter = RateLimiter.for_scope('chat', self.scope, self.channel_name)
+        self.shard = await join_chat_shard(self.channel_name, REDIS_CHAT_SHARD_CAPACITY)
+        self.room_group_name = self.shard_group_name(self.shard)
+        # The membership counts as long as this socket keeps renewing its lease.
+        self.lease_task = asyncio.create_task(self._renew_shard_lease())
+        await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
-        self.accept()
+        await self.accept()
         self.user = self.scope.get('user')
 
-        self._send_connection_established_message()
+        await self._send_connection_established_message()
+        await self._send_chat_history()
 
-    def disconnect(self, code):
-        async_to_sync(self.channel_layer.group_discard)(
+    async def disconnect(self, code):
+        if self.shard is None:
+            return
+        if self.lease_task is not None:
+            self.lease_task.cancel()
+        await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
+        await leave_chat_shard(self.channel_name)
 
-    def receive(self, text_data=None, bytes_data=None):
+    async def receive(self, text_data=None, bytes_data=None):
+        if not await admit(self):
+            return
         if not text_data:
             logger.warning("Received empty text_data.")
             return
@@ -59,90 +119,101 @@ class ChatConsumer(WebsocketConsumer):
 
         message_type = text_data_json.get('type')
         if message_type == 'latest_messages_request':
-            self._send_recent_messages()
+            await self._send_chat_history()
+        elif message_type == 'chat_history_request':
+            await self._send_chat_history(before=self._history_cursor(text_data_json))
         elif message_type == 'chat_message':
-            self._handle_chat_message(text_data_json)
+            await self._handle_chat_message(text_data_json)
         else:
             logger.warning(f"Unsupported message type: {message_type}")
 
-    def chat_message(self, event):
-        self.send(text_data=json.dumps({
-            'type': 'chat',
-            'message': event['message'],
-            'sender': event['sender'],
-            'timestamp': event.get('timestamp', '')
-        }))
+    async def chat_message(self, event):
+        # The frame was encoded once by the sender for the whole group.
+        await self.send(text_data=event['text'])
+
+    async def _renew_shard_lease(self):
+        while True:
+            await asyncio.sleep(REDIS_CHAT_SHARD_LEASE_RENEW_SECONDS)
+            try:
+                await renew_chat_shard(self.channel_name, self.shard)
+            except Exception as e:
+                logger.error(f"Error renewing lobby shard lease of {self.channel_name}: {e}")
 
-    def _send_connection_established_message(self):
-        self.send(text_data=json.dumps({
+    async def _send_connection_established_message(self):
+        await self.send(text_data=json.dumps({
             'type': 'connection_established',
             'message': 'You are now connected!',
         }))
 
-    def _handle_chat_message(self, text_data_json):
+    async def _handle_chat_message(self, text_data_json):
         message = text_data_json.get('message', '')
         if not message:
             logger.warning("Received empty message content.")
             return
 
         sender_username = self.user.username if self.user and self.user.is_authenticated else 'Anonymous'
-        timestamp = get_current_timestamp()
-
-        async_to_sync(self.channel_layer.group_send)(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'message': message,
-                'sender': sender_username,
-                'timestamp': timestamp
-            }
-        )
-        store_message_in_redis_list(
-            list_name=REDIS_CHAT_MESSAGES_LIST,
-            message=message,
-            sender=sender_username,
-            timestamp=timestamp
-        )
+        fields = {'message': message, 'sender': sender_username, 'timestamp': get_current_timestamp()}
+
+        # Stored first, so the broadcast frame carries the stream id clients page from.
+        entry_id = await store_chat_message(REDIS_CHAT_MESSAGES_STREAM, **fields, maxlen=REDIS_CHAT_STREAM_MAXLEN)
+        event = {
+            'type': 'chat_message',
+            'text': json.dumps(chat_frame(entry_id, fields)),
+        }
+        # Relay to every shard; each group_send only fans out to the members of one shard.
+        shards = set(await chat_shards())
+        shards.add(self.shard)
+        await asyncio.gather(*(
+            self.channel_layer.group_send(self.shard_group_name(shard), event) for shard in shards
+        ))
+
+    async def _send_chat_history(self, before=None):
+        """ One frame with the newest messages, or the page before the cursor a client scrolled back to. """
+        messages, cursor = await fetch_chat_history(REDIS_CHAT_MESSAGES_STREAM, before=before)
+        await self.send(text_data=json.dumps({
+            'type': 'chat_history',
+            'messages': messages,
+            'cursor': cursor,
+        }))
 
-    def _send_recent_messages(self):
-        recent_messages = fetch_redis_list(REDIS_CHAT_MESSAGES_LIST)
-        for message in recent_messages:
-            self.send(text_data=json.dumps({
-                'type': 'chat',
-                'message': message['message'],
-                'sender': message['sender'],
-                'timestamp': message['timestamp'],
-            }))
+    @staticmethod
+    def _history_cursor(text_data_json):
+        before = text_data_json.get('before')
+        return before if isinstance(before, str) and before else None
 
-class GameRoomChatConsumer(WebsocketConsumer):
+class GameRoomChatConsumer(AsyncWebsocketConsumer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.user = None
         self.room_code = None
         self.room_group_name = None
 
-    def connect(self):
+    async def connect(self):
         self.room_code = self.scope['url_route']['kwargs']['room_code']
         self.room_group_name = f"chat_room_{self.room_code}"
+        self.rate_limiter = RateLimiter.for_scope('chat', self.scope, self.channel_name)
 
-        async_to_sync(self.channel_layer.group_add)(
+        await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
-        self.accept()
+        await self.accept()
         self.user = self.scope.get('user')
 
-        self._send_connection_established_message()
+        await self._send_connection_established_message()
+        await self._send_chat_history()
 
-        set_redis_expiation(f'recent_messages_{self.room_code}', REDIS_GAMECHAT_EXPIRATION_SECONDS)
+        await refresh_room_ttl(self.room_code)
 
-    def disconnect(self, code):
-        async_to_sync(self.channel_layer.group_discard)(
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
 
-    def receive(self, text_data=None, bytes_data=None):
+    async def receive(self, text_data=None, bytes_data=None):
+        if not await admit(self):
+            return
         if not text_data:
             logger.warning("Received empty text_data.")
             return
@@ -156,136 +227,167 @@ class GameRoomChatConsumer(WebsocketConsumer):
 
         message_type = text_data_json.get('type')
         if message_type == 'latest_messages_request':
-            self._send_recent_messages()
+            await self._send_chat_history()
+        elif message_type == 'chat_history_request':
+            await self._send_chat_history(before=self._history_cursor(text_data_json))
         elif message_type == 'chat':
-            self._handle_chat_message(text_data_json)
+            await self._handle_chat_message(text_data_json)
         else:
             logger.warning(f"Unsupported message type: {message_type}")
 
-    def chat_message(self, event):
-        self.send(text_data=json.dumps({
-            'type': 'chat',
-            'message': event['message'],
-            'sender': event['sender'],
-            'timestamp': event.get('timestamp', '')
-        }))
+    async def chat_message(self, event):
+        # The frame was encoded once by the sender for the whole group.
+        await self.send(text_data=event['text'])
 
-    def _send_connection_established_message(self):
-        self.send(text_data=json.dumps({
+    async def _send_connection_established_message(self):
+        await self.send(text_data=json.dumps({
             'type': 'connection_established',
             'message': f"You are now connected to chat room {self.room_group_name}!",
         }))
 
-    def _handle_chat_message(self, text_data_json):
+    async def _handle_chat_message(self, text_data_json):
         message = text_data_json.get('message', '')
         if not message:
             logger.warning("Received empty message content.")
             return
 
         sender_username = self.user.username if self.user and self.user.is_authenticated else 'Anonymous'
-        timestamp = get_current_timestamp()
+        fields = {'message': message, 'sender': sender_username, 'timestamp': get_current_timestamp()}
 
-        async_to_sync(self.channel_layer.group_send)(
+        entry_id = await store_chat_message(room_chat_key(self.room_code), **fields,
+                                            maxlen=REDIS_ROOM_CHAT_STREAM_MAXLEN)
+        await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'chat_message',
-                'message': message,
-                'sender': sender_username,
-                'timestamp': timestamp
+                'text': json.dumps(chat_frame(entry_id, fields)),
             }
         )
-        store_message_in_redis_list(
-            list_name=f'recent_messages_{self.room_code}',
-            message=message,
-            sender=sender_username,
-            timestamp=timestamp
-        )
+        await refresh_room_ttl(self.room_code)
+
+    async def _send_chat_history(self, before=None):
+        messages, cursor = await fetch_chat_history(room_chat_key(self.room_code), before=before)
+        await self.send(text_data=json.dumps({
+            'type': 'chat_history',
+            'messages': messages,
+            'cursor': cursor,
+        }))
 
-    def _send_recent_messages(self):
-        recent_messages = fetch_redis_list(f'recent_messages_{self.room_code}')
-        for message in recent_messages:
-            self.send(text_data=json.dumps({
-                'type': 'chat',
-                'message': message['message'],
-                'sender': message['sender'],
-                'timestamp': message['timestamp'],
-            }))
+    @staticmethod
+    def _history_cursor(text_data_json):
+        before = text_data_json.get('before')
+        return before if isinstance(before, str) and before else None
 
 
-class SearchQueueConsumer(WebsocketConsumer):
-    def connect(self):
+class SearchQueueConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
         jwt_token = self.scope['url_route']['kwargs']['jwt_token']
         host_code = self.scope['url_route']['kwargs']['host_code']
 
-        self._initialize_user(jwt_token)
-        self._add_to_group()
-        self._add_user_to_queue(host_code)
-        self._send_connection_message()
+        if not await self._initialize_user(jwt_token):
+            return
+        await self._add_to_group()
+        await self._add_user_to_queue(host_code)
+        await self._send_connection_message()
 
-    def disconnect(self, code):
-        self._remove_from_group()
-        self._remove_user_from_queue()
+    async def disconnect(self, code):
+        if getattr(self, 'user', None) is None:
+            return
+        if getattr(self, 'lease_task', None) is not None:
+            self.lease_task.cancel()
+        await self._remove_from_group()
+        await self._remove_user_from_queue()
 
-    def match_found(self, event):
-        self._notify_match_found(event)
+    async def match_found(self, event):
+        await self._notify_match_found(event)
 
-    def _initialize_user(self, jwt_token):
+    async def _initialize_user(self, jwt_token):
         try:
-            self.user = get_user_from_jwt_token(jwt_token)
+            self.user = await database_sync_to_async(get_user_from_jwt_token)(jwt_token)
             self.room_group_name = f'queue_member_{self.user.id}'
+            return True
         except Exception as e:
             logger.error(f"Error initializing user: {e}")
-            self.close()
+            self.user = None
+            await self.close()
+            return False
 
-    def _add_to_group(self):
+    async def _add_to_group(self):
         try:
-            async_to_sync(self.channel_layer.group_add)(
+            await self.channel_layer.group_add(
                 self.room_group_name,
                 self.channel_name
             )
-            self.accept()
+            await self.accept()
         except Exception as e:
             logger.error(f"Error adding to group: {e}")
-            self.close()
+            await self.close()
 
-    def _add_user_to_queue(self, host_code):
+    async def _add_user_to_queue(self, host_code):
         try:
-            add_user_to_queue(player_id=self.user.id, skill_rating=self.user.skill_rating, host=host_code)
+            opponent = await add_user_to_queue(player_id=self.user.id, skill_rating=self.user.skill_rating,
+                                               host=host_code, window=SKILL_WINDOW)
         except Exception as e:
             logger.error(f"Error adding user to queue: {e}")
-            self.close()
-
-    def _send_connection_message(self):
+            await self.close()
+            return
+        # The entry lives as long as this socket keeps renewing its lease, also after a requeue.
+        self.lease_task = asyncio.create_task(self._renew_lease(host_code))
+        if opponent is not None:
+            await self._start_match({'player_id': self.user.id, 'host': host_code}, *opponent)
+
+    async def _renew_lease(self, host_code):
+        while True:
+            await asyncio.sleep(REDIS_QUEUE_LEASE_RENEW_SECONDS)
+            try:
+                await renew_queue_lease(self.user.id, host_code)
+            except Exception as e:
+                logger.error(f"Error renewing queue lease of user {self.user.id}: {e}")
+
+    async def _start_match(self, player_data, opponent_data, opponent_skill, opponent_joined):
+        # Both players already left the queue; if their room cannot be created the sweep gets another go.
+        game_room = await database_sync_to_async(create_match_room)(player_data, opponent_data)
+        if game_room is None:
+            now = (await async_redis_client.time())[0]
+            async with async_redis_client.pipeline(transaction=True) as pipe:
+                requeue_players(pipe, [
+                    (player_data, self.user.skill_rating, now),
+                    (opponent_data, opponent_skill, opponent_joined),
+                ], now)
+                await pipe.execute()
+
+    async def _send_connection_message(self):
         try:
-            self.send(text_data=json.dumps({
+            await self.send(text_data=json.dumps({
                 'type': 'connection_established',
                 'message': 'You are now connected!',
+                'expectedWait': await expected_wait(self.user.skill_rating),
             }))
         except Exception as e:
             logger.error(f"Error sending connection message: {e}")
 
-    def _remove_from_group(self):
+    async def _remove_from_group(self):
         try:
-            async_to_sync(self.channel_layer.group_discard)(
+            await self.channel_layer.group_discard(
                 self.room_group_name,
                 self.channel_name
             )
         except Exception as e:
             logger.error(f"Error removing from group: {e}")
 
-    def _remove_user_from_queue(self):
+    async def _remove_user_from_queue(self):
         try:
-            delete_user_from_queue(
+            await delete_user_from_queue(
                 player_id=self.user.id,
                 host=self.scope['url_route']['kwargs']['host_code']
             )
         except Exception as e:
             logger.error(f"Error removing user from queue: {e}")
 
-    def _notify_match_found(self, event):
+    async def _notify_match_found(self, event):
         try:
             game_room_code = event['gameRoomCode']
-            self.send(text_data=json.dumps({
+            await self.send(text_data=json.dumps({
                 'type': 'match_found',
                 'gameRoomCode': game_room_code,
             }))
@@ -293,182 +395,357 @@ class SearchQueueConsumer(WebsocketConsumer):
             logger.error(f"Error notifying match found: {e}")
 
 
-class GameRoomConsumer(WebsocketConsumer):
+class GameRoomConsumer(AsyncWebsocketConsumer):
     """ Public """
-    def connect(self):
+    async def connect(self):
         self.room_code = self.scope['url_route']['kwargs']['room_code']
         self.room_group_name = f'game_room_{self.room_code}'
-
-        async_to_sync(self.channel_layer.group_add)(
+        (self.player_type, self.board_size, self.win_length,
+         self.seats, self.bot_level) = await self._load_room_settings()
+        # In a bot room this consumer plays the seat the host left free on the bot's behalf.
+        self.bot_seat = None
+        if self.bot_level and self.player_type:
+            self.bot_seat = 'o' if self.player_type == 'x' else 'x'
+        self.bot_task = None
+        self.is_finished = False
+        # Clients that offer the binary subprotocol get fixed layout frames, everyone else JSON.
+        self.binary = BINARY_SUBPROTOCOL in self.scope.get('subprotocols', [])
+        self.rate_limiter = RateLimiter.for_scope('game', self.scope, self.channel_name)
+
+        await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
 
-        self.accept()
+        await self.accept(subprotocol=BINARY_SUBPROTOCOL if self.binary else None)
+
+        if self.bot_seat:
+            await store_ready(self.room_code, self.bot_seat, ttl=REDIS_GAMEROOM_EXPIRATION_SECONDS)
+
+        # A reconnecting client names the last seq it saw and only gets the moves it missed.
+        last_seq = self._last_seq_from_query()
+        replay = await self._load_replay(last_seq) if last_seq is not None else None
+        if replay:
+            await self._send_frame(replay)
+        else:
+            await self._send_connection_established(await self._load_room_snapshot())
 
-        self._send_connection_established()
+        if self.bot_seat:
+            await self._resume_bot()
 
-        set_redis_expiation(f"ready_{self.room_code}", 3600)
-        set_redis_expiation(f"latest_gamestate_{self.room_code}", 3600)
+    async def disconnect(self, code):
+        if self.bot_seat:
+            # Nobody is left to answer: stop the bot thinking and free its search state.
+            if self.bot_task is not None:
+                self.bot_task.cancel()
+            search_service.release(self.room_code)
+
+        await self.channel_layer.group_discard(
+            self.room_group_name,
+            self.channel_name
+        )
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if not await admit(self):
+            return
+        if bytes_data is not None:
+            text_data_json = await self._decode_binary_with_error_handling(bytes_data)
+        else:
+            text_data_json = await self._load_json_with_error_handling(text_data)
+        if not isinstance(text_data_json, dict):
+            return
 
-    def receive(self, text_data=None, bytes_data=None):
-        text_data_json = self._load_json_with_error_handling(text_data)
-        match text_data_json['type']:
+        match text_data_json.get('type'):
 
-            case 'game_state':
-                self._handle_game_state(text_data_json)
+            case 'move':
+                await self._handle_move(text_data_json)
 
             case'time_win':
-                self._handle_time_win(text_data_json)
+                await self._handle_time_win(text_data_json)
 
             case 'game_started':
-                self._handle_game_start(text_data_json)
+                await self._handle_game_start(text_data_json)
 
             case 'ready':
-                self._handle_ready_status(text_data_json)
+                await self._handle_ready_status(text_data_json)
 
             case 'latest_gamestate_request':
-                self._handle_latest_gamestate()
+                await self._handle_latest_gamestate()
+
+            case 'resume':
+                await self._handle_resume(text_data_json)
 
             case 'acknowledgement':
-                self._broadcast_acknowledgement(text_data_json)
+                await self._broadcast_acknowledgement(text_data_json)
 
             case _:
-                logger.warning(f"Unknown message type: {text_data_json['type']}")
+                logger.warning(f"Unknown message type: {text_data_json.get('type')}")
 
-    def acknowledgement(self, event):
-        player_x = event['player_x']
-        player_o = event['player_o']
+    async def acknowledgement(self, event):
+        await self._forward(event)
+
+    async def ready(self, event):
+        await self._forward(event)
+
+    async def move_message(self, event):
+        if event.get('finished'):
+            self.is_finished = True
+        await self._forward(event)
+
+    async def game_over_message(self, event):
+        self.is_finished = True
+        await self._forward(event)
 
-        self.send(text_data=json.dumps({
-            'type': 'acknowledgement',
-            'player_x': player_x,
-            'player_o': player_o
-        }))
 
-    def ready(self, event):
+    """ Private """
+    async def _handle_move(self, text_data_json):
+        """
+        Apply a single move to the board held in Redis and broadcast it as a delta.
+        The client only names the cell and the sequence number of the state it played on.
+        """
         try:
-            player_type = event.get("player_type")
-            if not player_type:
-                logger.error("Missing player_type in ready event.")
+            index = text_data_json.get('index')
+            seq = text_data_json.get('seq')
+
+            game_state = await self._load_latest_gamestate()
+            board = self._board_from_gamestate(game_state)
+            rejection = self._validate_move(game_state, board, index, seq)
+            if rejection:
+                await self._reject_move(rejection, game_state)
                 return
 
-            self.send(text_data=json.dumps({
-                'type': f'ready_{player_type}',
-                f'isReadyPlayer_{player_type}': True,
-            }))
+            user = self.scope['user']
+            if not await self._play_move(board, game_state, index, self.player_type, user.id, user.username):
+                return
+            if self.bot_seat == game_state['xIsNext'] and not game_state['winner']:
+                self._start_bot_move(board, game_state)
         except Exception as e:
-            logger.error(f"Error sending ready signal: {e}", exc_info=True)
-
-    def game_state_message(self, event):
+            logger.error(f"Unexpected error handling move: {e}", exc_info=True)
+
+    async def _play_move(self, board, game_state, index, seat, player_id, player_name):
+        """
+        Play a validated move for seat, store it with a compare-and-set on the seq of game_state and
+        broadcast it. board and game_state are updated in place. Returns False if the store lost the race.
+        """
+        seq = game_state['seq']
+        player = seat.upper()
+        winner_type = board.play(index, player)
+        draw = not winner_type and board.is_draw()
+
+        # Only the player to move can complete a line, so the winner is always the player of this move.
+        game_state['x'], game_state['o'], game_state['open'] = board.x_bits, board.o_bits, board.open_lines
+        game_state['xIsNext'] = 'o' if seat == 'x' else 'x'
+        game_state['winner'] = player_name if winner_type else ('draw' if draw else None)
+        game_state['deadline'] = 0 if game_state['winner'] else get_current_time_ms() + MOVE_TIMEOUT_SECONDS * 1000
+        move_frame = {
+            'type': 'move',
+            'index': index,
+            'player': player,
+            'seq': seq + 1,
+            'xIsNext': game_state['xIsNext'],
+            'winner': game_state['winner'] if winner_type else None,
+            'draw': draw,
+            'timeLeft': None,  # only meaningful when sent live, filled in by _send_move()
+        }
+
+        status, game_state['seq'] = await apply_move(self.room_code,
+                                                     expected_seq=seq,
+                                                     fields=self._gamestate_fields(game_state),
+                                                     frame=json.dumps(move_frame),
+                                                     ttl=REDIS_GAMEROOM_EXPIRATION_SECONDS)
+        if status != MOVE_APPLIED:
+            await self._reject_move('stale_seq' if status == MOVE_STALE else 'game_over',
+                                    await self._load_latest_gamestate())
+            return False
+
+        if winner_type or draw:
+            timer_wheel.cancel(self.room_code)
+        else:
+            # The opponent has to answer within the timeout, otherwise this player wins.
+            timer_wheel.schedule(self.room_code, MOVE_TIMEOUT_SECONDS, self._finish_on_time,
+                                 self.channel_layer, self.room_code, game_state['seq'], seat, player_id, player_name)
+
+        await self._send_move(move_frame, game_state)
+        if winner_type or draw:
+            # The event log holds every move of the game; it is read and dropped with the room.
+            moves = await purge_room(self.room_code)
+            await self._finalize_game(seat if winner_type else 'draw', player_id if winner_type else None, moves)
+        return True
+
+    def _start_bot_move(self, board, game_state):
+        """ The bot thinks in a task of its own, so this socket keeps receiving and can cancel it on disconnect. """
+        self.bot_task = asyncio.create_task(self._play_bot_move(board, game_state))
+
+    async def _resume_bot(self):
+        """ The bot task died with the last socket of the host, so a reconnect owes the room the bot's move. """
         try:
-            game_state = {
-                'type': 'game_state',
-                'squares': event.get('squares'),
-                'winner': event.get('winner'),
-                'player_x': event.get('player_x'),
-                'player_o': event.get('player_o'),
-                'xIsNext': event.get('xIsNext'),
-            }
-
-            self.send(text_data=json.dumps(game_state))
-        except ValueError as ve:
-            logger.error(f"Validation error in game_state_message: {ve}", exc_info=True)
+            room = await async_redis_client.hgetall(room_key(self.room_code))
         except Exception as e:
-            logger.error(f"Unexpected error in game_state_message: {e}", exc_info=True)
-
-
-    """ Private """
-    def _handle_game_state(self, text_data_json):
+            logger.error(f"Error loading game state from Redis for room {self.room_code}: {e}", exc_info=True)
+            return
+        # Before the start the bot opens from _handle_game_start.
+        if 'seq' not in room:
+            return
+        game_state = self._parse_gamestate(room)
+        if game_state['xIsNext'] == self.bot_seat and not game_state['winner']:
+            self._start_bot_move(self._board_from_gamestate(game_state), game_state)
+
+    async def _play_bot_move(self, board, game_state):
+        """
+        Classic boards are answered from the position table, larger ones by the search service in a
+        worker process. The bot has no user, so a bot win has no winner id and is told apart by its result seat.
+        """
         try:
-            logger.debug(text_data_json)
-            squares = text_data_json['squares']
-            winner = self.calculate_winner(squares)
-
-            if winner:
-                player_x_inst, player_o_inst = self._get_players_instances(text_data_json)
-                if not player_x_inst or not player_o_inst:
-                    logger.error("Failed to retrieve player instances. Aborting game state processing.")
-                    return
-
-                winner, loser = self._found_winner_and_loser_via_winner_type(player_x_inst, player_o_inst, winner)
-                self._process_players_skill_ratings(winner, loser)
-                self._process_played_game(room_code=self.room_code,
-                                          winner=winner,
-                                          player_x_inst=player_x_inst,
-                                          player_o_inst=player_o_inst)
-
-                winner = winner.username
+            if has_table(board.size, board.win_length):
+                index = choose_move(board, self.bot_level)
             else:
-                logger.info("No winner yet. Continuing game.")
-
-            self._send_gamestate(winner=winner, data=text_data_json)
-            self._store_latest_gamestate_in_redis(squares, text_data_json)
-        except KeyError as e:
-            logger.error(f"Missing key in game state data: {e}", exc_info=True)
+                index = await search_service.best_move(self.room_code, board, self.bot_level)
+                if index is None:
+                    return
+            await self._play_move(board, game_state, index, self.bot_seat, None, bot_name(self.bot_level))
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            logger.error(f"Unexpected error handling game state: {e}", exc_info=True)
+            logger.error(f"Bot failed to move in room {self.room_code}: {e}", exc_info=True)
+
+    def _validate_move(self, game_state, board, index, seq):
+        if self.player_type is None:
+            return 'not_a_player'
+        if self.is_finished or game_state['winner']:
+            return 'game_over'
+        if seq != game_state['seq']:
+            return 'stale_seq'
+        if game_state['xIsNext'] != self.player_type:
+            return 'not_your_turn'
+        if not board.is_valid_index(index):
+            return 'invalid_index'
+        if not board.is_empty(index):
+            return 'square_taken'
+        return None
 
-    def _handle_time_win(self, text_data_json):
+    async def _reject_move(self, reason, game_state):
+        logger.warning(f"Rejected move in room {self.room_code}: {reason}")
+        await self._send_frame({
+            'type': 'move_rejected',
+            'reason': reason,
+            'seq': game_state['seq'],
+        })
+        await self._send_gamestate(game_state)
+
+    async def _handle_time_win(self, text_data_json):
+        """
+        A client reports that the move clock ran out. The move clock normally finishes the game on
+        its own; this only covers a timer that was lost with its worker. The server decides the
+        winner from the stored deadline, whatever the client claims.
+        """
         try:
-            winner_username = text_data_json.get('winner')
-            if not winner_username:
-                logger.error("Winner username not provided in time win event.")
+            game_state = await self._load_latest_gamestate()
+            if game_state['winner'] or not game_state['deadline']:
                 return
-
-            player_x_inst, player_o_inst = self._get_players_instances(text_data_json)
-            if not player_x_inst or not player_o_inst:
-                logger.error("Failed to retrieve player instances for time win. Aborting.")
+            if get_current_time_ms() < game_state['deadline']:
+                logger.warning(f"Early time win claim in room {self.room_code}")
                 return
 
-            winner, loser = self._found_winner_and_loser(player_x_inst, player_o_inst, winner_username)
-
-            self._process_players_skill_ratings(winner, loser)
-            self._process_played_game(room_code=self.room_code,
-                                      winner=winner,
-                                      player_x_inst=player_x_inst,
-                                      player_o_inst=player_o_inst)
+            winner_seat = 'o' if game_state['xIsNext'] == 'x' else 'x'
+            winner = await self._seat_winner(winner_seat)
+            if winner is None:
+                logger.error(f"Failed to resolve time win winner for room {self.room_code}")
+                return
 
-            self._store_latest_gamestate_in_redis(text_data_json['squares'], text_data_json)
-            self._send_gamestate(winner=winner.username, data=text_data_json)
-        except KeyError as e:
-            logger.error(f"Missing key in time win data: {e}", exc_info=True)
+            await self._finish_on_time(self.channel_layer, self.room_code, game_state['seq'], winner_seat, *winner)
         except Exception as e:
             logger.error(f"Unexpected error handling time win: {e}", exc_info=True)
 
+    async def _seat_winner(self, seat):
+        """ Returns (winner_id, winner_username) of seat winning, None if its player cannot be resolved. """
+        if seat == self.bot_seat:
+            return None, bot_name(self.bot_level)
+        player = (await self._get_players()).get(seat)
+        if player is None:
+            return None
+        return player.id, player.username
 
+    @staticmethod
+    async def _finish_on_time(channel_layer, room_code, seq, winner_seat, winner_id, winner_username):
+        """
+        Finishes the game when the player to move let the clock run out. Scheduled on the move clock,
+        so it may run after the sockets of the room are gone and must not rely on consumer state.
+        """
+        try:
+            # Only the first timer or claim for this seq flips the state; any later one is a no-op.
+            if not await finish_game(room_code, seq, winner_username):
+                return
 
-    def _handle_game_start(self, text_data_json):
-        if not PlayedGame.objects.filter(code=self.room_code).exists():
-            player_x = User.objects.get(username=text_data_json.get('player_x', None))
-            player_o = User.objects.get(username=text_data_json.get('player_o', None))
-
-            played_game = PlayedGame(code=self.room_code,
-                                     player_x=player_x,
-                                     player_o=player_o)
-            try:
-                played_game.save()
-            except IntegrityError as e:
-                logger.error(f"Error saving played game: {played_game} : {e}")
-        else:
-            logger.warning(f"Game already started: {self.room_code}")
+            await channel_layer.group_send(f'game_room_{room_code}', {
+                'type': 'game_over_message',
+                **encode_group_frame({
+                    'type': 'game_over',
+                    'winner': winner_username,
+                }),
+            })
+            moves = await purge_room(room_code)
+            await sync_to_async(finalize_game.delay, thread_sensitive=False)(room_code, winner_seat, winner_id, moves)
+        except Exception as e:
+            logger.error(f"Failed to finish game on time in room {room_code}: {e}", exc_info=True)
+
+    async def _handle_game_start(self, text_data_json):
+        await self._create_played_game()
+        await self._start_move_clock()
+        if self.bot_seat == 'x':
+            # The bot opens the game; a repeated start finds the board no longer empty.
+            game_state = await self._load_latest_gamestate()
+            if game_state['seq'] == 0:
+                self._start_bot_move(self._board_from_gamestate(game_state), game_state)
+
+    async def _start_move_clock(self):
+        """
+        Stores the initial state with the deadline of the first move, so X loses on time like any
+        later player to move. Only the first start of the room sets the clock.
+        """
+        game_state = self._new_gamestate()
+        game_state['deadline'] = get_current_time_ms() + MOVE_TIMEOUT_SECONDS * 1000
+        try:
+            if not await start_game(self.room_code, self._gamestate_fields(game_state),
+                                    ttl=REDIS_GAMEROOM_EXPIRATION_SECONDS):
+                return
+            winner = await self._seat_winner('o')
+        except Exception as e:
+            logger.error(f"Failed to start the move clock in room {self.room_code}: {e}", exc_info=True)
+            return
+        if winner is None:
+            # The claim of O after the deadline still finishes the game through _handle_time_win.
+            logger.error(f"Failed to resolve the player of seat o in room {self.room_code}")
+            return
+        timer_wheel.schedule(self.room_code, MOVE_TIMEOUT_SECONDS, self._finish_on_time,
+                             self.channel_layer, self.room_code, game_state['seq'], 'o', *winner)
 
-    def _handle_ready_status(self, text_data_json):
+    async def _handle_ready_status(self, text_data_json):
         is_ready_player_x = text_data_json.get('isReadyPlayer_x', None)
         is_ready_player_o = text_data_json.get('isReadyPlayer_o', None)
 
         if is_ready_player_x:
-            self._broadcast_ready_player('x')
-            self._store_ready_status_in_redis({'isReadyPlayer_x': True})
+            await self._store_ready_status_in_redis('x')
         if is_ready_player_o:
-            self._broadcast_ready_player('o')
-            self._store_ready_status_in_redis({'isReadyPlayer_o': True})
-
-    def _handle_latest_gamestate(self):
-        self._send_ready_status_if_exists()
-        self._send_latest_gamestate_if_exists()
+            await self._store_ready_status_in_redis('o')
+
+    async def _handle_latest_gamestate(self):
+        await self._send_frame({
+            'type': 'room_snapshot',
+            **await self._load_room_snapshot(),
+        })
+
+    async def _handle_resume(self, text_data_json):
+        last_seq = text_data_json.get('lastSeq')
+        if not isinstance(last_seq, int) or isinstance(last_seq, bool) or last_seq < 0:
+            logger.warning(f"Invalid lastSeq in resume request for room {self.room_code}: {last_seq!r}")
+            last_seq = None
+        replay = await self._load_replay(last_seq) if last_seq is not None else None
+        if replay:
+            await self._send_frame(replay)
+        else:
+            await self._handle_latest_gamestate()
 
-    def _broadcast_acknowledgement(self, text_data_json):
+    async def _broadcast_acknowledgement(self, text_data_json):
         try:
             if not isinstance(text_data_json, dict):
                 logger.error("Invalid data format. Expected a dictionary.")
@@ -476,557 +753,300 @@ class GameRoomConsumer(WebsocketConsumer):
 
             player_x = text_data_json.get('player_x', None) # None is allowed. -> no check
             player_o = text_data_json.get('player_o', None) # None is allowed. -> no check
+            if not all(isinstance(player, (str, type(None))) for player in (player_x, player_o)):
+                logger.error("Invalid player names in acknowledgement.")
+                return
 
-            async_to_sync(self.channel_layer.group_send)(
+            await self.channel_layer.group_send(
                 self.room_group_name,
                 {
                     'type': 'acknowledgement',
-                    'player_x': player_x,
-                    'player_o': player_o,
+                    **encode_group_frame({
+                        'type': 'acknowledgement',
+                        'player_x': player_x,
+                        'player_o': player_o,
+                    }),
                 }
             )
         except Exception as e:
             logger.error(f"Error broadcasting acknowledgement: {e}", exc_info=True)
 
-    def _broadcast_ready_player(self, player_type):
+    async def _broadcast_ready_player(self, player_type):
         try:
             if not player_type:
                 logger.error("Player type is required for broadcasting readiness.")
                 return
 
-            async_to_sync(self.channel_layer.group_send)(
+            await self.channel_layer.group_send(
                 self.room_group_name,
                 {
                     'type': 'ready',
-                    'player_type': player_type,
+                    **encode_group_frame({
+                        'type': f'ready_{player_type}',
+                        f'isReadyPlayer_{player_type}': True,
+                    }),
                 }
             )
         except Exception as e:
             logger.error(f"Error broadcasting ready status for player {player_type}: {e}", exc_info=True)
 
-    def _send_ready_status_if_exists(self):
+    async def _store_ready_status_in_redis(self, player_type):
         try:
-            latest_ready_state = redis_client.get(f'ready_{self.room_code}')
+            newly_ready, _, _ = await store_ready(self.room_code, player_type,
+                                                  ttl=REDIS_GAMEROOM_EXPIRATION_SECONDS)
         except Exception as e:
-            logger.error(f"Error getting ready state from Redis: {e}")
+            logger.error(f"Failed to store ready status in Redis for room {self.room_code}: {e}", exc_info=True)
             return
 
-        if latest_ready_state:
-            ready_state = self._load_json_with_error_handling(latest_ready_state)
-            if ready_state['isReadyPlayer_o'] is True:
-                self._send_ready_player('o')
-            if ready_state['isReadyPlayer_x'] is True:
-                self._send_ready_player('x')
-
-    def _send_ready_player(self, player_type):
-        if not player_type:
-            logger.error(f"No player type was passed : {player_type}") # Player type 'x' or 'o'
-        self.send(text_data=json.dumps({
-            'type': f'ready_{player_type}',
-            f'isReadyPlayer_{player_type}': True,
-        }))
-
-    def _store_ready_status_in_redis(self, status_dict): # TODO
-        key = f'ready_{self.room_code}'
-        existing_state = redis_client.get(key)
-
-        if existing_state:
-            ready_state = self._load_json_with_error_handling(existing_state)
-        else:
-            ready_state = {
-                'isReadyPlayer_o': None,
-                'isReadyPlayer_x': None
-            }
-        ready_state.update(status_dict)
-
-        redis_client.set(key, json.dumps(ready_state))
-
-    def _store_latest_gamestate_in_redis(self, squares, data):
+        if newly_ready:
+            await self._broadcast_ready_player(player_type)
+
+    async def _load_latest_gamestate(self):
+        latest_gamestate = await async_redis_client.hgetall(room_key(self.room_code))
+        if 'seq' in latest_gamestate:
+            return self._parse_gamestate(latest_gamestate)
+        return self._new_gamestate()
+
+    async def _load_room_snapshot(self):
+        """
+        Refresh the room TTLs and read the ready flags and game state in one pipelined round trip.
+        gameState is None until the game has been started.
+        """
+        room = {}
         try:
-            x_is_next = data.get('xIsNext')
-            if x_is_next is None:
-                logger.warning(f"xIsNext was not provided or is invalid in data: {data}")
-
-            redis_payload = {
-                'type': 'game_state_message',
-                'squares': squares,
-                'xIsNext': x_is_next,
-            }
-
-            redis_client.set(f'latest_gamestate_{self.room_code}', json.dumps(redis_payload))
-            logger.info(f"Game state stored in Redis for room {self.room_code}: {redis_payload}")
-
+            async with async_redis_client.pipeline(transaction=False) as pipe:
+                for key in room_keys(self.room_code):
+                    pipe.expire(key, REDIS_GAMEROOM_EXPIRATION_SECONDS)
+                pipe.hgetall(room_key(self.room_code))
+                room = (await pipe.execute())[-1]
         except Exception as e:
-            logger.error(f"Failed to store game state in Redis for room {self.room_code}: {e}", exc_info=True)
-
-    def _send_latest_gamestate_if_exists(self):
-        latest_gamestate = redis_client.get(f"latest_gamestate_{self.room_code}")
-        if latest_gamestate:
-            game_state = json.loads(latest_gamestate)
-            logger.info(game_state)
-            self.send(text_data=json.dumps({
-                'type': 'latest_gamestate',
-                'squares': game_state['squares'],
-                'xIsNext': game_state['xIsNext'],
-            }))
-
-    def _send_connection_established(self):
-        self.send(text_data=json.dumps({
-            'type': 'connection_established',
-            'message': 'You are now connected!',
-        }))
-
-
-    """ Utils"""
-    @staticmethod
-    def _get_player_instance_from_username(username):
+            logger.error(f"Error loading room snapshot from Redis for room {self.room_code}: {e}", exc_info=True)
+
+        return {
+            'isReadyPlayer_x': 'ready_x' in room,
+            'isReadyPlayer_o': 'ready_o' in room,
+            'gameState': self._gamestate_payload(self._parse_gamestate(room)) if 'seq' in room else None,
+        }
+
+    async def _load_replay(self, last_seq):
+        """
+        Refresh the room TTLs and read the moves after last_seq from the room event log in one round trip.
+        Returns None if the log does not reach back to last_seq, the caller then sends a full snapshot.
+        """
         try:
-            return User.objects.get(username=username)
-        except User.DoesNotExist:
-            logger.error(f"User with username '{username}' does not exist.")
-            return None
+            room, frames = await resume_room(self.room_code, last_seq, REDIS_GAMEROOM_EXPIRATION_SECONDS)
         except Exception as e:
-            logger.error(f"Unexpected error retrieving user '{username}': {e}", exc_info=True)
+            logger.error(f"Error loading event log from Redis for room {self.room_code}: {e}", exc_info=True)
+            return None
+        if frames is None:
             return None
 
-    @staticmethod
-    def _found_winner_and_loser(player_x_inst, player_o_inst, winner):
-        logger.debug(f"Found winner: {winner}")
-        logger.debug(f"Found player_x_inst: {player_x_inst.username}")
-        logger.debug(f"Found player_o_inst: {player_o_inst.username}")
-        if winner == player_x_inst.username:
-            winner = player_x_inst
-            loser = player_o_inst
-
-        elif winner == player_o_inst.username:
-            winner = player_o_inst
-            loser = player_x_inst
-        else:
-            logger.error("Invalid winner")
-            return None, None
+        game_state = self._parse_gamestate(room) if 'seq' in room else self._new_gamestate()
+        return {
+            'type': 'replay',
+            'isReadyPlayer_x': 'ready_x' in room,
+            'isReadyPlayer_o': 'ready_o' in room,
+            'seq': game_state['seq'],
+            'winner': game_state['winner'],
+            'timeLeft': self._time_left_ms(game_state),
+            'events': [json.loads(frame) for frame in frames],
+        }
+
+    async def _send_gamestate(self, game_state):
+        await self._send_frame({
+            'type': 'latest_gamestate',
+            **self._gamestate_payload(game_state),
+        })
+
+    async def _send_connection_established(self, snapshot):
+        await self._send_frame({
+            'type': 'connection_established',
+            'message': 'You are now connected!',
+            **snapshot,
+        })
 
-        return winner, loser
+    async def _send_frame(self, frame):
+        if self.binary:
+            await self.send(bytes_data=encode_server_frame(frame))
+        else:
+            await self.send(text_data=json.dumps(frame))
 
-    @staticmethod
-    def _found_winner_and_loser_via_winner_type(player_x_inst, player_o_inst, winner_type):
-        if winner_type == 'X':
-            winner = player_x_inst
-            loser = player_o_inst
-        elif winner_type == 'O':
-            winner = player_o_inst
-            loser = player_x_inst
+    async def _forward(self, event):
+        """ Sends a group event in the encoding this socket negotiated; both were built once by the sender. """
+        if self.binary:
+            await self.send(bytes_data=event['bytes'])
         else:
-            logger.error("Invalid winner type")
-            return None, None
+            await self.send(text_data=event['text'])
+
 
-        return winner, loser
+    """ Utils"""
+    def _new_gamestate(self):
+        board = Board(size=self.board_size, win_length=self.win_length)
+        return {
+            'size': board.size,
+            'k': board.win_length,
+            'x': 0,
+            'o': 0,
+            'open': board.open_lines,
+            'xIsNext': 'x',
+            'seq': 0,
+            'winner': None,
+            'deadline': 0,
+        }
 
     @staticmethod
-    def _process_players_skill_ratings(winner, loser):
-        # TODO: Implement players ratings
-        logger.warning("NOT IMPLEMENTED")
+    def _parse_gamestate(raw_state):
+        return {
+            'size': int(raw_state['size']),
+            'k': int(raw_state['k']),
+            'x': int(raw_state['x']),
+            'o': int(raw_state['o']),
+            'open': int(raw_state['open']),
+            'xIsNext': raw_state['xIsNext'],
+            'seq': int(raw_state['seq']),
+            'winner': raw_state.get('winner') or None,
+            'deadline': int(raw_state.get('deadline') or 0),
+        }
 
     @staticmethod
-    def _delete_gameroom(room_code):
-        try:
-            GameRoom.objects.filter(code=room_code).delete()
-            logger.info(f"Successfully deleted GameRoom with code {room_code}")
-        except Exception as e:
-            logger.error(f"Failed to delete GameRoom with code {room_code}: {e}", exc_info=True)
+    def _gamestate_fields(game_state):
+        """ Hash fields written by the move script; seq is maintained by the script itself. """
+        return {
+            'size': game_state['size'],
+            'k': game_state['k'],
+            'x': game_state['x'],
+            'o': game_state['o'],
+            'open': game_state['open'],
+            'xIsNext': game_state['xIsNext'],
+            'winner': game_state['winner'] or '',
+            'deadline': game_state['deadline'],
+        }
+
+    @classmethod
+    def _gamestate_payload(cls, game_state):
+        return {
+            'squares': cls._board_from_gamestate(game_state).to_squares(),
+            'boardSize': game_state['size'],
+            'winLength': game_state['k'],
+            'xIsNext': game_state['xIsNext'],
+            'seq': game_state['seq'],
+            'winner': game_state['winner'],
+            'timeLeft': cls._time_left_ms(game_state),
+        }
 
     @staticmethod
-    def calculate_winner(squares):
-        winning_combination = [
-            [0, 1, 2],
-            [3, 4, 5],
-            [6, 7, 8],
-            [0, 3, 6],
-            [1, 4, 7],
-            [2, 5, 8],
-            [0, 4, 8],
-            [2, 4, 6]
-        ]
-
-        for combination in winning_combination:
-            a, b, c = combination
-            if squares[a] and squares[a] == squares[b] and squares[a] == squares[c]:
-                return squares[a]
+    def _time_left_ms(game_state):
+        """ Milliseconds left on the move clock, None while it is not running. """
+        if not game_state['deadline'] or game_state['winner']:
+            return None
+        return max(0, game_state['deadline'] - get_current_time_ms())
 
+    @staticmethod
+    def _board_from_gamestate(game_state):
+        return Board(game_state['x'], game_state['o'],
+                     size=game_state['size'],
+                     win_length=game_state['k'],
+                     open_lines=game_state['open'])
+
+    def _last_seq_from_query(self):
+        """ The lastSeq query parameter of a reconnect, None on a first connect or if it is not a valid seq. """
+        values = parse_qs(self.scope.get('query_string', b'').decode('latin-1')).get('lastSeq')
+        if values and values[0].isdigit():
+            return int(values[0])
         return None
 
-    def _get_players_instances(self, text_data_json):
-        try:
-            player_x_username = text_data_json.get('player_x')
-            player_o_username = text_data_json.get('player_o')
-
-            if not player_x_username or not player_o_username:
-                raise ValueError("Both player_x and player_o usernames are required.")
+    @database_sync_to_async
+    def _load_room_settings(self):
+        """ Returns (player_type, board_size, win_length, seats, bot_level) of the connecting user. """
+        game_room = self._get_gameroom_with_players()
+        if game_room is None:
+            return None, BOARD_SIZE, BOARD_SIZE, {'x': None, 'o': None}, ''
+
+        user = self.scope.get('user')
+        player_type = None
+        if user and user.is_authenticated:
+            if game_room.player_x_id == user.id:
+                player_type = 'x'
+            elif game_room.player_o_id == user.id:
+                player_type = 'o'
+        return (player_type, game_room.board_size, game_room.win_length,
+                self._cache_seats(game_room), game_room.bot_level)
+
+    @database_sync_to_async
+    def _load_seats(self):
+        game_room = self._get_gameroom_with_players()
+        if game_room is None:
+            logger.error(f"GameRoom with code {self.room_code} does not exist.")
+            return {'x': None, 'o': None}
+        return self._cache_seats(game_room)
+
+    def _get_gameroom_with_players(self):
+        return (GameRoom.objects.filter(code=self.room_code)
+                .select_related('player_x', 'player_o')
+                .only('player_x__username', 'player_o__username', 'board_size', 'win_length', 'bot_level')
+                .first())
 
-            player_x_inst = self._get_player_instance_from_username(player_x_username)
-            player_o_inst = self._get_player_instance_from_username(player_o_username)
-
-            return player_x_inst, player_o_inst
-        except ValueError as ve:
-            logger.error(f"Validation error: {ve}", exc_info=True)
-            return None, None
+    @staticmethod
+    def _cache_seats(game_room):
+        """ Puts the seated players into the process player cache and returns their ids per seat. """
+        for player in (game_room.player_x, game_room.player_o):
+            if player is not None:
+                player_cache.put(player.id, player.username)
+        return {'x': game_room.player_x_id, 'o': game_room.player_o_id}
+
+    async def _get_players(self):
+        """
+        Returns the cached player of each seat, None for the seat of the bot. The database is read only
+        when a seat that holds a user is not cached.
+        """
+        players = {seat: player_cache.get(user_id) if user_id else None for seat, user_id in self.seats.items()}
+        if any(player is None for seat, player in players.items() if seat != self.bot_seat):
+            # The opponent may have joined after this socket connected, or the entry expired.
+            self.seats = await self._load_seats()
+            players = {seat: player_cache.get(user_id) if user_id else None for seat, user_id in self.seats.items()}
+        return players
+
+    @database_sync_to_async
+    def _create_played_game(self):
+        try:
+            PlayedGame.objects.start_from_gameroom(self.room_code)
         except Exception as e:
-            logger.error(f"Error retrieving player instances: {e}", exc_info=True)
-            return None, None
-
-    def _process_played_game(self, room_code, winner, player_x_inst, player_o_inst):
-        self._delete_gameroom(room_code)
+            logger.error(f"Error saving played game for room {self.room_code}: {e}", exc_info=True)
 
+    async def _finalize_game(self, result, winner_id, moves):
+        """ Persisting the result runs in Celery, so the final broadcast never waits on the database. """
         try:
-            self._delete_gameroom(room_code)
-
-            played_game = PlayedGame.objects.get(code=room_code)
-            played_game.winner = winner
-            played_game.player_x = player_x_inst
-            played_game.player_o = player_o_inst
-            played_game.is_finished = True
-            played_game.save()
-
-            logger.info(f"Successfully processed played game for room code {room_code}")
-        except PlayedGame.DoesNotExist:
-            logger.error(f"PlayedGame with room code {room_code} does not exist", exc_info=True)
+            await sync_to_async(finalize_game.delay, thread_sensitive=False)(self.room_code, result, winner_id, moves)
         except Exception as e:
-            logger.error(f"Error processing played game for room code {room_code}: {e}", exc_info=True)
+            logger.error(f"Failed to enqueue finalization of room {self.room_code}: {e}", exc_info=True)
+        player_cache.invalidate(*(user_id for user_id in self.seats.values() if user_id))
 
-    def _send_gamestate(self, winner, data):
-        async_to_sync(self.channel_layer.group_send)(
+    async def _send_move(self, move_frame, game_state):
+        await self.channel_layer.group_send(
             self.room_group_name,
             {
-                'type': 'game_state_message',
-                'squares': data.get('squares', None),
-                'winner': winner,
-                'player_x': data.get('player_x', None),
-                'player_o': data.get('player_o', None),
-                'xIsNext': data.get('xIsNext', None),
+                'type': 'move_message',
+                'finished': bool(move_frame['winner'] or move_frame['draw']),
+                **encode_group_frame({**move_frame, 'timeLeft': self._time_left_ms(game_state)}),
             }
         )
 
 
-    def _load_json_with_error_handling(self, raw_data):
+    async def _decode_binary_with_error_handling(self, raw_data):
+        try:
+            return decode_client_frame(raw_data)
+        except ProtocolError as e:
+            logger.error(f"Invalid binary frame received in room {self.room_code}: {e}")
+            await self.close(code=4002)
+        return None
+
+    async def _load_json_with_error_handling(self, raw_data):
         try:
             return json.loads(raw_data)
         except json.JSONDecodeError as e:
             logger.error(f"Invalid JSON received: {raw_data}. Error: {e}", exc_info=True)
-            self.close(code=4000)
+            await self.close(code=4000)
         except TypeError as e:
             logger.error(f"Expected a string for JSON decoding but got: {raw_data}. Error: {e}", exc_info=True)
-            self.close(code=4001)
-        return None
-
-
-class GameRoomConsumerOld(WebsocketConsumer):
-    def connect(self):
-        self.room_code = self.scope['url_route']['kwargs']['room_code']
-        self.room_group_name = f"room_{self.room_code}"
-
-        async_to_sync(self.channel_layer.group_add)(
-            self.room_group_name,
-            self.channel_name
-        )
-
-        self.accept()
-
-        self.send(text_data=json.dumps({
-            'type': 'connection_established',
-            'message': 'You are now connected!',
-        }))
-        redis_client.expire(f"ready_{self.room_code}", 3600)
-        redis_client.expire(f"latest_gamestate_{self.room_code}", 3600)
-
-    def receive(self, text_data=None, bytes_data=None):
-        text_data_json = json.loads(text_data)
-
-        if text_data_json['type'] == 'latest_gamestate_request':
-            self.get_and_send_ready()
-            self.get_and_send_latest_gamestate()
-
-            return
-        elif text_data_json['type'] == "acknowledgement":
-            async_to_sync(self.channel_layer.group_send)(
-                self.room_group_name,
-                {
-                    'type': 'acknowledgement',
-                    'player_x': text_data_json.get('player_x', None),
-                    'player_o': text_data_json.get('player_o', None)
-                }
-
-            )
-            return
-        elif text_data_json['type'] == "ready":
-            is_ready_player_x = text_data_json.get('isReadyPlayer_x', None)
-            is_ready_player_o = text_data_json.get('isReadyPlayer_o', None)
-
-            if is_ready_player_x:
-                async_to_sync(self.channel_layer.group_send)(
-                    self.room_group_name,
-                    {
-                        'type': 'ready_x',
-                        'isReadyPlayer_x': is_ready_player_x,
-                    }
-
-                )
-                async_to_sync(self.channel_layer.group_send)(
-
-                    self.room_group_name,
-                    {
-                        'type': 'store_ready',
-                        'isReadyPlayer_x': is_ready_player_x,
-                    }
-                )
-            else:
-                async_to_sync(self.channel_layer.group_send)(
-                    self.room_group_name,
-                    {
-                        'type': 'ready_o',
-                        'isReadyPlayer_o': is_ready_player_o,
-                    }
-                )
-                async_to_sync(self.channel_layer.group_send)(
-
-                    self.room_group_name,
-                    {
-                        'type': 'store_ready',
-                        'isReadyPlayer_o': is_ready_player_o,
-                    }
-                )
-            return
-        elif text_data_json['type'] == "game_started":
-            if not PlayedGame.objects.filter(code=self.room_code).exists():
-                player_x = User.objects.get(username=text_data_json.get('player_x', None))
-                player_o = User.objects.get(username=text_data_json.get('player_o', None))
-
-                played_game = PlayedGame(code=self.room_code,
-                                         player_x=player_x,
-                                         player_o=player_o)
-                try:
-                    played_game.save()
-                except IntegrityError:
-                    pass
-            return
-        elif text_data_json['type'] == "time_win":
-
-            winner = text_data_json['winner']
-            room_code = text_data_json['room_code']
-
-            try:
-                player_x_inst = User.objects.get(username=text_data_json.get('player_x', None))
-                player_o_inst = User.objects.get(username=text_data_json.get('player_o', None))
-
-                if winner == player_x_inst.username:
-                    winner = player_x_inst
-                    looser = player_o_inst
-
-                elif winner == player_o_inst.username:
-                    winner = player_o_inst
-                    looser = player_x_inst
-
-                GameRoom.objects.filter(code=room_code).delete()
-
-                played_game = PlayedGame.objects.get(code=room_code)
-                played_game.winner = winner
-                played_game.player_x = player_x_inst
-                played_game.player_o = player_o_inst
-                played_game.is_finished = True
-                played_game.save()
-
-                # winner.skill_rating += 25 # TODO make a rating system
-                # looser.skill_rating -= 25
-                # winner.save()
-                # looser.save()
-
-                winner = winner.username
-            except Exception as e:
-                print(e)
-
-            async_to_sync(self.channel_layer.group_send)(
-                self.room_group_name,
-                {
-                    'type': 'game_state_message',
-                    'squares': text_data_json.get('squares', None),
-                    'winner': winner,
-                    'player_x': text_data_json.get('player_x', None),
-                    'player_o': text_data_json.get('player_o', None)
-                }
-            )
-            return
-
-        squares = text_data_json['squares']
-        winner = self.calculate_winner(squares)
-
-        if winner:
-            room_code = text_data_json['room_code']
-            try:
-                GameRoom.objects.filter(code=room_code).delete()
-
-                player_x_inst = User.objects.get(username=text_data_json.get('player_x', None))
-                player_o_inst = User.objects.get(username=text_data_json.get('player_o', None))
-
-                if winner == 'X':
-                    winner = player_x_inst
-                    looser = player_o_inst
-                elif winner == 'O':
-                    winner = player_o_inst
-                    looser = player_x_inst
-
-                played_game = PlayedGame.objects.get(code=room_code)
-                played_game.winner = winner
-                played_game.player_x = player_x_inst
-                played_game.player_o = player_o_inst
-                played_game.is_finished = True
-                played_game.save()
-
-                # winner.skill_rating += 25 # TODO make a rating system
-                # looser.skill_rating -= 25
-                # winner.save()
-                # looser.save()
-
-                winner = winner.username
-            except Exception as e:
-                print(e)
-
-        async_to_sync(self.channel_layer.group_send)(
-            self.room_group_name,
-            {
-                'type': 'game_state_message',
-                'squares': squares,
-                'winner': winner,
-                'player_x': text_data_json.get('player_x', None),
-                'player_o': text_data_json.get('player_o', None),
-                'xIsNext': text_data_json.get('xIsNext', None),
-            }
-        )
-
-        async_to_sync(self.channel_layer.group_send)(
-
-            self.room_group_name,
-            {
-                'type': 'store_game_state',
-                'squares': squares,
-                'xIsNext': text_data_json.get('xIsNext', None),
-            }
-        )
-
-    def disconnect(self, code):
-        async_to_sync(self.channel_layer.group_discard)(
-            self.room_group_name,
-            self.channel_name
-        )
-
-    def get_and_send_latest_gamestate(self):
-        latest_gamestate = redis_client.get(f"latest_gamestate_{self.room_code}")
-        if latest_gamestate:
-            game_state = json.loads(latest_gamestate)
-            self.send(text_data=json.dumps({
-                'type': 'latest_gamestate',
-                'squares': game_state['squares'],
-                'xIsNext': game_state['xIsNext'],
-            }))
-
-    def get_and_send_ready(self):
-        latest_ready_state = redis_client.get(f'ready_{self.room_code}')
-        if latest_ready_state:
-            ready_state = json.loads(latest_ready_state)
-            if ready_state['isReadyPlayer_o'] is True:
-                self.send(text_data=json.dumps({
-                    'type': 'ready_o',
-                    'isReadyPlayer_o': True,
-                }))
-            if ready_state['isReadyPlayer_x'] is True:
-                self.send(text_data=json.dumps({
-                    'type': 'ready_x',
-                    'isReadyPlayer_x': True,
-                }))
-
-    def store_game_state(self, event):
-        squares = event['squares']
-        xIsNext = event['xIsNext']
-        redis_client.set(f'latest_gamestate_{self.room_code}', json.dumps({
-            'type': 'game_state_message',
-            'squares': squares,
-            'xIsNext': xIsNext,
-        }))
-
-    def store_ready(self, event):
-        key = f'ready_{self.room_code}'
-        existing_state = redis_client.get(key)
-
-        if existing_state:
-            ready_state = json.loads(existing_state)
-        else:
-            ready_state = {
-                'isReadyPlayer_o': None,
-                'isReadyPlayer_x': None
-            }
-
-        if 'isReadyPlayer_o' in event:
-            ready_state['isReadyPlayer_o'] = event['isReadyPlayer_o']
-        if 'isReadyPlayer_x' in event:
-            ready_state['isReadyPlayer_x'] = event['isReadyPlayer_x']
-
-        redis_client.set(key, json.dumps(ready_state))
-
-    def game_state_message(self, event):
-        squares = event['squares']
-        winner = event['winner']
-        player_x = event['player_x']
-        player_o = event['player_o']
-        xIsNext = event['xIsNext']
-
-        self.send(text_data=json.dumps({
-            'type': 'game_state',
-            'squares': squares,
-            'winner': winner,
-            'player_x': player_x,
-            'player_o': player_o,
-            'xIsNext': xIsNext,
-        }))
-
-    def acknowledgement(self, event):
-        player_x = event['player_x']
-        player_o = event['player_o']
-
-        self.send(text_data=json.dumps({
-            'type': 'acknowledgement',
-            'player_x': player_x,
-            'player_o': player_o
-        }))
-
-    def ready_x(self, event):
-        is_ready_player_x = event['isReadyPlayer_x']
-
-        self.send(text_data=json.dumps({
-            'type': 'ready_x',
-            'isReadyPlayer_x': is_ready_player_x,
-        }))
-
-    def ready_o(self, event):
-        is_ready_player_o = event['isReadyPlayer_o']
-
-        self.send(text_data=json.dumps({
-            'type': 'ready_o',
-            'isReadyPlayer_o': is_ready_player_o,
-        }))
-
-    @staticmethod
-    def calculate_winner(squares):
-        lines = [
-            [0, 1, 2],
-            [3, 4, 5],
-            [6, 7, 8],
-            [0, 3, 6],
-            [1, 4, 7],
-            [2, 5, 8],
-            [0, 4, 8],
-            [2, 4, 6]
-        ]
-
-        for line in lines:
-            a, b, c = line
-            if squares[a] and squares[a] == squares[b] and squares[a] == squares[c]:
-                return squares[a]
-
+            await self.close(code=4001)
         return None
@@ -0,0 +1,263 @@
+"""
+Tic-tac-toe rules on integer bitboards.
+
+Cell i of an N x N board (row-major) is bit i. X and O each have their own bitboard,
+so a line test is a single AND against a precomputed mask.
+
+The classic 3x3 game answers win and draw questions from lookup tables. Larger boards
+(k in a row on N x N, e.g. 15x15 gomoku) only look at the lines through the last move,
+which keeps a move at O(k) no matter how big the board is.
+"""
+
+from functools import lru_cache
+
+BOARD_SIZE = 3
+BOARD_CELLS = BOARD_SIZE * BOARD_SIZE
+FULL_BOARD = (1 << BOARD_CELLS) - 1
+
+MIN_BOARD_SIZE = 3
+MAX_BOARD_SIZE = 15
+MIN_WIN_LENGTH = 3
+
+WINNING_LINES = (
+    (0, 1, 2),
+    (3, 4, 5),
+    (6, 7, 8),
+    (0, 3, 6),
+    (1, 4, 7),
+    (2, 5, 8),
+    (0, 4, 8),
+    (2, 4, 6),
+)
+
+WIN_MASKS = tuple(sum(1 << cell for cell in line) for line in WINNING_LINES)
+
+_POPCOUNT = tuple(bin(bits).count('1') for bits in range(1 << BOARD_CELLS))
+
+# _IS_WINNING[bits] is True when the bitboard contains a complete line.
+_IS_WINNING = tuple(any(bits & mask == mask for mask in WIN_MASKS) for bits in range(1 << BOARD_CELLS))
+
+
+def has_won(bits):
+    return _IS_WINNING[bits]
+
+
+def popcount(bits):
+    return bin(bits).count('1')
+
+
+def get_winner(x_bits, o_bits):
+    if _IS_WINNING[x_bits]:
+        return 'X'
+    if _IS_WINNING[o_bits]:
+        return 'O'
+    return None
+
+
+def _compute_is_draw(x_bits, o_bits):
+    """
+    True when neither player can still complete a line.
+    A line counts as reachable only if it is free of the opponent and the player has enough
+    moves left to fill it, so a draw is detected before the board is full.
+    """
+    empty = BOARD_CELLS - _POPCOUNT[x_bits | o_bits]
+    x_is_next = _POPCOUNT[x_bits] == _POPCOUNT[o_bits]
+    moves_left_x = (empty + 1) // 2 if x_is_next else empty // 2
+    moves_left_o = empty - moves_left_x
+
+    for mask in WIN_MASKS:
+        if not mask & o_bits and BOARD_SIZE - _POPCOUNT[mask & x_bits] <= moves_left_x:
+            return False
+        if not mask & x_bits and BOARD_SIZE - _POPCOUNT[mask & o_bits] <= moves_left_o:
+            return False
+    return True
+
+
+def _build_draw_table():
+    """Drawn positions keyed by x_bits << 9 | o_bits, for every legal X/O piece count."""
+    drawn = set()
+    for x_bits in range(1 << BOARD_CELLS):
+        free = FULL_BOARD & ~x_bits
+        o_bits = free
+        while True:
+            if _POPCOUNT[x_bits] - _POPCOUNT[o_bits] in (0, 1) and _compute_is_draw(x_bits, o_bits):
+                drawn.add(x_bits << BOARD_CELLS | o_bits)
+            if not o_bits:
+                break
+            o_bits = (o_bits - 1) & free
+    return frozenset(drawn)
+
+
+_DRAWN = _build_draw_table()
+
+
+def is_draw(x_bits, o_bits):
+    return x_bits << BOARD_CELLS | o_bits in _DRAWN
+
+
+def is_valid_geometry(size, win_length):
+    return MIN_BOARD_SIZE <= size <= MAX_BOARD_SIZE and MIN_WIN_LENGTH <= win_length <= size
+
+
+class Geometry:
+    """Line masks for one (size, win_length) pair. Build through get_geometry() so they are shared."""
+
+    def __init__(self, size, win_length):
+        if not is_valid_geometry(size, win_length):
+            raise ValueError(f"Unsupported board: {size}x{size} with {win_length} in a row")
+
+        self.size = size
+        self.win_length = win_length
+        self.cells = size * size
+        self.full_board = (1 << self.cells) - 1
+        self.lines = self._build_lines()
+
+        lines_through = [[] for _ in range(self.cells)]
+        for mask in self.lines:
+            bits = mask
+            while bits:
+                low = bits & -bits
+                lines_through[low.bit_length() - 1].append(mask)
+                bits ^= low
+        # At most 4 * win_length masks per cell: one window per offset and direction.
+        self.lines_through = tuple(tuple(masks) for masks in lines_through)
+
+    @property
+    def is_classic(self):
+        return self.size == BOARD_SIZE and self.win_length == BOARD_SIZE
+
+    def _build_lines(self):
+        size, k = self.size, self.win_length
+        lines = []
+        for row in range(size):
+            for col in range(size):
+                for d_row, d_col in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    end_row, end_col = row + d_row * (k - 1), col + d_col * (k - 1)
+                    if not (0 <= end_row < size and 0 <= end_col < size):
+                        continue
+                    lines.append(sum(1 << ((row + d_row * step) * size + col + d_col * step) for step in range(k)))
+        return tuple(lines)
+
+
+@lru_cache(maxsize=None)
+def get_geometry(size=BOARD_SIZE, win_length=BOARD_SIZE):
+    return Geometry(size, win_length)
+
+
+def squares_to_bitboards(squares):
+    x_bits = o_bits = 0
+    for index, value in enumerate(squares):
+        if value == 'X':
+            x_bits |= 1 << index
+        elif value == 'O':
+            o_bits |= 1 << index
+    return x_bits, o_bits
+
+
+def bitboards_to_squares(x_bits, o_bits, cells=BOARD_CELLS):
+    return [
+        'X' if x_bits >> index & 1 else 'O' if o_bits >> index & 1 else None
+        for index in range(cells)
+    ]
+
+
+def calculate_winner(squares):
+    """Drop-in replacement for the old list based check: returns 'X', 'O' or None."""
+    return get_winner(*squares_to_bitboards(squares))
+
+
+class Board:
+    """
+    A position kept as two bitboards.
+
+    open_lines counts the lines that hold stones of at most one player. play() keeps it current,
+    so callers that persist a board should store it and pass it back in instead of paying for
+    a full recount. Moves are only played on boards nobody has won yet, so once play() has run
+    the winner it records is final and winner() never scans the board again.
+    """
+
+    def __init__(self, x_bits=0, o_bits=0, size=BOARD_SIZE, win_length=BOARD_SIZE, open_lines=None):
+        self.geometry = get_geometry(size, win_length)
+        self.x_bits = x_bits
+        self.o_bits = o_bits
+        self.open_lines = self._count_open_lines() if open_lines is None else open_lines
+        self._winner = None
+        self._winner_known = False
+
+    @classmethod
+    def from_squares(cls, squares, win_length=None):
+        size = int(len(squares) ** 0.5)
+        return cls(*squares_to_bitboards(squares), size=size, win_length=win_length or size)
+
+    def to_squares(self):
+        return bitboards_to_squares(self.x_bits, self.o_bits, self.geometry.cells)
+
+    @property
+    def size(self):
+        return self.geometry.size
+
+    @property
+    def win_length(self):
+        return self.geometry.win_length
+
+    @property
+    def occupied(self):
+        return self.x_bits | self.o_bits
+
+    @property
+    def move_count(self):
+        return popcount(self.occupied)
+
+    def is_valid_index(self, index):
+        return isinstance(index, int) and not isinstance(index, bool) and 0 <= index < self.geometry.cells
+
+    def is_empty(self, index):
+        return not self.occupied >> index & 1
+
+    def play(self, index, player):
+        """
+        Place 'X' or 'O' on an empty cell and return the winner this move produced, if any.
+        Only the lines through index are inspected. The caller validates turn order and emptiness.
+        """
+        bit = 1 << index
+        if player == 'X':
+            own, opponent = self.x_bits, self.o_bits
+            self.x_bits |= bit
+        else:
+            own, opponent = self.o_bits, self.x_bits
+            self.o_bits |= bit
+
+        for mask in self.geometry.lines_through[index]:
+            if mask & opponent and not mask & own:
+                self.open_lines -= 1
+            if (own | bit) & mask == mask:
+                self._winner = player
+        self._winner_known = True
+        return self._winner
+
+    def winner(self):
+        if not self._winner_known:
+            self._winner_known = True
+            if self.geometry.is_classic:
+                self._winner = get_winner(self.x_bits, self.o_bits)
+            else:
+                self._winner = self._scan_winner()
+        return self._winner
+
+    def is_draw(self):
+        if self.winner() is not None:
+            return False
+        if self.geometry.is_classic:
+            return is_draw(self.x_bits, self.o_bits)
+        return self.open_lines == 0 or self.occupied == self.geometry.full_board
+
+    def _scan_winner(self):
+        for mask in self.geometry.lines:
+            if self.x_bits & mask == mask:
+                return 'X'
+            if self.o_bits & mask == mask:
+                return 'O'
+        return None
+
+    def _count_open_lines(self):
+        return sum(1 for mask in self.geometry.lines if not (mask & self.x_bits and mask & self.o_bits))
@@ -0,0 +1,60 @@
+"""
+Per-process cache of the players seated in live game rooms.
+
+Consumers fill it from GameRoom.player_x / player_o when a socket connects, so game events in a
+running match resolve players without touching the database. Entries are keyed by user id and
+expire after a TTL. A saved User drops its entry in this process (see CoreConfig.ready); other
+worker processes pick the change up when their entry expires.
+"""
+
+import time
+from collections import namedtuple
+
+PLAYER_CACHE_TTL_SECONDS = 600
+PLAYER_CACHE_MAX_ENTRIES = 10000
+
+CachedPlayer = namedtuple('CachedPlayer', ('id', 'username'))
+
+
+class PlayerCache:
+    def __init__(self, ttl=PLAYER_CACHE_TTL_SECONDS, max_entries=PLAYER_CACHE_MAX_ENTRIES, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = {}  # user id -> (expires_at, CachedPlayer)
+
+    def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, player = entry
+        if expires_at <= self._clock():
+            del self._entries[user_id]
+            return None
+        return player
+
+    def put(self, user_id, username):
+        if user_id not in self._entries and len(self._entries) >= self.max_entries:
+            self._evict()
+        self._entries[user_id] = (self._clock() + self.ttl, CachedPlayer(user_id, username))
+
+    def invalidate(self, *user_ids):
+        for user_id in user_ids:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        now = self._clock()
+        for user_id in [user_id for user_id, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[user_id]
+        # Still full: drop the oldest insertion, dicts keep insertion order.
+        if len(self._entries) >= self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+
+player_cache = PlayerCache()
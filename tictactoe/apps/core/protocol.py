@@ -0,0 +1,309 @@
+"""
+Binary subprotocol for the game room socket.
+
+A client that offers BINARY_SUBPROTOCOL in the WebSocket handshake gets every game frame as a
+fixed layout binary message and may send binary frames itself. Clients that do not offer it keep
+talking JSON, which stays the reference format: every binary frame maps to exactly one JSON frame
+and the consumer works with the JSON shaped dicts on both sides.
+
+All integers are big endian. A string is a u16 byte length followed by UTF-8, length 0xFFFF
+standing for None. A board is sent as two bitboards (X, then O) of ceil(size * size / 8) bytes,
+cell i being bit i.
+
+Client -> server
+    0x01 move             u32 seq, u16 index
+    0x02 ready            u8 seat (0 x, 1 o)
+    0x03 acknowledgement  str player_x, str player_o
+    0x04 latest_gamestate_request
+    0x05 game_started
+    0x06 time_win
+    0x07 resume           u32 last seq
+
+Server -> client
+    0x81 move             u16 index, u8 player (1 X, 2 O), u32 seq, u8 flags, i32 time left ms, str winner
+    0x82 game_over        str winner
+    0x83 ready            u8 seat
+    0x84 acknowledgement  str player_x, str player_o
+    0x85 latest_gamestate state
+    0x86 snapshot         u8 kind (0 connection_established, 1 room_snapshot), u8 flags, [state]
+    0x87 move_rejected    u8 reason, u32 seq
+    0x88 replay           u8 flags, u32 seq, i32 time left ms, str winner, u16 count, count * (u16 length, move)
+
+    state = u8 size, u8 win length, u32 seq, u8 flags, i32 time left ms, str winner, x bitboard, o bitboard
+    flags: bit 0 O is next, bit 1 draw (move), bit 2/3 X/O ready (snapshot, replay) and bit 4 has state (snapshot)
+    A time left of -1 means the move clock is not running.
+"""
+
+import json
+import struct
+
+from apps.core.engine import squares_to_bitboards, bitboards_to_squares
+
+BINARY_SUBPROTOCOL = 'tictactoe.bin.v1'
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+OP_MOVE = 0x01
+OP_READY = 0x02
+OP_ACKNOWLEDGEMENT = 0x03
+OP_STATE_REQUEST = 0x04
+OP_GAME_STARTED = 0x05
+OP_TIME_WIN = 0x06
+OP_RESUME = 0x07
+
+OP_SERVER_MOVE = 0x81
+OP_SERVER_GAME_OVER = 0x82
+OP_SERVER_READY = 0x83
+OP_SERVER_ACKNOWLEDGEMENT = 0x84
+OP_SERVER_STATE = 0x85
+OP_SERVER_SNAPSHOT = 0x86
+OP_SERVER_MOVE_REJECTED = 0x87
+OP_SERVER_REPLAY = 0x88
+
+FLAG_O_IS_NEXT = 0x01
+FLAG_DRAW = 0x02
+FLAG_READY_X = 0x04
+FLAG_READY_O = 0x08
+FLAG_HAS_STATE = 0x10
+
+SEATS = ('x', 'o')
+PLAYERS = {'X': 1, 'O': 2}
+SNAPSHOT_KINDS = ('connection_established', 'room_snapshot')
+REJECT_REASONS = ('not_a_player', 'game_over', 'stale_seq', 'not_your_turn', 'invalid_index', 'square_taken')
+
+_NONE_STRING = 0xFFFF
+
+_OP = struct.Struct('!B')
+_U16 = struct.Struct('!H')
+_CLIENT_MOVE = struct.Struct('!BIH')
+_CLIENT_READY = struct.Struct('!BB')
+_CLIENT_RESUME = struct.Struct('!BI')
+_SERVER_MOVE = struct.Struct('!BHBIBi')
+_SERVER_READY = struct.Struct('!BB')
+_SERVER_SNAPSHOT = struct.Struct('!BBB')
+_SERVER_MOVE_REJECTED = struct.Struct('!BBI')
+_SERVER_REPLAY = struct.Struct('!BBIi')
+_STATE = struct.Struct('!BBIBi')
+
+
+def _pack_string(value):
+    if value is None:
+        return _U16.pack(_NONE_STRING)
+    data = value.encode('utf-8')
+    if len(data) >= _NONE_STRING:
+        raise ProtocolError("String too long")
+    return _U16.pack(len(data)) + data
+
+
+def _unpack_string(data, offset):
+    try:
+        (length,) = _U16.unpack_from(data, offset)
+    except struct.error as e:
+        raise ProtocolError("Truncated string") from e
+    offset += _U16.size
+    if length == _NONE_STRING:
+        return None, offset
+    if offset + length > len(data):
+        raise ProtocolError("Truncated string")
+    try:
+        return bytes(data[offset:offset + length]).decode('utf-8'), offset + length
+    except UnicodeDecodeError as e:
+        raise ProtocolError("Invalid UTF-8 string") from e
+
+
+def _time_left(value):
+    return -1 if value is None else value
+
+
+def _ready_flags(frame):
+    return (FLAG_READY_X if frame['isReadyPlayer_x'] else 0) | (FLAG_READY_O if frame['isReadyPlayer_o'] else 0)
+
+
+def _pack_state(state):
+    size = state['boardSize']
+    x_bits, o_bits = squares_to_bitboards(state['squares'])
+    board_bytes = (size * size + 7) // 8
+    flags = FLAG_O_IS_NEXT if state['xIsNext'] == 'o' else 0
+    return b''.join((
+        _STATE.pack(size, state['winLength'], state['seq'], flags, _time_left(state.get('timeLeft'))),
+        _pack_string(state['winner']),
+        x_bits.to_bytes(board_bytes, 'big'),
+        o_bits.to_bytes(board_bytes, 'big'),
+    ))
+
+
+def _unpack_state(data, offset):
+    size, win_length, seq, flags, time_left = _STATE.unpack_from(data, offset)
+    winner, offset = _unpack_string(data, offset + _STATE.size)
+    board_bytes = (size * size + 7) // 8
+    if offset + 2 * board_bytes > len(data):
+        raise ProtocolError("Truncated board")
+    x_bits = int.from_bytes(data[offset:offset + board_bytes], 'big')
+    o_bits = int.from_bytes(data[offset + board_bytes:offset + 2 * board_bytes], 'big')
+    return {
+        'squares': bitboards_to_squares(x_bits, o_bits, size * size),
+        'boardSize': size,
+        'winLength': win_length,
+        'xIsNext': 'o' if flags & FLAG_O_IS_NEXT else 'x',
+        'seq': seq,
+        'winner': winner,
+        'timeLeft': None if time_left < 0 else time_left,
+    }, offset + 2 * board_bytes
+
+
+def decode_client_frame(data):
+    """ Returns the JSON shaped message of a binary client frame. """
+    try:
+        (op,) = _OP.unpack_from(data)
+        if op == OP_MOVE:
+            _, seq, index = _CLIENT_MOVE.unpack_from(data)
+            return {'type': 'move', 'seq': seq, 'index': index}
+        if op == OP_READY:
+            _, seat = _CLIENT_READY.unpack_from(data)
+            return {'type': 'ready', f'isReadyPlayer_{SEATS[seat]}': True}
+        if op == OP_ACKNOWLEDGEMENT:
+            player_x, offset = _unpack_string(data, _OP.size)
+            player_o, _ = _unpack_string(data, offset)
+            return {'type': 'acknowledgement', 'player_x': player_x, 'player_o': player_o}
+        if op == OP_STATE_REQUEST:
+            return {'type': 'latest_gamestate_request'}
+        if op == OP_GAME_STARTED:
+            return {'type': 'game_started'}
+        if op == OP_TIME_WIN:
+            return {'type': 'time_win'}
+        if op == OP_RESUME:
+            return {'type': 'resume', 'lastSeq': _CLIENT_RESUME.unpack_from(data)[1]}
+    except (struct.error, IndexError) as e:
+        raise ProtocolError(f"Malformed client frame: {e}") from e
+    raise ProtocolError(f"Unknown client opcode {op:#x}")
+
+
+def encode_client_frame(message):
+    """ Reference encoder for clients, the inverse of decode_client_frame(). """
+    match message['type']:
+        case 'move':
+            return _CLIENT_MOVE.pack(OP_MOVE, message['seq'], message['index'])
+        case 'ready':
+            return _CLIENT_READY.pack(OP_READY, 0 if message.get('isReadyPlayer_x') else 1)
+        case 'acknowledgement':
+            return _OP.pack(OP_ACKNOWLEDGEMENT) + _pack_string(message['player_x']) + _pack_string(message['player_o'])
+        case 'latest_gamestate_request':
+            return _OP.pack(OP_STATE_REQUEST)
+        case 'game_started':
+            return _OP.pack(OP_GAME_STARTED)
+        case 'time_win':
+            return _OP.pack(OP_TIME_WIN)
+        case 'resume':
+            return _CLIENT_RESUME.pack(OP_RESUME, message['lastSeq'])
+    raise ProtocolError(f"No binary layout for client message {message['type']}")
+
+
+def encode_server_frame(frame):
+    """ Binary form of a JSON frame the consumer sends. """
+    match frame['type']:
+        case 'move':
+            flags = (FLAG_O_IS_NEXT if frame['xIsNext'] == 'o' else 0) | (FLAG_DRAW if frame['draw'] else 0)
+            return _SERVER_MOVE.pack(OP_SERVER_MOVE, frame['index'], PLAYERS[frame['player']], frame['seq'],
+                                     flags, _time_left(frame.get('timeLeft'))) + _pack_string(frame['winner'])
+        case 'game_over':
+            return _OP.pack(OP_SERVER_GAME_OVER) + _pack_string(frame['winner'])
+        case 'ready_x' | 'ready_o':
+            return _SERVER_READY.pack(OP_SERVER_READY, SEATS.index(frame['type'][-1]))
+        case 'acknowledgement':
+            return (_OP.pack(OP_SERVER_ACKNOWLEDGEMENT)
+                    + _pack_string(frame['player_x']) + _pack_string(frame['player_o']))
+        case 'latest_gamestate':
+            return _OP.pack(OP_SERVER_STATE) + _pack_state(frame)
+        case 'connection_established' | 'room_snapshot':
+            state = frame['gameState']
+            flags = _ready_flags(frame) | (FLAG_HAS_STATE if state else 0)
+            header = _SERVER_SNAPSHOT.pack(OP_SERVER_SNAPSHOT, SNAPSHOT_KINDS.index(frame['type']), flags)
+            return header + _pack_state(state) if state else header
+        case 'move_rejected':
+            return _SERVER_MOVE_REJECTED.pack(OP_SERVER_MOVE_REJECTED, REJECT_REASONS.index(frame['reason']),
+                                              frame['seq'])
+        case 'replay':
+            parts = [
+                _SERVER_REPLAY.pack(OP_SERVER_REPLAY, _ready_flags(frame), frame['seq'],
+                                    _time_left(frame['timeLeft'])),
+                _pack_string(frame['winner']),
+                _U16.pack(len(frame['events'])),
+            ]
+            for event in frame['events']:
+                encoded = encode_server_frame(event)
+                parts.append(_U16.pack(len(encoded)) + encoded)
+            return b''.join(parts)
+    raise ProtocolError(f"No binary layout for server frame {frame['type']}")
+
+
+def decode_server_frame(data):
+    """ Reference decoder for clients, the inverse of encode_server_frame(). """
+    try:
+        (op,) = _OP.unpack_from(data)
+        if op == OP_SERVER_MOVE:
+            _, index, player, seq, flags, time_left = _SERVER_MOVE.unpack_from(data)
+            winner, _ = _unpack_string(data, _SERVER_MOVE.size)
+            return {
+                'type': 'move',
+                'index': index,
+                'player': 'X' if player == PLAYERS['X'] else 'O',
+                'seq': seq,
+                'xIsNext': 'o' if flags & FLAG_O_IS_NEXT else 'x',
+                'winner': winner,
+                'draw': bool(flags & FLAG_DRAW),
+                'timeLeft': None if time_left < 0 else time_left,
+            }
+        if op == OP_SERVER_GAME_OVER:
+            return {'type': 'game_over', 'winner': _unpack_string(data, _OP.size)[0]}
+        if op == OP_SERVER_READY:
+            seat = SEATS[_SERVER_READY.unpack_from(data)[1]]
+            return {'type': f'ready_{seat}', f'isReadyPlayer_{seat}': True}
+        if op == OP_SERVER_ACKNOWLEDGEMENT:
+            player_x, offset = _unpack_string(data, _OP.size)
+            player_o, _ = _unpack_string(data, offset)
+            return {'type': 'acknowledgement', 'player_x': player_x, 'player_o': player_o}
+        if op == OP_SERVER_STATE:
+            return {'type': 'latest_gamestate', **_unpack_state(data, _OP.size)[0]}
+        if op == OP_SERVER_SNAPSHOT:
+            _, kind, flags = _SERVER_SNAPSHOT.unpack_from(data)
+            state = _unpack_state(data, _SERVER_SNAPSHOT.size)[0] if flags & FLAG_HAS_STATE else None
+            return {
+                'type': SNAPSHOT_KINDS[kind],
+                'isReadyPlayer_x': bool(flags & FLAG_READY_X),
+                'isReadyPlayer_o': bool(flags & FLAG_READY_O),
+                'gameState': state,
+            }
+        if op == OP_SERVER_MOVE_REJECTED:
+            _, reason, seq = _SERVER_MOVE_REJECTED.unpack_from(data)
+            return {'type': 'move_rejected', 'reason': REJECT_REASONS[reason], 'seq': seq}
+        if op == OP_SERVER_REPLAY:
+            _, flags, seq, time_left = _SERVER_REPLAY.unpack_from(data)
+            winner, offset = _unpack_string(data, _SERVER_REPLAY.size)
+            (count,) = _U16.unpack_from(data, offset)
+            offset += _U16.size
+            events = []
+            for _ in range(count):
+                (length,) = _U16.unpack_from(data, offset)
+                offset += _U16.size
+                events.append(decode_server_frame(data[offset:offset + length]))
+                offset += length
+            return {
+                'type': 'replay',
+                'isReadyPlayer_x': bool(flags & FLAG_READY_X),
+                'isReadyPlayer_o': bool(flags & FLAG_READY_O),
+                'seq': seq,
+                'winner': winner,
+                'timeLeft': None if time_left < 0 else time_left,
+                'events': events,
+            }
+    except (struct.error, IndexError) as e:
+        raise ProtocolError(f"Malformed server frame: {e}") from e
+    raise ProtocolError(f"Unknown server opcode {op:#x}")
+
+
+def encode_group_frame(frame):
+    """ Both encodings of a frame, built once by the sender of a group event. """
+    return {'text': json.dumps(frame), 'bytes': encode_server_frame(frame)}
@@ -0,0 +1,61 @@
+"""
+Rate limiting of the frames a websocket client sends.
+
+Every received frame takes a token from the bucket of its user in Redis (see the token bucket
+script in apps.utils.redis_scripts), so the limit holds across tabs and worker processes. Anonymous
+users are limited per socket. Limits are configured in settings.RATE_LIMITS. A frame that finds
+the bucket empty is dropped; a socket whose frames keep being dropped is closed with
+RATE_LIMIT_CLOSE_CODE, since a client that ignores the limit has no reason to stay connected.
+"""
+
+import logging
+
+from django.conf import settings
+
+from apps.utils.redis_scripts import take_token
+
+logger = logging.getLogger("tictactoe")
+
+RATE_LIMIT_CLOSE_CODE = 4029
+
+
+class RateLimiter:
+    def __init__(self, limit, identity):
+        config = settings.RATE_LIMITS[limit]
+        self.rate = config['rate']
+        self.burst = config['burst']
+        self.max_strikes = config['strikes']
+        self.bucket_key = f"ratelimit:{limit}:{identity}"
+        self.strikes = 0  # frames denied in a row
+
+    @classmethod
+    def for_scope(cls, limit, scope, channel_name):
+        user = scope.get('user')
+        identity = f"user:{user.pk}" if user and user.is_authenticated else f"socket:{channel_name}"
+        return cls(limit, identity)
+
+    async def allow(self):
+        try:
+            allowed = await take_token(self.bucket_key, self.rate, self.burst)
+        except Exception as e:
+            # Failing open: a Redis hiccup must not silence every client.
+            logger.error(f"Error checking rate limit {self.bucket_key}: {e}", exc_info=True)
+            return True
+        self.strikes = 0 if allowed else self.strikes + 1
+        return allowed
+
+    @property
+    def exceeded(self):
+        """ The client kept sending into an empty bucket and should be disconnected. """
+        return self.strikes >= self.max_strikes
+
+
+async def admit(consumer):
+    """ True if the consumer may handle the frame it just received, closes the socket once its client exceeded the limit. """
+    limiter = consumer.rate_limiter
+    if await limiter.allow():
+        return True
+    if limiter.exceeded:
+        logger.warning(f"Closing socket {consumer.channel_name}: rate limit {limiter.bucket_key} exceeded")
+        await consumer.close(code=RATE_LIMIT_CLOSE_CODE)
+    return False
@@ -0,0 +1,60 @@
+import time
+
+from django.test import SimpleTestCase
+
+from apps.core.bots.search import Search, SearchService, search_move
+from apps.core.engine import Board, get_geometry
+
+
+def gomoku(*stones, size=15):
+    """Board with the given (row, col) stones, X and O alternating from X."""
+    board = Board(size=size, win_length=5)
+    for turn, (row, col) in enumerate(stones):
+        board.play(row * size + col, 'X' if turn % 2 == 0 else 'O')
+    return board
+
+
+def cell(row, col, size=15):
+    return row * size + col
+
+
+class SearchTest(SimpleTestCase):
+    def search(self, board, budget=1.0, max_depth=4, cancelled=lambda: False):
+        search = Search(get_geometry(board.size, board.win_length), {}, time.monotonic() + budget, cancelled)
+        return search.best_move(board.x_bits, board.o_bits, max_depth)
+
+    def test_completes_five(self):
+        board = gomoku((7, 3), (0, 0), (7, 4), (0, 14), (7, 5), (14, 0), (7, 6), (14, 14))
+        self.assertIn(self.search(board), (cell(7, 2), cell(7, 7)))
+
+    def test_blocks_four(self):
+        board = gomoku((7, 3), (7, 2), (7, 4), (0, 14), (7, 5), (14, 0), (7, 6))
+        self.assertEqual(self.search(board), cell(7, 7))
+
+    def test_opens_in_the_centre(self):
+        self.assertEqual(self.search(Board(size=15, win_length=5)), cell(7, 7))
+
+    def test_stops_at_its_budget(self):
+        start = time.monotonic()
+        self.assertIsNotNone(self.search(gomoku((7, 7), (7, 8)), budget=0.2, max_depth=20))
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_cancelled_search_gives_no_move(self):
+        self.assertIsNone(self.search(gomoku((7, 7), (7, 8)), max_depth=20, cancelled=lambda: True))
+
+    def test_transposition_table_is_kept_per_game(self):
+        board = gomoku((7, 7), (7, 8))
+        first = search_move('game', 1, board.x_bits, board.o_bits, 15, 5, 1.0, 2)
+        self.assertEqual(search_move('game', 2, board.x_bits, board.o_bits, 15, 5, 1.0, 2), first)
+
+
+class SearchServiceTest(SimpleTestCase):
+    async def test_searches_in_a_worker_process(self):
+        service = SearchService(workers=1)
+        try:
+            move = await service.best_move('room', gomoku((7, 3), (7, 2), (7, 4), (0, 14), (7, 5), (14, 0), (7, 6)),
+                                           'medium')
+            self.assertEqual(move, cell(7, 7))
+            service.release('room')
+        finally:
+            service.shutdown()
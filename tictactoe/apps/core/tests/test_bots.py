@@ -0,0 +1,60 @@
+import random
+
+from django.test import SimpleTestCase
+
+from apps.core.bots import choose_move
+from apps.core.bots.table import MOVE_TABLE, scored_moves
+from apps.core.engine import Board
+
+
+class FixedRandom(random.Random):
+    """Always rolls a mistake."""
+
+    def random(self):
+        return 0.0
+
+
+class MoveTableTest(SimpleTestCase):
+    def test_covers_every_unfinished_reachable_position(self):
+        self.assertEqual(len(MOVE_TABLE), 4520)
+
+    def test_empty_board_is_a_draw(self):
+        self.assertEqual({score for _, score in scored_moves(0, 0)}, {0})
+
+    def test_finished_position_is_not_in_the_table(self):
+        board = Board.from_squares(['X', 'X', 'X', 'O', 'O', None, None, None, None])
+        with self.assertRaises(KeyError):
+            scored_moves(board.x_bits, board.o_bits)
+
+
+class ChooseMoveTest(SimpleTestCase):
+    def test_takes_a_win_and_blocks_a_loss(self):
+        win = Board.from_squares(['X', 'X', None, 'O', 'O', None, None, None, None])
+        self.assertEqual(choose_move(win, 'perfect'), 2)
+
+        block = Board.from_squares(['X', None, None, 'O', 'O', None, 'X', None, None])
+        self.assertEqual(choose_move(block, 'perfect'), 5)
+
+    def test_perfect_bot_never_loses(self):
+        """Plays the perfect bot against every possible line of the opponent, on both seats."""
+        for bot in ('X', 'O'):
+            stack = [Board()]
+            while stack:
+                board = stack.pop()
+                if board.winner() or board.move_count == 9:
+                    self.assertNotEqual(board.winner(), 'O' if bot == 'X' else 'X')
+                    continue
+                player = 'X' if board.move_count % 2 == 0 else 'O'
+                if player == bot:
+                    indexes = [choose_move(board, 'perfect')]
+                else:
+                    indexes = [index for index in range(9) if board.is_empty(index)]
+                for index in indexes:
+                    child = Board(board.x_bits, board.o_bits)
+                    child.play(index, player)
+                    stack.append(child)
+
+    def test_mistakes_pick_a_weaker_move(self):
+        board = Board.from_squares(['X', 'X', None, 'O', 'O', None, None, None, None])
+        self.assertNotEqual(choose_move(board, 'easy', rng=FixedRandom()), 2)
+        self.assertEqual(choose_move(board, 'perfect', rng=FixedRandom()), 2)
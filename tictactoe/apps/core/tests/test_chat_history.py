@@ -0,0 +1,46 @@
+from apps.utils.redis_client import redis_client
+from apps.utils.redis_testing import RedisTestCase
+from apps.utils.redis_utils import fetch_chat_history, store_chat_message
+
+STREAM = 'chat:test:history'
+PAGE = 3
+
+
+class ChatHistoryPagingTest(RedisTestCase):
+    """Pages through a chat stream of seven messages, three at a time."""
+    redis_keys = (STREAM,)
+
+    async def store_messages(self):
+        self.ids = [await store_chat_message(STREAM, f'message {number}', 'alice', number, 1000)
+                    for number in range(7)]
+
+    async def page(self, before=None):
+        messages, cursor = await fetch_chat_history(STREAM, before, count=PAGE)
+        return [message['message'] for message in messages], cursor
+
+    async def test_first_page_holds_the_newest_messages(self):
+        await self.store_messages()
+        self.assertEqual(await self.page(), (['message 4', 'message 5', 'message 6'], self.ids[4]))
+
+    async def test_middle_page_skips_the_cursor_entry(self):
+        await self.store_messages()
+        self.assertEqual(await self.page(self.ids[4]), (['message 1', 'message 2', 'message 3'], self.ids[1]))
+
+    async def test_last_page_has_no_older_cursor(self):
+        await self.store_messages()
+        self.assertEqual(await self.page(self.ids[1]), (['message 0'], None))
+        # A page that exactly reaches the start has no older page either.
+        self.assertEqual(await self.page(self.ids[3]), (['message 0', 'message 1', 'message 2'], None))
+
+    async def test_stale_cursor(self):
+        await self.store_messages()
+        # The cursor entry is gone, the page still starts right below it.
+        redis_client.xdel(STREAM, self.ids[4])
+        self.assertEqual(await self.page(self.ids[4]), (['message 1', 'message 2', 'message 3'], self.ids[1]))
+
+        # A cursor older than the whole stream has nothing before it.
+        redis_client.xtrim(STREAM, maxlen=2, approximate=False)
+        self.assertEqual(await self.page(self.ids[1]), ([], None))
+
+    async def test_empty_stream(self):
+        self.assertEqual(await self.page(), ([], None))
@@ -0,0 +1,69 @@
+from apps.utils.redis_client import (REDIS_CHAT_SHARD_LEASE_SECONDS,
+                                     REDIS_CHAT_SHARD_LEASES_ZSET,
+                                     REDIS_CHAT_SHARD_SOCKETS_HASH,
+                                     REDIS_CHAT_SHARDS_HASH,
+                                     redis_client)
+from apps.utils.redis_scripts import chat_shards, join_chat_shard, leave_chat_shard, renew_chat_shard
+from apps.utils.redis_testing import RedisTestCase
+
+SHARD_KEYS = (REDIS_CHAT_SHARDS_HASH, REDIS_CHAT_SHARD_SOCKETS_HASH, REDIS_CHAT_SHARD_LEASES_ZSET)
+
+
+class ChatShardScriptTest(RedisTestCase):
+    """Runs the lobby shard scripts against the test Redis."""
+    redis_keys = SHARD_KEYS
+
+    def counts(self):
+        return {int(shard): int(count) for shard, count in redis_client.hgetall(REDIS_CHAT_SHARDS_HASH).items()}
+
+    def expire(self, socket):
+        """Lets the lease of socket run out, as if its worker died without disconnecting."""
+        seconds, _ = redis_client.time()
+        redis_client.zadd(REDIS_CHAT_SHARD_LEASES_ZSET, {socket: seconds - 1})
+
+    async def test_join_fills_the_lowest_shard_with_room(self):
+        shards = [await join_chat_shard(f'socket-{number}', 2) for number in range(5)]
+        self.assertEqual(shards, [0, 0, 1, 1, 2])
+        self.assertEqual(self.counts(), {0: 2, 1: 2, 2: 1})
+
+        await leave_chat_shard('socket-0')
+        self.assertEqual(await join_chat_shard('socket-5', 2), 0)
+
+    async def test_joining_again_keeps_the_shard(self):
+        self.assertEqual(await join_chat_shard('socket-0', 2), 0)
+        self.assertEqual(await join_chat_shard('socket-0', 2), 0)
+        self.assertEqual(self.counts(), {0: 1})
+
+    async def test_last_socket_leaving_drops_the_shard(self):
+        await join_chat_shard('socket-0', 1)
+        await join_chat_shard('socket-1', 1)
+
+        self.assertTrue(await leave_chat_shard('socket-1'))
+        self.assertFalse(await leave_chat_shard('socket-1'))
+
+        self.assertEqual(self.counts(), {0: 1})
+        self.assertEqual(await chat_shards(), [0])
+
+    async def test_expired_sockets_stop_counting(self):
+        await join_chat_shard('socket-0', 1)
+        await join_chat_shard('socket-1', 1)
+        self.expire('socket-1')
+
+        self.assertEqual(await chat_shards(), [0])
+        self.assertEqual(redis_client.hkeys(REDIS_CHAT_SHARD_SOCKETS_HASH), ['socket-0'])
+        self.expire('socket-0')
+        self.assertEqual(await join_chat_shard('socket-2', 1), 0)
+        self.assertEqual(self.counts(), {0: 1})
+
+    async def test_renewing_extends_or_restores_the_membership(self):
+        await join_chat_shard('socket-0', 2)
+        self.expire('socket-0')
+
+        self.assertEqual(await chat_shards(), [])
+        self.assertFalse(await renew_chat_shard('socket-0', 0))
+        self.assertEqual(self.counts(), {0: 1})
+        self.assertTrue(await renew_chat_shard('socket-0', 0))
+
+        seconds, _ = redis_client.time()
+        self.assertGreater(redis_client.zscore(REDIS_CHAT_SHARD_LEASES_ZSET, 'socket-0'),
+                           seconds + REDIS_CHAT_SHARD_LEASE_SECONDS - 2)
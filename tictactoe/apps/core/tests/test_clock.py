@@ -0,0 +1,86 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from apps.core.clock import TimerWheel
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ManualTimerWheel(TimerWheel):
+    """Advanced by the test instead of its own task."""
+
+    def _ensure_running(self):
+        pass
+
+
+async def noop(*args):
+    pass
+
+
+class TimerWheelTest(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.wheel = ManualTimerWheel(tick=0.5, slots=8, clock=self.clock)
+
+    def fired(self):
+        return sorted(args for _, args in self.wheel.advance())
+
+    def test_fires_once_when_due(self):
+        self.wheel.schedule('room', 1.0, noop, 'room')
+
+        self.clock.now += 0.9
+        self.assertEqual(self.fired(), [])
+        self.clock.now += 0.1
+        self.assertEqual(self.fired(), [('room',)])
+        self.assertEqual(self.fired(), [])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_reschedule_replaces_and_cancel_removes(self):
+        self.wheel.schedule('a', 1.0, noop, 'first')
+        self.wheel.schedule('a', 2.0, noop, 'second')
+        self.wheel.schedule('b', 1.0, noop, 'b')
+        self.wheel.cancel('b')
+
+        self.clock.now += 1.0
+        self.assertEqual(self.fired(), [])
+        self.clock.now += 1.0
+        self.assertEqual(self.fired(), [('second',)])
+
+    def test_timers_longer_than_one_revolution(self):
+        # 8 slots of 0.5s cover 4 seconds; a 10 second timer waits two more rounds in its slot.
+        self.wheel.schedule('long', 10.0, noop, 'long')
+        self.wheel.schedule('short', 2.0, noop, 'short')
+
+        fired = []
+        for _ in range(40):
+            self.clock.now += 0.25
+            fired.extend((self.clock.now - 1000.0, args) for args in self.fired())
+        self.assertEqual(fired, [(2.0, ('short',)), (10.0, ('long',))])
+
+    def test_catches_up_after_a_stall(self):
+        for delay in (0.5, 3.0, 30.0):
+            self.wheel.schedule(delay, delay, noop, delay)
+
+        self.clock.now += 100
+        self.assertEqual(self.fired(), [(0.5,), (3.0,), (30.0,)])
+
+
+class TimerWheelTaskTest(SimpleTestCase):
+    async def test_runs_callbacks_and_stops_when_empty(self):
+        wheel = TimerWheel(tick=0.01, slots=16)
+        fired = asyncio.Event()
+
+        async def on_timeout(event):
+            event.set()
+
+        wheel.schedule('room', 0.02, on_timeout, fired)
+        await asyncio.wait_for(fired.wait(), timeout=1)
+        await asyncio.sleep(0.05)
+        self.assertTrue(wheel._task.done())
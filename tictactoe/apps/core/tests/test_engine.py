@@ -0,0 +1,142 @@
+import random
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from apps.core.engine import (Board, WINNING_LINES, bitboards_to_squares, calculate_winner,
+                              get_geometry, is_draw, squares_to_bitboards)
+
+
+def legacy_calculate_winner(squares):
+    for a, b, c in WINNING_LINES:
+        if squares[a] and squares[a] == squares[b] and squares[a] == squares[c]:
+            return squares[a]
+    return None
+
+
+def reachable_positions():
+    """Every position reachable in legal play, including finished ones."""
+    seen = set()
+    stack = [(0, 0)]
+    while stack:
+        x_bits, o_bits = stack.pop()
+        if (x_bits, o_bits) in seen:
+            continue
+        seen.add((x_bits, o_bits))
+        board = Board(x_bits, o_bits)
+        if board.winner():
+            continue
+        player = 'X' if bin(x_bits).count('1') == bin(o_bits).count('1') else 'O'
+        for index in range(9):
+            if board.is_empty(index):
+                child = Board(x_bits, o_bits)
+                child.play(index, player)
+                stack.append((child.x_bits, child.o_bits))
+    return seen
+
+
+class EngineTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.positions = reachable_positions()
+
+    def test_reachable_position_count(self):
+        self.assertEqual(len(self.positions), 5478)
+
+    def test_winner_matches_legacy_check(self):
+        for x_bits, o_bits in self.positions:
+            squares = bitboards_to_squares(x_bits, o_bits)
+            self.assertEqual(calculate_winner(squares), legacy_calculate_winner(squares))
+
+    def test_squares_round_trip(self):
+        squares = ['X', None, 'O', None, 'X', None, None, 'O', None]
+        self.assertEqual(bitboards_to_squares(*squares_to_bitboards(squares)), squares)
+
+    def test_full_board_without_winner_is_draw(self):
+        board = Board.from_squares(['X', 'O', 'X',
+                                    'X', 'O', 'O',
+                                    'O', 'X', 'X'])
+        self.assertIsNone(board.winner())
+        self.assertTrue(board.is_draw())
+
+    def test_draw_detected_before_board_is_full(self):
+        # X to move with two cells left: every line is blocked for both players.
+        board = Board.from_squares(['X', 'O', 'X',
+                                    'X', 'O', None,
+                                    'O', 'X', None])
+        self.assertTrue(board.is_draw())
+
+    def test_open_line_is_not_a_draw(self):
+        board = Board.from_squares(['X', 'O', None,
+                                    None, None, None,
+                                    None, None, None])
+        self.assertFalse(board.is_draw())
+
+    def test_draw_is_never_declared_while_a_win_is_reachable(self):
+        for x_bits, o_bits in self.positions:
+            if Board(x_bits, o_bits).winner() or not is_draw(x_bits, o_bits):
+                continue
+            self.assertFalse(self._win_reachable(x_bits, o_bits), bitboards_to_squares(x_bits, o_bits))
+
+    def _win_reachable(self, x_bits, o_bits):
+        board = Board(x_bits, o_bits)
+        if board.winner():
+            return True
+        player = 'X' if bin(x_bits).count('1') == bin(o_bits).count('1') else 'O'
+        for index in range(9):
+            if board.is_empty(index):
+                child = Board(x_bits, o_bits)
+                child.play(index, player)
+                if self._win_reachable(child.x_bits, child.o_bits):
+                    return True
+        return False
+
+
+class LargeBoardEngineTest(SimpleTestCase):
+    def test_line_count(self):
+        # 15x15 five in a row: 11 windows per row/column, 11 * 11 per diagonal direction.
+        self.assertEqual(len(get_geometry(15, 5).lines), 4 * 15 * 11 - 2 * 15 * 11 + 2 * 11 * 11)
+
+    def test_lines_through_a_cell_are_bounded_by_win_length(self):
+        geometry = get_geometry(15, 5)
+        self.assertEqual(max(len(masks) for masks in geometry.lines_through), 4 * 5)
+
+    def test_diagonal_win_detected_from_last_move(self):
+        board = Board(size=15, win_length=5)
+        for step in range(4):
+            self.assertIsNone(board.play((3 + step) * 15 + 10 - step, 'O'))
+        self.assertEqual(board.play(7 * 15 + 6, 'O'), 'O')
+
+    def test_incremental_state_matches_full_scan(self):
+        rng = random.Random(7)
+        for size, win_length in ((4, 3), (7, 4), (15, 5)):
+            for _ in range(20):
+                board = Board(size=size, win_length=win_length)
+                cells = list(range(size * size))
+                rng.shuffle(cells)
+                for turn, index in enumerate(cells):
+                    winner = board.play(index, 'X' if turn % 2 == 0 else 'O')
+                    rebuilt = Board(board.x_bits, board.o_bits, size=size, win_length=win_length)
+                    self.assertEqual(board.open_lines, rebuilt.open_lines)
+                    self.assertEqual(winner, rebuilt.winner())
+                    if winner:
+                        break
+
+    def test_draw_check_after_a_move_trusts_play(self):
+        board = Board(size=15, win_length=5)
+        board.play(112, 'X')
+        with mock.patch.object(Board, '_scan_winner') as scan_winner:
+            self.assertFalse(board.is_draw())
+        scan_winner.assert_not_called()
+
+    def test_blocked_board_is_draw(self):
+        board = Board.from_squares(['X', 'O', 'X', 'O',
+                                    'X', 'O', 'X', 'O',
+                                    'O', 'X', 'O', 'X',
+                                    'O', 'X', 'O', None], win_length=4)
+        self.assertTrue(board.is_draw())
+
+    def test_unsupported_geometry(self):
+        with self.assertRaises(ValueError):
+            Board(size=3, win_length=4)
@@ -0,0 +1,263 @@
+import json
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from apps.core.bots import bot_name
+from apps.core.clock import MOVE_TIMEOUT_SECONDS
+from apps.core.consumers import GameRoomConsumer
+from apps.core.engine import Board
+from apps.core.player_cache import player_cache
+from apps.utils.redis_client import redis_client
+from apps.utils.redis_testing import RedisTestCase
+from apps.utils.redis_utils import room_key, room_keys
+from apps.utils.utils import get_current_time_ms
+
+ROOM_CODE = 'test-move-clock'
+USERS = {'x': SimpleNamespace(id=1, username='alice'), 'o': SimpleNamespace(id=2, username='bob'), None: None}
+
+
+def room_consumer(seats, bot_seat=None, bot_level=None, player_type=None):
+    """A consumer wired to a room without a socket; frames it sends and group events are recorded by mocks."""
+    consumer = GameRoomConsumer()
+    consumer.room_code = ROOM_CODE
+    consumer.room_group_name = f'game_room_{ROOM_CODE}'
+    consumer.channel_layer = mock.Mock(group_send=mock.AsyncMock())
+    consumer.board_size, consumer.win_length = 3, 3
+    consumer.seats = seats
+    consumer.bot_seat, consumer.bot_level = bot_seat, bot_level
+    consumer.bot_task = None
+    consumer.player_type = player_type
+    consumer.is_finished = False
+    consumer.binary = False
+    consumer.send = mock.AsyncMock()
+    return consumer
+
+
+def store_room(**fields):
+    """Stores a started 3x3 room; the open line count follows the stones."""
+    board = Board(fields.get('x', 0), fields.get('o', 0))
+    redis_client.hset(room_key(ROOM_CODE), mapping={
+        'size': 3, 'k': 3, 'x': 0, 'o': 0, 'open': board.open_lines, 'xIsNext': 'x', 'seq': 0, 'winner': '',
+        'deadline': 0, **fields,
+    })
+
+
+def sent_frames(consumer):
+    return [json.loads(call.kwargs['text_data']) for call in consumer.send.call_args_list]
+
+
+def group_frames(consumer):
+    return [json.loads(call.args[1]['text']) for call in consumer.channel_layer.group_send.call_args_list]
+
+
+@mock.patch.object(GameRoomConsumer, '_create_played_game', mock.AsyncMock())
+@mock.patch('apps.core.consumers.timer_wheel')
+class GameStartTest(RedisTestCase):
+    redis_keys = room_keys(ROOM_CODE)
+
+    def setUp(self):
+        super().setUp()
+        player_cache.put(1, 'alice')
+        player_cache.put(2, 'bob')
+
+    def tearDown(self):
+        player_cache.invalidate(1, 2)
+        super().tearDown()
+
+    async def test_first_move_runs_on_the_clock(self, timer_wheel):
+        before = get_current_time_ms()
+        consumer = room_consumer({'x': 1, 'o': 2})
+        await consumer._handle_game_start({})
+
+        room = redis_client.hgetall(room_key(ROOM_CODE))
+        self.assertEqual(room['seq'], '0')
+        self.assertGreaterEqual(int(room['deadline']), before + MOVE_TIMEOUT_SECONDS * 1000)
+        # X letting the clock run out hands the game at seq 0 to O.
+        timer_wheel.schedule.assert_called_once_with(
+            ROOM_CODE, MOVE_TIMEOUT_SECONDS, consumer._finish_on_time,
+            consumer.channel_layer, ROOM_CODE, 0, 'o', 2, 'bob')
+
+    async def test_repeated_start_keeps_the_clock(self, timer_wheel):
+        await room_consumer({'x': 1, 'o': 2})._handle_game_start({})
+        deadline = redis_client.hget(room_key(ROOM_CODE), 'deadline')
+        await room_consumer({'x': 1, 'o': 2})._handle_game_start({})
+
+        self.assertEqual(redis_client.hget(room_key(ROOM_CODE), 'deadline'), deadline)
+        timer_wheel.schedule.assert_called_once()
+
+    async def test_bot_in_seat_o_wins_on_time(self, timer_wheel):
+        consumer = room_consumer({'x': 1, 'o': None}, bot_seat='o', bot_level='easy')
+        await consumer._handle_game_start({})
+
+        self.assertEqual(timer_wheel.schedule.call_args.args[-4:], (0, 'o', None, bot_name('easy')))
+
+
+@mock.patch.object(GameRoomConsumer, '_start_bot_move')
+class BotReconnectTest(RedisTestCase):
+    redis_keys = room_keys(ROOM_CODE)
+
+    async def test_bot_to_move_is_restarted(self, start_bot_move):
+        store_room(x=0b1, xIsNext='o', seq=1)
+        await room_consumer({'x': 1, 'o': None}, bot_seat='o', bot_level='perfect')._resume_bot()
+
+        start_bot_move.assert_called_once()
+        board, game_state = start_bot_move.call_args.args
+        self.assertEqual((board.x_bits, game_state['seq']), (0b1, 1))
+
+    async def test_waits_for_the_player_to_move(self, start_bot_move):
+        store_room(x=0b1, o=0b10, seq=2)
+        await room_consumer({'x': 1, 'o': None}, bot_seat='o', bot_level='perfect')._resume_bot()
+        start_bot_move.assert_not_called()
+
+    async def test_finished_or_unstarted_games_are_left_alone(self, start_bot_move):
+        consumer = room_consumer({'x': None, 'o': 1}, bot_seat='x', bot_level='perfect')
+        await consumer._resume_bot()
+        store_room(winner='alice', seq=3, xIsNext='x')
+        await consumer._resume_bot()
+        start_bot_move.assert_not_called()
+
+
+@mock.patch.object(GameRoomConsumer, '_finalize_game', new_callable=mock.AsyncMock)
+@mock.patch('apps.core.consumers.timer_wheel')
+class MoveTest(RedisTestCase):
+    redis_keys = room_keys(ROOM_CODE)
+
+    def player(self, seat):
+        consumer = room_consumer({'x': 1, 'o': 2}, player_type=seat)
+        consumer.scope = {'user': USERS[seat]}
+        return consumer
+
+    def assertRejected(self, consumer, reason):
+        rejected, gamestate = sent_frames(consumer)
+        self.assertEqual((rejected['type'], rejected['reason']), ('move_rejected', reason))
+        self.assertEqual(gamestate['type'], 'latest_gamestate')
+        consumer.channel_layer.group_send.assert_not_called()
+
+    async def test_rejections(self, timer_wheel, finalize_game):
+        store_room(x=0b1, xIsNext='o', seq=1)
+        for seat, index, seq, reason in (('x', 4, 1, 'not_your_turn'),
+                                         ('o', 4, 0, 'stale_seq'),
+                                         ('o', 0, 1, 'square_taken'),
+                                         ('o', 9, 1, 'invalid_index'),
+                                         (None, 4, 1, 'not_a_player')):
+            with self.subTest(reason=reason):
+                consumer = self.player(seat)
+                with self.assertLogs('tictactoe', level='WARNING'):
+                    await consumer._handle_move({'type': 'move', 'index': index, 'seq': seq})
+                self.assertRejected(consumer, reason)
+        self.assertEqual(redis_client.hget(room_key(ROOM_CODE), 'seq'), '1')
+
+    async def test_move_is_stored_and_broadcast(self, timer_wheel, finalize_game):
+        store_room()
+        consumer = self.player('x')
+        await consumer._handle_move({'type': 'move', 'index': 4, 'seq': 0})
+
+        [frame] = group_frames(consumer)
+        self.assertEqual((frame['index'], frame['player'], frame['seq'], frame['xIsNext']), (4, 'X', 1, 'o'))
+        self.assertFalse(frame['winner'] or frame['draw'])
+        room = redis_client.hgetall(room_key(ROOM_CODE))
+        self.assertEqual((room['x'], room['seq'], room['xIsNext']), (str(1 << 4), '1', 'o'))
+        # O now has to answer in time, or X wins at seq 1.
+        timer_wheel.schedule.assert_called_once_with(
+            ROOM_CODE, MOVE_TIMEOUT_SECONDS, consumer._finish_on_time,
+            consumer.channel_layer, ROOM_CODE, 1, 'x', 1, 'alice')
+        finalize_game.assert_not_called()
+
+    async def test_winning_move_finishes_the_game(self, timer_wheel, finalize_game):
+        store_room(x=0b11, o=0b11000, seq=4)
+        consumer = self.player('x')
+        await consumer._handle_move({'type': 'move', 'index': 2, 'seq': 4})
+
+        [frame] = group_frames(consumer)
+        self.assertEqual((frame['winner'], frame['draw'], frame['seq']), ('alice', False, 5))
+        self.assertTrue(consumer.channel_layer.group_send.call_args.args[1]['finished'])
+        timer_wheel.cancel.assert_called_once_with(ROOM_CODE)
+        finalize_game.assert_awaited_once_with('x', 1, [2])
+        self.assertFalse(redis_client.exists(*room_keys(ROOM_CODE)))
+
+    async def test_last_open_square_draws(self, timer_wheel, finalize_game):
+        # X O X / X O O / O X _ with X to move fills the board without a line.
+        store_room(x=0b010001101, o=0b001110010, seq=8)
+        consumer = self.player('x')
+        await consumer._handle_move({'type': 'move', 'index': 8, 'seq': 8})
+
+        [frame] = group_frames(consumer)
+        self.assertEqual((frame['winner'], frame['draw']), (None, True))
+        finalize_game.assert_awaited_once_with('draw', None, [8])
+
+
+class ReplayTest(RedisTestCase):
+    redis_keys = room_keys(ROOM_CODE)
+
+    async def play_game(self, moves):
+        """ Plays X and O in turn into the first cells through the consumer, as sockets of the room would. """
+        player_cache.put(1, 'alice')
+        player_cache.put(2, 'bob')
+        self.addCleanup(player_cache.invalidate, 1, 2)
+        store_room()
+        consumer = room_consumer({'x': 1, 'o': 2})
+        with mock.patch('apps.core.consumers.timer_wheel'):
+            for index in range(moves):
+                consumer.player_type = 'x' if index % 2 == 0 else 'o'
+                consumer.scope = {'user': USERS[consumer.player_type]}
+                await consumer._handle_move({'type': 'move', 'index': index, 'seq': index})
+        return consumer
+
+    async def test_replays_the_gap(self):
+        consumer = await self.play_game(3)
+        redis_client.hset(room_key(ROOM_CODE), mapping={'ready_x': 1, 'ready_o': 1})
+
+        replay = await consumer._load_replay(1)
+
+        self.assertEqual((replay['type'], replay['seq'], replay['winner']), ('replay', 3, None))
+        self.assertTrue(replay['isReadyPlayer_x'] and replay['isReadyPlayer_o'])
+        self.assertEqual([(event['seq'], event['index'], event['player']) for event in replay['events']],
+                         [(2, 1, 'O'), (3, 2, 'X')])
+        self.assertGreater(replay['timeLeft'], 0)
+
+    async def test_up_to_date_client_gets_an_empty_replay(self):
+        consumer = await self.play_game(2)
+        self.assertEqual((await consumer._load_replay(2))['events'], [])
+
+    async def test_falls_back_to_the_full_state_once_the_log_lost_the_gap(self):
+        consumer = await self.play_game(3)
+        redis_client.ltrim(room_keys(ROOM_CODE)[2], -1, -1)
+
+        self.assertIsNone(await consumer._load_replay(1))
+        self.assertIsNone(await consumer._load_replay(4))
+
+        # The client then asks for a snapshot, which carries the whole board.
+        await consumer._handle_resume({'type': 'resume', 'lastSeq': 1})
+        [snapshot] = sent_frames(consumer)
+        self.assertEqual(snapshot['type'], 'room_snapshot')
+        self.assertEqual(snapshot['gameState']['squares'][:4], ['X', 'O', 'X', None])
+        self.assertEqual(snapshot['gameState']['seq'], 3)
+
+
+@mock.patch.object(GameRoomConsumer, '_load_seats', new_callable=mock.AsyncMock)
+class PlayersTest(SimpleTestCase):
+    def setUp(self):
+        player_cache.put(1, 'alice')
+
+    def tearDown(self):
+        player_cache.invalidate(1, 2)
+
+    async def test_bot_seat_is_not_reloaded(self, load_seats):
+        players = await room_consumer({'x': 1, 'o': None}, bot_seat='o', bot_level='easy')._get_players()
+
+        self.assertEqual((players['x'].username, players['o']), ('alice', None))
+        load_seats.assert_not_called()
+
+    async def test_missing_player_is_reloaded(self, load_seats):
+        # Bob joined after this socket connected.
+        player_cache.put(2, 'bob')
+        load_seats.return_value = {'x': 1, 'o': 2}
+        consumer = room_consumer({'x': 1, 'o': None})
+
+        players = await consumer._get_players()
+
+        self.assertEqual(players['o'].username, 'bob')
+        self.assertEqual(consumer.seats, {'x': 1, 'o': 2})
+        load_seats.assert_awaited_once()
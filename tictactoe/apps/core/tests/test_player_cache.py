@@ -0,0 +1,56 @@
+from django.test import SimpleTestCase, TestCase
+
+from apps.accounts.models import User
+from apps.core.player_cache import PlayerCache, player_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class PlayerCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = PlayerCache(ttl=10, max_entries=2, clock=self.clock)
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.put(1, 'alice')
+        self.clock.now = 9.9
+        self.assertEqual(self.cache.get(1), (1, 'alice'))
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_invalidate(self):
+        self.cache.put(1, 'alice')
+        self.cache.put(2, 'bob')
+        self.cache.invalidate(1, 3)
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual(self.cache.get(2).username, 'bob')
+
+    def test_size_is_bounded(self):
+        self.cache.put(1, 'alice')
+        self.clock.now = 5
+        self.cache.put(2, 'bob')
+        self.cache.put(3, 'carol')
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get(1))
+
+        self.clock.now = 12
+        self.cache.put(4, 'dave')
+        self.assertEqual([self.cache.get(user_id) for user_id in (2, 3, 4)], [None, (3, 'carol'), (4, 'dave')])
+
+
+class PlayerCacheInvalidationTest(TestCase):
+    def test_saving_a_user_drops_its_entry(self):
+        user = User.objects.create(username="alice", email="alice@example.com", password="<PASSWORD>")
+        player_cache.put(user.id, user.username)
+
+        user.username = "alice2"
+        user.save()
+
+        self.assertIsNone(player_cache.get(user.id))
@@ -0,0 +1,77 @@
+import json
+
+from django.test import SimpleTestCase
+
+from apps.core.protocol import (ProtocolError, decode_client_frame, decode_server_frame, encode_client_frame,
+                                encode_group_frame, encode_server_frame)
+
+
+def game_state(size=15, win_length=5):
+    squares = [None] * (size * size)
+    squares[0], squares[size * size - 1], squares[size + 1] = 'X', 'O', 'X'
+    return {
+        'squares': squares,
+        'boardSize': size,
+        'winLength': win_length,
+        'xIsNext': 'o',
+        'seq': 3,
+        'winner': None,
+        'timeLeft': 12500,
+    }
+
+
+class ProtocolTest(SimpleTestCase):
+    def test_client_frames_round_trip(self):
+        messages = [
+            {'type': 'move', 'seq': 70000, 'index': 224},
+            {'type': 'ready', 'isReadyPlayer_o': True},
+            {'type': 'acknowledgement', 'player_x': 'Zoë', 'player_o': None},
+            {'type': 'latest_gamestate_request'},
+            {'type': 'game_started'},
+            {'type': 'time_win'},
+            {'type': 'resume', 'lastSeq': 41},
+        ]
+        for message in messages:
+            with self.subTest(message=message['type']):
+                self.assertEqual(decode_client_frame(encode_client_frame(message)), message)
+
+    def test_server_frames_round_trip(self):
+        frames = [
+            {'type': 'move', 'index': 4, 'player': 'O', 'seq': 6, 'xIsNext': 'x', 'winner': 'player_o',
+             'draw': False, 'timeLeft': None},
+            {'type': 'move', 'index': 8, 'player': 'X', 'seq': 9, 'xIsNext': 'o', 'winner': None,
+             'draw': True, 'timeLeft': None},
+            {'type': 'game_over', 'winner': 'player_x'},
+            {'type': 'ready_x', 'isReadyPlayer_x': True},
+            {'type': 'acknowledgement', 'player_x': 'player_x', 'player_o': 'player_o'},
+            {'type': 'latest_gamestate', **game_state()},
+            {'type': 'latest_gamestate', **game_state(size=3, win_length=3)},
+            {'type': 'room_snapshot', 'isReadyPlayer_x': True, 'isReadyPlayer_o': False, 'gameState': game_state()},
+            {'type': 'connection_established', 'isReadyPlayer_x': False, 'isReadyPlayer_o': False, 'gameState': None},
+            {'type': 'move_rejected', 'reason': 'stale_seq', 'seq': 12},
+            {'type': 'replay', 'isReadyPlayer_x': True, 'isReadyPlayer_o': True, 'seq': 7, 'winner': None,
+             'timeLeft': 28000, 'events': [
+                 {'type': 'move', 'index': 30, 'player': 'O', 'seq': 6, 'xIsNext': 'x', 'winner': None,
+                  'draw': False, 'timeLeft': None},
+                 {'type': 'move', 'index': 31, 'player': 'X', 'seq': 7, 'xIsNext': 'o', 'winner': None,
+                  'draw': False, 'timeLeft': None},
+             ]},
+            {'type': 'replay', 'isReadyPlayer_x': False, 'isReadyPlayer_o': True, 'seq': 0, 'winner': None,
+             'timeLeft': None, 'events': []},
+        ]
+        for frame in frames:
+            with self.subTest(frame=frame['type']):
+                self.assertEqual(decode_server_frame(encode_server_frame(frame)), frame)
+
+    def test_binary_frames_are_smaller_than_json(self):
+        frame = {'type': 'room_snapshot', 'isReadyPlayer_x': True, 'isReadyPlayer_o': True, 'gameState': game_state()}
+        encoded = encode_group_frame(frame)
+        self.assertEqual(json.loads(encoded['text']), frame)
+        self.assertLess(len(encoded['bytes']) * 10, len(encoded['text']))
+
+    def test_malformed_frames_raise_protocol_error(self):
+        move = encode_client_frame({'type': 'move', 'seq': 1, 'index': 2})
+        for data in (b'', b'\x7f', move[:-1], b'\x02\x05', b'\x03\x00\x05ab'):
+            with self.subTest(data=data):
+                with self.assertRaises(ProtocolError):
+                    decode_client_frame(data)
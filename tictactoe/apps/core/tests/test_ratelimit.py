@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.core.ratelimit import RATE_LIMIT_CLOSE_CODE, RateLimiter, admit
+from apps.utils.redis_client import redis_client
+from apps.utils.redis_scripts import take_token
+from apps.utils.redis_testing import RedisTestCase
+
+RATE_LIMITS = {'test': {'rate': 1, 'burst': 3, 'strikes': 2}}
+
+
+class FakeConsumer:
+    def __init__(self, rate_limiter):
+        self.rate_limiter = rate_limiter
+        self.channel_name = 'test.channel'
+        self.close = mock.AsyncMock()
+
+
+@override_settings(RATE_LIMITS=RATE_LIMITS)
+class RateLimiterTest(SimpleTestCase):
+    def test_bucket_per_user_or_per_socket(self):
+        user = SimpleNamespace(pk=7, is_authenticated=True)
+        anonymous = SimpleNamespace(pk=None, is_authenticated=False)
+
+        self.assertEqual(RateLimiter.for_scope('test', {'user': user}, 'chan').bucket_key, 'ratelimit:test:user:7')
+        self.assertEqual(RateLimiter.for_scope('test', {'user': anonymous}, 'chan').bucket_key,
+                         'ratelimit:test:socket:chan')
+        self.assertEqual(RateLimiter.for_scope('test', {}, 'chan').bucket_key, 'ratelimit:test:socket:chan')
+
+    @mock.patch('apps.core.ratelimit.take_token')
+    async def test_strikes_count_denials_in_a_row(self, take_token):
+        limiter = RateLimiter('test', 'user:1')
+        take_token.side_effect = [False, True, False, False]
+
+        self.assertFalse(await limiter.allow())
+        self.assertEqual(limiter.strikes, 1)
+        self.assertTrue(await limiter.allow())
+        self.assertEqual(limiter.strikes, 0)
+        self.assertFalse(await limiter.allow())
+        self.assertFalse(limiter.exceeded)
+        self.assertFalse(await limiter.allow())
+        self.assertTrue(limiter.exceeded)
+        take_token.assert_called_with('ratelimit:test:user:1', 1, 3)
+
+    @mock.patch('apps.core.ratelimit.take_token', side_effect=ConnectionError)
+    async def test_fails_open_when_redis_is_down(self, take_token):
+        limiter = RateLimiter('test', 'user:1')
+        with self.assertLogs('tictactoe', level='ERROR'):
+            self.assertTrue(await limiter.allow())
+        self.assertEqual(limiter.strikes, 0)
+
+    @mock.patch('apps.core.ratelimit.take_token', return_value=False)
+    async def test_admit_closes_once_the_limit_is_exceeded(self, take_token):
+        consumer = FakeConsumer(RateLimiter('test', 'user:1'))
+
+        self.assertFalse(await admit(consumer))
+        consumer.close.assert_not_called()
+        with self.assertLogs('tictactoe', level='WARNING'):
+            self.assertFalse(await admit(consumer))
+        consumer.close.assert_called_once_with(code=RATE_LIMIT_CLOSE_CODE)
+
+    @mock.patch('apps.core.ratelimit.take_token', return_value=True)
+    async def test_admit_lets_allowed_frames_through(self, take_token):
+        consumer = FakeConsumer(RateLimiter('test', 'user:1'))
+        self.assertTrue(await admit(consumer))
+        consumer.close.assert_not_called()
+
+
+class TokenBucketScriptTest(RedisTestCase):
+    BUCKET = 'ratelimit:test:bucket'
+    redis_keys = (BUCKET,)
+
+    def redis_now_ms(self):
+        return int(self.redis_now() * 1000)
+
+    async def test_burst_then_empty(self):
+        taken = [await take_token(self.BUCKET, 1, 3) for _ in range(4)]
+        self.assertEqual(taken, [True, True, True, False])
+
+    async def test_refills_at_rate_up_to_burst(self):
+        # An empty bucket last counted 2.5 seconds ago has refilled two whole tokens at one per second.
+        redis_client.hset(self.BUCKET, mapping={'tokens': 0, 'ts': self.redis_now_ms() - 2500})
+        taken = [await take_token(self.BUCKET, 1, 3) for _ in range(3)]
+        self.assertEqual(taken, [True, True, False])
+
+        # However long it was idle, it never holds more than the burst.
+        redis_client.hset(self.BUCKET, mapping={'tokens': 0, 'ts': self.redis_now_ms() - 60000})
+        taken = [await take_token(self.BUCKET, 1, 3) for _ in range(4)]
+        self.assertEqual(taken, [True, True, True, False])
+
+    async def test_bucket_expires_once_it_would_be_full(self):
+        await take_token(self.BUCKET, 2, 4)
+        self.assertTrue(0 < redis_client.pttl(self.BUCKET) <= 4 / 2 * 1000 + 1000)
@@ -0,0 +1,153 @@
+import json
+
+from apps.utils.redis_client import redis_client
+from apps.utils.redis_scripts import (MOVE_APPLIED,
+                                      MOVE_GAME_OVER,
+                                      MOVE_STALE,
+                                      apply_move,
+                                      finish_game,
+                                      resume_room,
+                                      start_game,
+                                      store_ready)
+from apps.utils.redis_testing import RedisTestCase
+from apps.utils.redis_utils import room_key, room_keys
+
+ROOM_CODE = 'test-room-scripts'
+TTL = 60
+
+
+class RoomScriptTestCase(RedisTestCase):
+    """Runs the room state scripts against the test Redis."""
+    redis_keys = room_keys(ROOM_CODE)
+
+    async def start(self):
+        return await start_game(ROOM_CODE, {'x': 0, 'o': 0, 'xIsNext': 'x', 'winner': ''}, TTL)
+
+    async def move(self, expected_seq, index, winner=''):
+        frame = json.dumps({'type': 'move', 'index': index, 'seq': expected_seq + 1})
+        return await apply_move(ROOM_CODE, expected_seq, {'x': 1 << index, 'winner': winner}, frame, TTL)
+
+
+class ReadyScriptTest(RoomScriptTestCase):
+    async def test_only_the_first_ready_of_a_seat_counts(self):
+        self.assertEqual(await store_ready(ROOM_CODE, 'x', TTL), (True, True, False))
+        self.assertEqual(await store_ready(ROOM_CODE, 'x', TTL), (False, True, False))
+        self.assertEqual(await store_ready(ROOM_CODE, 'o', TTL), (True, True, True))
+        self.assertEqual(await store_ready(ROOM_CODE, 'o', TTL), (False, True, True))
+
+    async def test_ready_refreshes_the_room_ttl(self):
+        await store_ready(ROOM_CODE, 'x', TTL)
+        self.assertTrue(0 < redis_client.ttl(room_key(ROOM_CODE)) <= TTL)
+
+
+class MoveScriptTest(RoomScriptTestCase):
+    def events(self):
+        return [json.loads(frame)['seq'] for frame in redis_client.lrange(room_keys(ROOM_CODE)[2], 0, -1)]
+
+    async def test_start_only_once(self):
+        self.assertTrue(await self.start())
+        await self.move(0, 4)
+        self.assertFalse(await self.start())
+        self.assertEqual(redis_client.hget(room_key(ROOM_CODE), 'seq'), '1')
+
+    async def test_moves_advance_the_seq_and_log_their_frames(self):
+        await self.start()
+        self.assertEqual(await self.move(0, 4), (MOVE_APPLIED, 1))
+        self.assertEqual(await self.move(1, 0), (MOVE_APPLIED, 2))
+        self.assertEqual(self.events(), [1, 2])
+
+    async def test_stale_seq_is_rejected(self):
+        await self.start()
+        await self.move(0, 4)
+
+        self.assertEqual(await self.move(0, 0), (MOVE_STALE, 1))
+        self.assertEqual(await self.move(2, 0), (MOVE_STALE, 1))
+        self.assertEqual(redis_client.hget(room_key(ROOM_CODE), 'x'), str(1 << 4))
+        self.assertEqual(self.events(), [1])
+
+    async def test_no_move_after_game_over(self):
+        await self.start()
+        await self.move(0, 4, winner='alice')
+
+        self.assertEqual(await self.move(1, 0), (MOVE_GAME_OVER, 1))
+        self.assertEqual(self.events(), [1])
+
+
+class FinishScriptTest(RoomScriptTestCase):
+    async def test_finishes_once(self):
+        await self.start()
+        self.assertTrue(await finish_game(ROOM_CODE, 0, 'bob'))
+        self.assertFalse(await finish_game(ROOM_CODE, 0, 'alice'))
+        self.assertEqual(redis_client.hget(room_key(ROOM_CODE), 'winner'), 'bob')
+        self.assertEqual((await self.move(0, 4))[0], MOVE_GAME_OVER)
+
+    async def test_timer_of_an_answered_move_is_a_no_op(self):
+        await self.start()
+        await self.move(0, 4)
+        self.assertFalse(await finish_game(ROOM_CODE, 0, 'bob'))
+        self.assertEqual(redis_client.hget(room_key(ROOM_CODE), 'winner'), '')
+
+    async def test_finished_by_a_winning_move(self):
+        await self.start()
+        await self.move(0, 4, winner='alice')
+        self.assertFalse(await finish_game(ROOM_CODE, 1, 'bob'))
+        self.assertEqual(redis_client.hget(room_key(ROOM_CODE), 'winner'), 'alice')
+
+
+class ResumeScriptTest(RoomScriptTestCase):
+    async def play(self, moves):
+        await self.start()
+        for seq in range(moves):
+            await self.move(seq, seq)
+
+    def seqs(self, frames):
+        return [json.loads(frame)['seq'] for frame in frames]
+
+    async def test_replays_the_moves_after_the_last_seq(self):
+        await self.play(3)
+
+        room, frames = await resume_room(ROOM_CODE, 1, TTL)
+
+        self.assertEqual(room['seq'], '3')
+        self.assertEqual(self.seqs(frames), [2, 3])
+        self.assertEqual(self.seqs((await resume_room(ROOM_CODE, 0, TTL))[1]), [1, 2, 3])
+
+    async def test_nothing_missed(self):
+        await self.play(2)
+        self.assertEqual((await resume_room(ROOM_CODE, 2, TTL))[1], [])
+
+    async def test_gap_older_than_the_log(self):
+        await self.play(3)
+        # The log was capped after the second move.
+        redis_client.ltrim(room_keys(ROOM_CODE)[2], -1, -1)
+
+        self.assertEqual(self.seqs((await resume_room(ROOM_CODE, 2, TTL))[1]), [3])
+        self.assertIsNone((await resume_room(ROOM_CODE, 1, TTL))[1])
+
+    async def test_seq_ahead_of_the_room(self):
+        await self.play(1)
+        self.assertIsNone((await resume_room(ROOM_CODE, 2, TTL))[1])
+
+    async def test_resume_refreshes_the_room_ttl(self):
+        await self.play(1)
+        redis_client.expire(room_key(ROOM_CODE), 5)
+        await resume_room(ROOM_CODE, 1, TTL)
+        self.assertGreater(redis_client.ttl(room_key(ROOM_CODE)), 5)
+
+
+class PurgedRoomTest(RoomScriptTestCase):
+    async def test_finish_leaves_a_purged_room_alone(self):
+        self.assertFalse(await finish_game(ROOM_CODE, 0, 'alice'))
+        self.assertFalse(redis_client.exists(room_key(ROOM_CODE)))
+
+    async def test_move_is_rejected_once_the_room_is_gone(self):
+        self.assertEqual(await self.move(0, 4), (MOVE_GAME_OVER, 0))
+        self.assertFalse(redis_client.exists(*room_keys(ROOM_CODE)))
+
+    async def test_first_move_of_both_ready_players_starts_the_game(self):
+        await store_ready(ROOM_CODE, 'x', TTL)
+        self.assertEqual((await self.move(0, 4))[0], MOVE_GAME_OVER)
+
+        await store_ready(ROOM_CODE, 'o', TTL)
+        self.assertEqual(await self.move(0, 4), (MOVE_APPLIED, 1))
+        self.assertEqual(redis_client.hget(room_key(ROOM_CODE), 'seq'), '1')
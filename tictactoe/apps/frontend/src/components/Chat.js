@@ -6,19 +6,27 @@ const Chat = ({ roomCode }) => {
     const [messageInput, setMessageInput] = useState('');
     const chatContainerRef = useRef(null);
     const chatSocketRef = useRef(null);
+    // Stream id of the oldest message shown, null once the start of the chat is reached
+    const historyCursorRef = useRef(null);
+    const loadingHistoryRef = useRef(false);
+    const previousHeightRef = useRef(null);
 
     useEffect(() => {
         const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
         chatSocketRef.current = new WebSocket(`${protocol}://${window.location.host}/ws/${roomCode}/chat-socket/`);
 
-        chatSocketRef.current.onopen = () => {
-            chatSocketRef.current.send(JSON.stringify({ type: 'latest_messages_request' }));
-        };
-
         chatSocketRef.current.onmessage = (event) => {
             const data = JSON.parse(event.data);
             if (data.type === 'chat') {
                 setMessages((prevMessages) => [...prevMessages, data]);
+            } else if (data.type === 'chat_history') {
+                if (loadingHistoryRef.current) {
+                    setMessages((prevMessages) => [...data.messages, ...prevMessages]);
+                } else {
+                    setMessages(data.messages);
+                }
+                historyCursorRef.current = data.cursor;
+                loadingHistoryRef.current = false;
             }
         };
 
@@ -28,13 +36,26 @@ const Chat = ({ roomCode }) => {
     }, [roomCode]);
 
     useEffect(() => {
-        // Auto-scroll to the latest message
         const chatContainer = chatContainerRef.current;
-        if (chatContainer) {
+        if (!chatContainer) return;
+        if (previousHeightRef.current !== null) {
+            // An older page was prepended: keep the visible messages in place
+            chatContainer.scrollTop += chatContainer.scrollHeight - previousHeightRef.current;
+            previousHeightRef.current = null;
+        } else {
+            // Auto-scroll to the latest message
             chatContainer.scrollTop = chatContainer.scrollHeight;
         }
     }, [messages]);
 
+    const handleScroll = (e) => {
+        if (e.target.scrollTop === 0 && historyCursorRef.current && !loadingHistoryRef.current) {
+            loadingHistoryRef.current = true;
+            previousHeightRef.current = e.target.scrollHeight;
+            chatSocketRef.current.send(JSON.stringify({ type: 'chat_history_request', before: historyCursorRef.current }));
+        }
+    };
+
     const handleMessageInput = (e) => setMessageInput(e.target.value);
 
     const handleSendMessage = () => {
@@ -83,6 +104,7 @@ const Chat = ({ roomCode }) => {
                     bgcolor: '#f9f9f9',
                 }}
                 ref={chatContainerRef}
+                onScroll={handleScroll}
             >
                 {messages.length === 0 ? (
                     <Typography
@@ -96,7 +118,7 @@ const Chat = ({ roomCode }) => {
                 ) : (
                     messages.map((message, index) => (
                         <Box
-                            key={index}
+                            key={message.id || index}
                             sx={{
                                 mb: 1,
                                 p: 1,
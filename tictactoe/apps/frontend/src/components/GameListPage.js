@@ -34,10 +34,12 @@ export default class RouterPage extends Component {
         super(props);
         this.state = {
             game_option: 'r',
+            bot_level: '',
             csrfToken: '',
             jwtToken: '',
             gameRooms: [],
             searching: false,
+            expectedWait: null,
             isPrivateGame: true,
         };
     }
@@ -61,15 +63,19 @@ export default class RouterPage extends Component {
         this.setState({ game_option: e.target.value });
     };
 
+    handleBotLevelChange = (e) => {
+        this.setState({ bot_level: e.target.value });
+    };
+
     handleGameCodeInputChange = (e) => {
         this.roomCodeInput = e.target.value;
     };
 
     handleCreateButtonClicked = async () => {
-        const { game_option, jwtToken } = this.state;
+        const { game_option, bot_level, jwtToken } = this.state;
 
         let requestOptions = getRequestOptions(this, 'POST');
-        requestOptions.body = JSON.stringify({ game_option, jwt_token: jwtToken });
+        requestOptions.body = JSON.stringify({ game_option, bot_level, jwt_token: jwtToken });
 
         const gameRoomURL = await createGameRoom(requestOptions);
         if (gameRoomURL) {
@@ -118,7 +124,9 @@ export default class RouterPage extends Component {
     handleSocketMessage(event) {
         try {
             const searchQueueData = JSON.parse(event.data);
-            if (searchQueueData.type === 'match_found') {
+            if (searchQueueData.type === 'connection_established') {
+                this.setState({ expectedWait: searchQueueData.expectedWait });
+            } else if (searchQueueData.type === 'match_found') {
                 this.setState({ searching: false });
                 this.handleMatchFound(searchQueueData.gameRoomCode);
             }
@@ -265,7 +273,7 @@ export default class RouterPage extends Component {
     }
 
     render() {
-        const {isPrivateGame, searching} = this.state;
+        const {isPrivateGame, searching, expectedWait} = this.state;
 
         return (
             <>
@@ -296,6 +304,12 @@ export default class RouterPage extends Component {
                                         <FormControlLabel value="x" control={<Radio />} label="Play as X" />
                                         <FormControlLabel value="o" control={<Radio />} label="Play as O" />
                                     </RadioGroup>
+                                    <RadioGroup row defaultValue='' onChange={this.handleBotLevelChange}>
+                                        <FormControlLabel value="" control={<Radio />} label="Human" />
+                                        <FormControlLabel value="easy" control={<Radio />} label="Easy bot" />
+                                        <FormControlLabel value="medium" control={<Radio />} label="Medium bot" />
+                                        <FormControlLabel value="perfect" control={<Radio />} label="Perfect bot" />
+                                    </RadioGroup>
                                 </FormControl>
                                 <Button
                                     variant="contained"
@@ -351,6 +365,7 @@ export default class RouterPage extends Component {
                             {searching && (
                                 <Typography variant="body1" color="textSecondary">
                                     Searching for a match, please wait...
+                                    {expectedWait !== null && ` Usually takes about ${Math.ceil(expectedWait)} s.`}
                                 </Typography>
                             )}
                         </Grid>
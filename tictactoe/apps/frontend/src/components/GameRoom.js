@@ -12,19 +12,19 @@ import {
     getRequestOptions,
     fetchGameRoomData,
     formatTime,
-    fetchTokensAndStore,
-    calculateWinner
+    fetchTokensAndStore
 } from "./utils";
 
 
-function Square({ value, onSquareClick }) {
+function Square({ value, size, onSquareClick }) {
     return (
         <Button
             variant="outlined"
             onClick={onSquareClick}
             style={{
-                width: "12vw",
-                height: "12vw",
+                minWidth: 0,
+                width: size,
+                height: size,
                 fontSize: "24px",
                 margin: "5px",
             }}
@@ -35,17 +35,20 @@ function Square({ value, onSquareClick }) {
 }
 
 
-function Board({ xIsNext: nextMove, squares, onPlay, isHost, gameOption, startTime, elapsedTime, countdownDuration }) {
+// The server runs the move clock; a client only reports a timeout the server may have missed.
+const TIME_WIN_CLAIM_GRACE_MS = 2000;
+const ROOM_RECONNECT_DELAY_MS = 1000;
+
+
+function Board({ xIsNext: nextMove, squares, boardSize, winner, onPlay, isHost, gameOption, timeLeft }) {
     const handleClick = (i) => {
         const currentPlayer = isHost ? (gameOption === 'x' ? 'X' : 'O') : (gameOption === 'x' ? 'O' : 'X');
 
         if ((currentPlayer === 'X' && nextMove === 'x') || (currentPlayer === 'O' && nextMove === 'o')) {
-            if (squares[i] || calculateWinner(squares)) {
+            if (squares[i] || winner) {
                 return;
             }
-            const nextSquares = squares.slice();
-            nextSquares[i] = currentPlayer;
-            onPlay(nextSquares);
+            onPlay(i);
         }
     };
 
@@ -55,14 +58,15 @@ function Board({ xIsNext: nextMove, squares, onPlay, isHost, gameOption, startTi
         <Box>
             <Typography variant="h6" align="center">{status}</Typography>
             <Grid container spacing={1} justifyContent="center">
-                {Array.from({ length: 3 }).map((_, row) => (
+                {Array.from({ length: boardSize }).map((_, row) => (
                     <Grid container key={row} item xs={12} justifyContent="center">
-                        {Array.from({ length: 3 }).map((_, col) => {
-                            const idx = row * 3 + col;
+                        {Array.from({ length: boardSize }).map((_, col) => {
+                            const idx = row * boardSize + col;
                             return (
                                 <Square
                                     key={idx}
                                     value={squares[idx]}
+                                    size={boardSize > 3 ? `${36 / boardSize}vw` : "12vw"}
                                     onSquareClick={() => handleClick(idx)}
                                 />
                             );
@@ -70,9 +74,9 @@ function Board({ xIsNext: nextMove, squares, onPlay, isHost, gameOption, startTi
                     </Grid>
                 ))}
             </Grid>
-            {startTime && (
+            {timeLeft !== null && !winner && (
                 <Typography variant="body2" align="center">
-                    Time left: {formatTime(countdownDuration - elapsedTime)}
+                    Time left: {formatTime(timeLeft)}
                 </Typography>
             )}
         </Box>
@@ -92,14 +96,18 @@ export default class GameRoom extends Component {
             csrfToken: '',
             jwtToken: '',
             winner: null,
-            startTime: null,
-            elapsedTime: 0,
+            deadline: null,
+            now: Date.now(),
             player_x: null,
             player_o: null,
             isReadyPlayer_x: false,
             isReadyPlayer_o: false,
             isGameStarted: false,
             xIsNext: 'x',
+            seq: 0,
+            boardSize: 3,
+            winLength: 3,
+            botLevel: '',
         };
         this.gameRoomCode = this.props.gameRoomCode;
     }
@@ -131,31 +139,32 @@ export default class GameRoom extends Component {
 
     connectToRoomWebSocket() {
         const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
-        const wsRoomUrl = `${protocol}://${window.location.host}/ws/tictactoe-game-socket/${this.gameRoomCode}/`;
+        let wsRoomUrl = `${protocol}://${window.location.host}/ws/tictactoe-game-socket/${this.gameRoomCode}/`;
+        if (this.roomSocket) {
+            // Reconnect: the server replays only the moves after the last seq we applied.
+            wsRoomUrl += `?lastSeq=${this.state.seq}`;
+        }
         this.roomSocket = new WebSocket(wsRoomUrl);
 
         this.roomSocket.onmessage = this.handleWebSocketMessage.bind(this);
-        this.roomSocket.onopen = this.handleWebSocketOpen.bind(this);
+        this.roomSocket.onclose = this.handleWebSocketClose.bind(this);
+    }
+
+    handleWebSocketClose() {
+        if (this.isUnmounted || this.state.winner) {
+            return;
+        }
+        this.reconnectTimeout = setTimeout(() => this.connectToRoomWebSocket(), ROOM_RECONNECT_DELAY_MS);
     }
 
     handleWebSocketMessage(e) {
         const data = JSON.parse(e.data);
         switch (data.type) {
-            case "game_state":
-                const history = [...this.state.history];
-                const currentMove = this.state.currentMove + 1;
-                const nextHistory = history.slice(0, currentMove).concat([data.squares]);
-
-                this.setState({
-                    history: nextHistory,
-                    currentMove: currentMove,
-                    player_x: this.state.player_x || data.player_x,
-                    player_o: this.state.player_o || data.player_o,
-                    winner: data.winner,
-                });
-                if (data.xIsNext !== null) {
-                    this.state.xIsNext = data.xIsNext
-                }
+            case "move":
+                this.applyMove(data);
+                break;
+            case "game_over":
+                this.setState({ winner: data.winner });
                 break;
             case "latest_gamestate":
                 this.updateGameState(data);
@@ -163,6 +172,12 @@ export default class GameRoom extends Component {
             case "connection_established":
                 this.handleConnectionEstablished(data);
                 break;
+            case "room_snapshot":
+                this.applySnapshot(data);
+                break;
+            case "replay":
+                this.applyReplay(data);
+                break;
             case "ready_x":
                 this.setState({ isReadyPlayer_x: data.isReadyPlayer_x });
                 break;
@@ -180,17 +195,8 @@ export default class GameRoom extends Component {
         }
     }
 
-    handleWebSocketOpen() {
-        this.roomSocket.send(JSON.stringify({
-            room_code: this.gameRoomCode,
-            type: 'latest_gamestate_request',
-            player_x: this.state.player_x,
-            player_o: this.state.player_o,
-            squares: this.state.history[history.length - 1]
-        }));
-    }
-
     handleConnectionEstablished(data) {
+        this.applySnapshot(data);
         this.roomSocket.send(JSON.stringify({
             room_code: this.gameRoomCode,
             type: 'acknowledgement',
@@ -199,6 +205,59 @@ export default class GameRoom extends Component {
         }));
     }
 
+    applyMove(data) {
+        const { history, currentMove } = this.state;
+        const nextSquares = history[currentMove].slice();
+        nextSquares[data.index] = data.player;
+        const nextHistory = history.slice(0, currentMove + 1).concat([nextSquares]);
+
+        this.setState({
+            history: nextHistory,
+            currentMove: currentMove + 1,
+            seq: data.seq,
+            xIsNext: data.xIsNext,
+            winner: data.draw ? 'Draw' : data.winner,
+        });
+        this.setMoveClock(data.timeLeft);
+    }
+
+    applyReplay(data) {
+        // Replayed moves are applied in one state update, the clock comes from the replay itself.
+        const { history, currentMove } = this.state;
+        let nextHistory = history.slice(0, currentMove + 1);
+        let state = { seq: this.state.seq, xIsNext: this.state.xIsNext, winner: this.state.winner };
+        for (const move of data.events) {
+            if (move.seq <= state.seq) {
+                continue;
+            }
+            const nextSquares = nextHistory[nextHistory.length - 1].slice();
+            nextSquares[move.index] = move.player;
+            nextHistory = nextHistory.concat([nextSquares]);
+            state = { seq: move.seq, xIsNext: move.xIsNext, winner: move.draw ? 'Draw' : move.winner };
+        }
+
+        this.setState({
+            ...state,
+            history: nextHistory,
+            currentMove: nextHistory.length - 1,
+            winner: state.winner || (data.winner === 'draw' ? 'Draw' : data.winner),
+            isReadyPlayer_x: this.state.isReadyPlayer_x || data.isReadyPlayer_x,
+            isReadyPlayer_o: this.state.isReadyPlayer_o || data.isReadyPlayer_o,
+        });
+        this.setMoveClock(data.timeLeft);
+    }
+
+    applySnapshot(data) {
+        this.setState({
+            isReadyPlayer_x: this.state.isReadyPlayer_x || data.isReadyPlayer_x,
+            isReadyPlayer_o: this.state.isReadyPlayer_o || data.isReadyPlayer_o,
+        });
+
+        if (data.gameState) {
+            this.updateGameState({ type: 'latest_gamestate', ...data.gameState });
+        }
+    }
+
     updateGameState(data) {
         const history = [...this.state.history];
         const currentMove = this.state.currentMove + 1;
@@ -209,7 +268,8 @@ export default class GameRoom extends Component {
             currentMove: currentMove,
             player_x: this.state.player_x || data.player_x,
             player_o: this.state.player_o || data.player_o,
-            winner: data.winner,
+            winner: data.winner === 'draw' ? 'Draw' : data.winner,
+            seq: data.seq,
             isReadyPlayer_o: data.type === "latest_gamestate" ? true : this.state.isReadyPlayer_o,
             isReadyPlayer_x: data.type === "latest_gamestate" ? true : this.state.isReadyPlayer_x,
         });
@@ -217,8 +277,37 @@ export default class GameRoom extends Component {
         if (data.xIsNext !== null) {
             this.state.xIsNext = data.xIsNext
         }
+        this.setMoveClock(data.timeLeft);
     }
 
+    setMoveClock(timeLeft) {
+        if (timeLeft === null || timeLeft === undefined) {
+            this.stopTimer();
+            this.setState({ deadline: null });
+            return;
+        }
+
+        this.timeWinClaimed = false;
+        this.setState({ deadline: Date.now() + timeLeft, now: Date.now() });
+        if (!this.timerInterval) {
+            // Display only: nothing is sent while the clock runs.
+            this.timerInterval = setInterval(this.tickMoveClock, 250);
+        }
+    }
+
+    tickMoveClock = () => {
+        const now = Date.now();
+        this.setState({ now });
+
+        if (!this.timeWinClaimed && this.state.deadline && now >= this.state.deadline + TIME_WIN_CLAIM_GRACE_MS) {
+            this.timeWinClaimed = true;
+            this.roomSocket.send(JSON.stringify({
+                room_code: this.gameRoomCode,
+                type: 'time_win',
+            }));
+        }
+    };
+
     async getRoomDetails() {
         const requestOptions = getRequestOptions(this, 'GET');
 
@@ -231,6 +320,10 @@ export default class GameRoom extends Component {
                     isHost: gameRoomData.is_host,
                     player_x: gameRoomData.player_x,
                     player_o: gameRoomData.player_o,
+                    boardSize: gameRoomData.board_size,
+                    winLength: gameRoomData.win_length,
+                    botLevel: gameRoomData.bot_level,
+                    history: [Array(gameRoomData.board_size * gameRoomData.board_size).fill(null)],
                 }, resolve);
             });
         } else {
@@ -259,7 +352,6 @@ export default class GameRoom extends Component {
     }
 
     startGame() {
-        this.startTimer();
         this.setState({ isGameStarted: true });
 
         this.roomSocket.send(JSON.stringify({
@@ -271,7 +363,8 @@ export default class GameRoom extends Component {
     }
 
     stopTimer() {
-        clearInterval(this.state.timerInterval);
+        clearInterval(this.timerInterval);
+        this.timerInterval = null;
     }
 
     sendReadyState(ready_state) {
@@ -283,80 +376,35 @@ export default class GameRoom extends Component {
     }
 
 
-    handlePlay = (nextSquares) => {
-        const { history, currentMove } = this.state;
-        const nextHistory = [...history.slice(0, currentMove), nextSquares];
-        this.setState({
-            history: nextHistory,
-            currentMove: nextHistory.length - 1,
-        });
-
-        if (currentMove === 0 && !this.state.startTime) {
-            this.startTimer();
-        }
-        if (this.state.xIsNext === 'x') {
-            this.state.xIsNext = 'o'
-        } else if (this.state.xIsNext === 'o') {
-            this.state.xIsNext = 'x'
-        } else {
-            console.log("Error. Wrong type of xIsNext was passed")
-        }
-
+    handlePlay = (index) => {
+        // The server owns the board; the square is filled once the move comes back as a delta.
         this.roomSocket.send(JSON.stringify({
-            room_code: this.gameRoomCode,
-            type: 'game_state',
-            squares: nextSquares,
-            player_x: this.state.player_x,
-            player_o: this.state.player_o,
-            xIsNext: this.state.xIsNext
+            type: 'move',
+            index: index,
+            seq: this.state.seq,
         }));
     };
 
+    botName() {
+        // Matches bot_name() on the server, which also reports bot wins under this name.
+        return this.state.botLevel ? `Bot (${this.state.botLevel})` : null;
+    }
+
     handleLeave = () => {
         goToURL('/games/')
     };
 
-    startTimer() {
-        const countdownDuration = 30 * 1000; // 30 seconds in milliseconds
-        this.setState({ startTime: Date.now(), countdownDuration });
-
-        this.state.timerInterval = setInterval(() => {
-            const elapsedTime = Date.now() - this.state.startTime;
-            const remainingTime = countdownDuration - elapsedTime;
-
-            if (remainingTime <= 0) {
-                clearInterval(this.state.timerInterval);
-                this.setState({ elapsedTime: countdownDuration, isGameOver: true });
-                this.timeWin()
-            } else {
-                this.setState({ elapsedTime });
-            }
-        }, 10);
-    }
-
-    timeWin() {
-        let winner = null
-        if (this.state.xIsNext === "X") {
-            winner = this.state.player_o
-        } else {
-            winner = this.state.player_x
-        }
-        this.roomSocket.send(JSON.stringify({
-            room_code: this.gameRoomCode,
-            type: 'time_win',
-            winner: winner,
-            squares: this.state.history[this.state.currentMove],
-            player_x: this.state.player_x,
-            player_o: this.state.player_o,
-        }));
-    }
-
     componentWillUnmount() {
-        clearInterval(this.state.timerInterval);
+        this.isUnmounted = true;
+        clearTimeout(this.reconnectTimeout);
+        if (this.roomSocket) {
+            this.roomSocket.close();
+        }
+        this.stopTimer();
     }
 
     render() {
-        const { history, currentMove, elapsedTime, winner, xIsNext } = this.state;
+        const { history, currentMove, deadline, now, winner, xIsNext } = this.state;
         const currentSquares = history[currentMove];
 
         return (
@@ -365,9 +413,10 @@ export default class GameRoom extends Component {
                     <Typography variant="h4" align="center" style={{ padding: 20, textAlign: "center" }}>Tic Tac Toe</Typography>
                     <Typography style={{ textAlign: "center" }}>Room Code: {this.gameRoomCode}</Typography>
                     <Typography style={{ textAlign: "center" }}>Game mode: {this.state.gameOption}</Typography>
+                    <Typography style={{ textAlign: "center" }}>Board: {this.state.boardSize}x{this.state.boardSize}, {this.state.winLength} in a row</Typography>
                     <Typography style={{ textAlign: "center" }}>Host: {this.state.isHost.toString()}</Typography>
-                    <Typography style={{ textAlign: "center" }}>Player X: {this.state.player_x}</Typography>
-                    <Typography style={{ textAlign: "center" }}>Player O: {this.state.player_o}</Typography>
+                    <Typography style={{ textAlign: "center" }}>Player X: {this.state.player_x || this.botName()}</Typography>
+                    <Typography style={{ textAlign: "center" }}>Player O: {this.state.player_o || this.botName()}</Typography>
                     <Chat roomCode={this.gameRoomCode}/>
                 </Grid>
                 <Grid item xs={10}>
@@ -375,12 +424,12 @@ export default class GameRoom extends Component {
                     <Board
                         xIsNext={xIsNext}
                         squares={currentSquares}
+                        boardSize={this.state.boardSize}
+                        winner={winner}
                         onPlay={this.handlePlay}
                         isHost={this.state.isHost}
                         gameOption={this.state.gameOption}
-                        startTime={this.state.startTime}
-                        elapsedTime={elapsedTime}
-                        countdownDuration={this.state.countdownDuration}
+                        timeLeft={deadline ? Math.max(0, deadline - now) : null}
                     />
                 ) : (
                     <div style={{ marginTop: "20px", textAlign: "center" }}>
@@ -1,14 +1,29 @@
 """
-Singleton redis client
+Singleton redis clients
 """
 
 import redis
+import redis.asyncio
 from django.conf import settings
 from redis.exceptions import ConnectionError
 
-REDIS_CHAT_EXPIRATION_SECONDS = 3600  # 1 hour
-REDIS_GAMECHAT_EXPIRATION_SECONDS = 1800  # 30 minutes
-REDIS_CHAT_MESSAGES_LIST = "recent_messages"
+REDIS_GAMEROOM_EXPIRATION_SECONDS = 3600  # 1 hour, shared by the room hash and its chat, refreshed on activity
+REDIS_CHAT_MESSAGES_STREAM = "chat:main"
+REDIS_CHAT_STREAM_MAXLEN = 1000  # lobby messages kept, trimmed approximately on every XADD
+REDIS_ROOM_CHAT_STREAM_MAXLEN = 200
+REDIS_CHAT_HISTORY_BATCH = 50  # messages per history frame, on connect and per older page
+REDIS_CHAT_SHARDS_HASH = "chat:main:shards"  # lobby shard -> connected sockets
+REDIS_CHAT_SHARD_SOCKETS_HASH = "chat:main:shards:sockets"  # socket -> lobby shard
+REDIS_CHAT_SHARD_LEASES_ZSET = "chat:main:shards:leases"  # socket -> expiry of its shard membership
+REDIS_CHAT_SHARD_CAPACITY = 500  # sockets per lobby shard, a full lobby opens a new shard
+REDIS_CHAT_SHARD_LEASE_SECONDS = 60  # a socket whose worker stopped renewing its membership is dropped after that
+REDIS_CHAT_SHARD_LEASE_RENEW_SECONDS = 20
+REDIS_QUEUE_WAIT_BUCKET_SIZE = 100  # skill points per bucket of the expected matchmaking wait
+REDIS_QUEUE_WAIT_WEIGHT = 0.2  # weight of the latest wait in the moving average of its bucket
+REDIS_QUEUE_LEASE_SECONDS = 15  # a queue entry whose socket stopped renewing it is dropped after that
+REDIS_QUEUE_LEASE_RENEW_SECONDS = 5
+REDIS_ROOM_EVENT_LOG_LENGTH = 256  # moves kept per room for replay, a whole 15x15 game fits
+REDIS_ASYNC_MAX_CONNECTIONS = 50  # per worker process, consumers wait for a free connection beyond that
 
 class RedisClient:
     _instance = None
@@ -30,5 +45,26 @@ class RedisClient:
                 raise ConnectionError("Unable to connect to Redis server.") from e
         return cls._instance
 
+
+class AsyncRedisClient:
+    """
+    asyncio client used by the websocket consumers.
+    Connections are created lazily from a bounded pool, so importing this module does not touch the network.
+    """
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            pool = redis.asyncio.BlockingConnectionPool(
+                host='redis',
+                port=6379,
+                db=0,
+                decode_responses=True,
+                max_connections=REDIS_ASYNC_MAX_CONNECTIONS,
+            )
+            cls._instance = redis.asyncio.Redis(connection_pool=pool)
+        return cls._instance
+
 redis_client = RedisClient.get_instance()
-redis_client.expire('recent_messages', REDIS_CHAT_EXPIRATION_SECONDS)
+async_redis_client = AsyncRedisClient.get_instance()
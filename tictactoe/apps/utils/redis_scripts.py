@@ -0,0 +1,535 @@
+"""
+Server side Lua scripts for game room state transitions.
+
+Each transition is one atomic EVALSHA round trip. Scripts are registered once per process and
+redis-py reloads them transparently if the server lost its script cache.
+
+Room state lives in one hash per room, room:{code}:
+    ready_x, ready_o                               '1' once the player pressed ready
+    size, k, x, o, open, xIsNext, seq, winner      game state, written by the start and move scripts
+    deadline                                       when the player to move runs out of time, in ms
+Moves and finishes are compare-and-set on `seq`, so a write based on a stale read is rejected
+instead of overwriting a newer state. A hash without `seq` is a room that was never started or
+was purged: a finish is rejected there, and a move only counts as the first move of the game
+while both ready flags are set, so a timer or socket outliving its room never writes it back. Ready and move refresh the shared TTL of the room hash
+and its chat list.
+
+The move script also appends the move frame to the capped event log of the room,
+room:{code}:events, in the same transition. The log therefore holds exactly the frames of seqs
+seq - LLEN + 1 .. seq, which is what lets a reconnecting client ask for everything after the
+last seq it saw and get the missing moves instead of a full state push.
+
+The lobby chat is split into shards, one channel layer group each, so a message is never fanned
+out to every connected user from a single group key. chat:main:shards counts the sockets of each
+shard; joining takes the lowest shard with room left and opens a new one when all are full, and
+a shard is dropped from the hash when its last socket leaves. Memberships are leased like queue
+entries: chat:main:shards:sockets holds the shard of each socket and chat:main:shards:leases the
+time its membership expires, renewed by the socket while it is connected. The shard scripts first
+drop the memberships whose lease ran out, so the sockets of a worker that died without running
+disconnect stop counting against their shard.
+
+Matchmaking queues live under queue:{mode}: a sorted set of player ids scored by skill rating,
+with the host code of each player in queue:{mode}:hosts and the enqueue time in
+queue:{mode}:joined. Keyed by player id, enqueueing again is idempotent and cancelling needs no
+more than the id. The pair script queues a player unless a compatible player is already waiting,
+in which case it removes that player instead and returns them, so a player never waits on a poll
+while an opponent is queued. The enqueue time widens the skill window of a waiting player (see
+apps.api.matchmaking), and every match feeds the wait of both players into a moving average per
+skill bucket, queue:{mode}:waits. The sweep task pairs from one read of the queue and takes its
+pairs with one script call, which skips every pair of which a member was matched on enqueue in
+the meantime.
+
+Queue entries are leased: queue:{mode}:leases holds the time each entry expires, and the socket
+searching for the player renews it while it is connected. Every queue script first drops the
+entries whose lease ran out, so a player whose worker died without running disconnect is never
+paired into a room nobody joins.
+
+Inbound websocket frames are rate limited with token buckets, one hash per user and limit,
+ratelimit:{limit}:{identity}, holding the tokens left and the time they were counted. The script
+reads the clock of the Redis server, so workers with drifting clocks still share one bucket.
+"""
+
+import logging
+
+from apps.utils.redis_client import (REDIS_CHAT_SHARD_LEASE_SECONDS,
+                                     REDIS_CHAT_SHARD_LEASES_ZSET,
+                                     REDIS_CHAT_SHARD_SOCKETS_HASH,
+                                     REDIS_CHAT_SHARDS_HASH,
+                                     REDIS_QUEUE_LEASE_SECONDS,
+                                     REDIS_QUEUE_WAIT_BUCKET_SIZE,
+                                     REDIS_QUEUE_WAIT_WEIGHT,
+                                     REDIS_ROOM_EVENT_LOG_LENGTH,
+                                     async_redis_client,
+                                     redis_client)
+from apps.utils.redis_utils import queue_keys, room_key, room_keys
+
+logger = logging.getLogger("tictactoe")
+
+_CHAT_SHARD_KEYS = [REDIS_CHAT_SHARDS_HASH, REDIS_CHAT_SHARD_SOCKETS_HASH, REDIS_CHAT_SHARD_LEASES_ZSET]
+
+MOVE_APPLIED = 1
+MOVE_STALE = 0
+MOVE_GAME_OVER = -1
+
+# KEYS[1] room hash, KEYS[2] room chat list, KEYS[3] room event log
+# ARGV[1] ready field ('ready_x' or 'ready_o'), ARGV[2] ttl in seconds
+# Returns {newly_ready, ready_x, ready_o}
+READY_SCRIPT = """
+local added = redis.call('HSETNX', KEYS[1], ARGV[1], '1')
+for i = 1, 3 do
+    redis.call('EXPIRE', KEYS[i], ARGV[2])
+end
+local ready = redis.call('HMGET', KEYS[1], 'ready_x', 'ready_o')
+return {added, ready[1] and 1 or 0, ready[2] and 1 or 0}
+"""
+
+# KEYS[1] room hash, KEYS[2] room chat list, KEYS[3] room event log
+# ARGV[1] ttl in seconds, ARGV[2..] field/value pairs of the initial state
+# Returns 1 if this call started the game, 0 if it was started already
+START_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], 'seq') == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'seq', 0, unpack(ARGV, 2))
+for i = 1, 3 do
+    redis.call('EXPIRE', KEYS[i], ARGV[1])
+end
+return 1
+"""
+
+# KEYS[1] room hash, KEYS[2] room chat list, KEYS[3] room event log
+# ARGV[1] expected seq, ARGV[2] ttl in seconds, ARGV[3] move frame, ARGV[4] event log length,
+# ARGV[5..] field/value pairs of the new state
+# Returns {status, seq}: status 1 applied, 0 stale seq, -1 game already finished or room gone
+MOVE_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'seq', 'winner', 'ready_x', 'ready_o')
+if not state[1] and not (state[3] and state[4]) then
+    return {-1, 0}
+end
+local seq = tonumber(state[1] or '0')
+if state[2] and state[2] ~= '' then
+    return {-1, seq}
+end
+if seq ~= tonumber(ARGV[1]) then
+    return {0, seq}
+end
+redis.call('HSET', KEYS[1], 'seq', seq + 1, unpack(ARGV, 5))
+redis.call('RPUSH', KEYS[3], ARGV[3])
+redis.call('LTRIM', KEYS[3], -tonumber(ARGV[4]), -1)
+for i = 1, 3 do
+    redis.call('EXPIRE', KEYS[i], ARGV[2])
+end
+return {1, seq + 1}
+"""
+
+# KEYS[1] room hash
+# ARGV[1] expected seq, ARGV[2] winner
+# Returns 1 if this call finished the game, 0 if it was finished already, the seq moved on or the
+# room is gone
+FINISH_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'seq', 'winner')
+if not state[1] or (state[2] and state[2] ~= '') then
+    return 0
+end
+if tonumber(state[1]) ~= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'winner', ARGV[2])
+return 1
+"""
+
+# KEYS[1] room hash, KEYS[2] room chat list, KEYS[3] room event log
+# ARGV[1] last seq the client saw, ARGV[2] ttl in seconds
+# Returns {room hash as a flat field/value list, move frames after the last seq}, the frames being
+# false when the log no longer reaches back that far or the seq is ahead of the room
+RESUME_SCRIPT = """
+for i = 1, 3 do
+    redis.call('EXPIRE', KEYS[i], ARGV[2])
+end
+local room = redis.call('HGETALL', KEYS[1])
+local missing = tonumber(redis.call('HGET', KEYS[1], 'seq') or '0') - tonumber(ARGV[1])
+if missing < 0 or missing > redis.call('LLEN', KEYS[3]) then
+    return {room, false}
+end
+if missing == 0 then
+    return {room, {}}
+end
+return {room, redis.call('LRANGE', KEYS[3], -missing, -1)}
+"""
+
+# Shared by the lobby shard scripts, which all get the keys of _CHAT_SHARD_KEYS: the shard hash,
+# the shard of each socket and the lease of each socket
+_SHARD_LUA = """
+local function now()
+    local time = redis.call('TIME')
+    return tonumber(time[1]) + tonumber(time[2]) / 1000000
+end
+
+local function leave(socket)
+    local shard = redis.call('HGET', KEYS[2], socket)
+    if not shard then
+        return 0
+    end
+    redis.call('HDEL', KEYS[2], socket)
+    redis.call('ZREM', KEYS[3], socket)
+    if redis.call('HINCRBY', KEYS[1], shard, -1) <= 0 then
+        redis.call('HDEL', KEYS[1], shard)
+    end
+    return 1
+end
+
+local function drop_expired(time)
+    local expired = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', time)
+    for _, socket in ipairs(expired) do
+        leave(socket)
+    end
+    return #expired
+end
+"""
+
+# KEYS _CHAT_SHARD_KEYS
+# ARGV[1] sockets per shard, ARGV[2] socket, ARGV[3] lease in seconds
+# Returns the shard the socket joined, or the shard it is in already
+JOIN_SHARD_SCRIPT = _SHARD_LUA + """
+local time = now()
+drop_expired(time)
+local current = redis.call('HGET', KEYS[2], ARGV[2])
+if current then
+    return tonumber(current)
+end
+local counts = redis.call('HGETALL', KEYS[1])
+local shard
+for i = 1, #counts, 2 do
+    local id = tonumber(counts[i])
+    if tonumber(counts[i + 1]) < tonumber(ARGV[1]) and (shard == nil or id < shard) then
+        shard = id
+    end
+end
+if shard == nil then
+    shard = 0
+    while redis.call('HEXISTS', KEYS[1], shard) == 1 do
+        shard = shard + 1
+    end
+end
+redis.call('HINCRBY', KEYS[1], shard, 1)
+redis.call('HSET', KEYS[2], ARGV[2], shard)
+redis.call('ZADD', KEYS[3], time + tonumber(ARGV[3]), ARGV[2])
+return shard
+"""
+
+# KEYS _CHAT_SHARD_KEYS
+# ARGV[1] socket
+# Returns 1 if the socket left its shard, 0 if it was no member (e.g. its lease expired)
+LEAVE_SHARD_SCRIPT = _SHARD_LUA + """
+return leave(ARGV[1])
+"""
+
+# KEYS _CHAT_SHARD_KEYS
+# ARGV[1] socket, ARGV[2] its shard, ARGV[3] lease in seconds
+# Returns 1 if the lease was renewed, 0 if it had expired and the socket was counted in its shard again
+RENEW_SHARD_SCRIPT = _SHARD_LUA + """
+local time = now()
+drop_expired(time)
+local renewed = 1
+if not redis.call('HGET', KEYS[2], ARGV[1]) then
+    redis.call('HINCRBY', KEYS[1], ARGV[2], 1)
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+    renewed = 0
+end
+redis.call('ZADD', KEYS[3], time + tonumber(ARGV[3]), ARGV[1])
+return renewed
+"""
+
+# KEYS _CHAT_SHARD_KEYS
+# Returns the shards with at least one live socket
+SHARDS_SCRIPT = _SHARD_LUA + """
+drop_expired(now())
+return redis.call('HKEYS', KEYS[1])
+"""
+
+# KEYS[1] bucket hash
+# ARGV[1] tokens refilled per second, ARGV[2] bucket size
+# Returns 1 if a token was taken, 0 if the bucket is empty
+TOKEN_BUCKET_SCRIPT = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+tokens = math.min(burst, tokens + elapsed * rate / 1000)
+local taken = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    taken = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return taken
+"""
+
+# Shared by the matchmaking scripts, which all get the keys of queue_keys: time by the Redis
+# clock in seconds, removal of a queue entry, removal of the entries with an expired lease and
+# the moving average of the wait of a skill bucket
+_QUEUE_LUA = """
+local function now()
+    local time = redis.call('TIME')
+    return tonumber(time[1]) + tonumber(time[2]) / 1000000
+end
+
+local function drop(player)
+    redis.call('ZREM', KEYS[1], player)
+    redis.call('HDEL', KEYS[2], player)
+    redis.call('HDEL', KEYS[3], player)
+    redis.call('ZREM', KEYS[5], player)
+end
+
+local function drop_expired(time)
+    local expired = redis.call('ZRANGEBYSCORE', KEYS[5], '-inf', time)
+    for _, player in ipairs(expired) do
+        drop(player)
+    end
+    return #expired
+end
+
+local function skill_range(waited, base, growth, cap)
+    return math.min(base + growth * math.max(0, waited), cap)
+end
+
+local function record_wait(skill, waited, bucket_size, weight)
+    local bucket = math.floor(skill / bucket_size)
+    local average = tonumber(redis.call('HGET', KEYS[4], bucket))
+    if average then
+        waited = average + weight * (waited - average)
+    end
+    redis.call('HSET', KEYS[4], bucket, tostring(waited))
+end
+"""
+
+# KEYS queue_keys: queue sorted set, hosts, enqueue times, waits per skill bucket, leases
+# ARGV[1] player id, ARGV[2] skill rating, ARGV[3] host, ARGV[4..6] skill window base, growth
+# and cap, ARGV[7] wait bucket size, ARGV[8] wait average weight, ARGV[9] lease in seconds
+# Returns {player id, skill, enqueue time, host} of the closest waiting player whose widened range
+# covers the skill, who is removed from the queue, or false after queueing the player
+PAIR_SCRIPT = _QUEUE_LUA + """
+local player, skill = ARGV[1], tonumber(ARGV[2])
+local base, growth, cap = tonumber(ARGV[4]), tonumber(ARGV[5]), tonumber(ARGV[6])
+local time = now()
+drop_expired(time)
+if redis.call('ZSCORE', KEYS[1], player) then
+    -- Queued already, e.g. from another tab: the newest socket owns the entry, which keeps its place
+    redis.call('HSET', KEYS[2], player, ARGV[3])
+    redis.call('ZADD', KEYS[5], time + tonumber(ARGV[9]), player)
+    return false
+end
+local candidates = redis.call('ZRANGEBYSCORE', KEYS[1], skill - cap, skill + cap, 'WITHSCORES')
+local best, best_skill, best_gap, best_joined
+for i = 1, #candidates, 2 do
+    local gap = math.abs(tonumber(candidates[i + 1]) - skill)
+    local joined = tonumber(redis.call('HGET', KEYS[3], candidates[i])) or time
+    if gap <= skill_range(time - joined, base, growth, cap) and (best == nil or gap < best_gap) then
+        best, best_skill, best_gap, best_joined = candidates[i], candidates[i + 1], gap, joined
+    end
+end
+if best == nil then
+    redis.call('ZADD', KEYS[1], skill, player)
+    redis.call('HSET', KEYS[2], player, ARGV[3])
+    redis.call('HSET', KEYS[3], player, tostring(time))
+    redis.call('ZADD', KEYS[5], time + tonumber(ARGV[9]), player)
+    return false
+end
+local best_host = redis.call('HGET', KEYS[2], best)
+drop(best)
+record_wait(tonumber(best_skill), time - best_joined, tonumber(ARGV[7]), tonumber(ARGV[8]))
+record_wait(skill, 0, tonumber(ARGV[7]), tonumber(ARGV[8]))
+return {best, best_skill, tostring(best_joined), best_host}
+"""
+
+# KEYS queue_keys
+# ARGV[1] player id, ARGV[2] host of the socket leaving
+# Returns 1 if the entry was removed, 0 if it belongs to a newer socket of the player or is gone
+CANCEL_SCRIPT = _QUEUE_LUA + """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+drop(ARGV[1])
+return 1
+"""
+
+# KEYS queue_keys
+# ARGV[1] player id, ARGV[2] host of the renewing socket, ARGV[3] lease in seconds
+# Returns 1 if the lease was renewed, 0 if the player is not queued or a newer socket owns the entry
+RENEW_LEASE_SCRIPT = _QUEUE_LUA + """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+redis.call('ZADD', KEYS[5], now() + tonumber(ARGV[3]), ARGV[1])
+return 1
+"""
+
+# KEYS queue_keys
+# Returns the number of entries dropped
+EXPIRE_LEASES_SCRIPT = _QUEUE_LUA + """
+return drop_expired(now())
+"""
+
+# KEYS queue_keys
+# ARGV[1] wait bucket size, ARGV[2] wait average weight, ARGV[3..] pairs of player ids
+# Returns the 1-based numbers of the pairs removed, those of which both players were still queued
+TAKE_PAIRS_SCRIPT = _QUEUE_LUA + """
+local bucket_size, weight = tonumber(ARGV[1]), tonumber(ARGV[2])
+local time = now()
+drop_expired(time)
+local taken = {}
+for i = 3, #ARGV, 2 do
+    local skill_1 = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    local skill_2 = redis.call('ZSCORE', KEYS[1], ARGV[i + 1])
+    if skill_1 and skill_2 then
+        for j, skill in ipairs({skill_1, skill_2}) do
+            local joined = tonumber(redis.call('HGET', KEYS[3], ARGV[i + j - 1])) or time
+            record_wait(tonumber(skill), time - joined, bucket_size, weight)
+        end
+        drop(ARGV[i])
+        drop(ARGV[i + 1])
+        taken[#taken + 1] = (i - 1) / 2
+    end
+end
+return taken
+"""
+
+_SCRIPTS = {
+    'ready': READY_SCRIPT,
+    'start': START_SCRIPT,
+    'move': MOVE_SCRIPT,
+    'finish': FINISH_SCRIPT,
+    'resume': RESUME_SCRIPT,
+    'join_shard': JOIN_SHARD_SCRIPT,
+    'leave_shard': LEAVE_SHARD_SCRIPT,
+    'renew_shard': RENEW_SHARD_SCRIPT,
+    'shards': SHARDS_SCRIPT,
+    'token_bucket': TOKEN_BUCKET_SCRIPT,
+    'pair': PAIR_SCRIPT,
+    'cancel': CANCEL_SCRIPT,
+    'renew_lease': RENEW_LEASE_SCRIPT,
+    'expire_leases': EXPIRE_LEASES_SCRIPT,
+    'take_pairs': TAKE_PAIRS_SCRIPT,
+}
+_registered = {}
+
+
+def get_script(name, client=async_redis_client):
+    script = _registered.get((name, client))
+    if script is None:
+        script = _registered[name, client] = client.register_script(_SCRIPTS[name])
+    return script
+
+
+async def store_ready(room_code, player_type, ttl):
+    """ Returns (newly_ready, ready_x, ready_o). """
+    newly_ready, ready_x, ready_o = await get_script('ready')(
+        keys=room_keys(room_code),
+        args=[f'ready_{player_type}', ttl],
+    )
+    return bool(newly_ready), bool(ready_x), bool(ready_o)
+
+
+async def start_game(room_code, fields, ttl):
+    """ Stores the initial state at seq 0. Returns False if the game was started already. """
+    args = [ttl]
+    for field, value in fields.items():
+        args.extend((field, value))
+    return bool(await get_script('start')(keys=room_keys(room_code), args=args))
+
+
+async def apply_move(room_code, expected_seq, fields, frame, ttl):
+    """
+    Stores the new state and appends the encoded move frame to the event log.
+    Returns (status, seq), status being MOVE_APPLIED, MOVE_STALE or MOVE_GAME_OVER.
+    """
+    args = [expected_seq, ttl, frame, REDIS_ROOM_EVENT_LOG_LENGTH]
+    for field, value in fields.items():
+        args.extend((field, value))
+    status, seq = await get_script('move')(keys=room_keys(room_code), args=args)
+    return status, seq
+
+
+async def finish_game(room_code, expected_seq, winner):
+    return bool(await get_script('finish')(keys=[room_key(room_code)], args=[expected_seq, winner]))
+
+
+async def resume_room(room_code, last_seq, ttl):
+    """
+    Returns (room, frames): the room hash as a dict and the move frames after last_seq, oldest
+    first, or None as frames if the event log cannot fill the gap.
+    """
+    flat_room, frames = await get_script('resume')(keys=room_keys(room_code), args=[last_seq, ttl])
+    room = dict(zip(flat_room[::2], flat_room[1::2]))
+    return room, frames
+
+
+async def join_chat_shard(socket, capacity):
+    return await get_script('join_shard')(keys=_CHAT_SHARD_KEYS,
+                                          args=[capacity, socket, REDIS_CHAT_SHARD_LEASE_SECONDS])
+
+
+async def leave_chat_shard(socket):
+    return bool(await get_script('leave_shard')(keys=_CHAT_SHARD_KEYS, args=[socket]))
+
+
+async def renew_chat_shard(socket, shard):
+    """ Extends the membership of the socket, counting it in its shard again if it had expired. """
+    return bool(await get_script('renew_shard')(keys=_CHAT_SHARD_KEYS,
+                                                args=[socket, shard, REDIS_CHAT_SHARD_LEASE_SECONDS]))
+
+
+async def chat_shards():
+    """ Shards with at least one live socket, the targets of a lobby message. """
+    return sorted(int(shard) for shard in await get_script('shards')(keys=_CHAT_SHARD_KEYS))
+
+
+async def take_token(bucket_key, rate, burst):
+    return bool(await get_script('token_bucket')(keys=[bucket_key], args=[rate, burst]))
+
+
+async def add_user_to_queue(player_id, skill_rating, host, window, game_mode='1v1'):
+    """
+    Queues the player, or pairs them with the closest waiting player whose skill window, widened by
+    the time they waited, covers the player. Returns the opponent as (player data, skill rating,
+    enqueue time), None if the player was queued.
+    """
+    opponent = await get_script('pair')(
+        keys=queue_keys(game_mode),
+        args=[player_id, skill_rating, host, *window, REDIS_QUEUE_WAIT_BUCKET_SIZE, REDIS_QUEUE_WAIT_WEIGHT,
+              REDIS_QUEUE_LEASE_SECONDS],
+    )
+    if not opponent:
+        return None
+    opponent_id, skill, joined, opponent_host = opponent
+    return {'player_id': int(opponent_id), 'host': opponent_host}, float(skill), float(joined)
+
+
+async def delete_user_from_queue(player_id, host, game_mode='1v1'):
+    """ Cancels the search of the player, unless a newer socket of theirs took the entry over. """
+    await get_script('cancel')(keys=queue_keys(game_mode), args=[player_id, host])
+
+
+async def renew_queue_lease(player_id, host, game_mode='1v1'):
+    return bool(await get_script('renew_lease')(keys=queue_keys(game_mode),
+                                                args=[player_id, host, REDIS_QUEUE_LEASE_SECONDS]))
+
+
+def expire_queue_leases(pipe, game_mode='1v1'):
+    """ Sync, for the sweep task: queues the removal of the expired entries on a pipeline, ahead of its reads. """
+    get_script('expire_leases', redis_client)(keys=queue_keys(game_mode), client=pipe)
+
+
+def take_pairs(pairs, game_mode='1v1'):
+    """ Sync, for the sweep task. Removes the player id pairs still queued and returns their indexes in pairs. """
+    if not pairs:
+        return []
+    player_ids = [player_id for pair in pairs for player_id in pair]
+    taken = get_script('take_pairs', redis_client)(
+        keys=queue_keys(game_mode),
+        args=[REDIS_QUEUE_WAIT_BUCKET_SIZE, REDIS_QUEUE_WAIT_WEIGHT, *player_ids],
+    )
+    return [number - 1 for number in taken]
@@ -0,0 +1,31 @@
+from django.test import SimpleTestCase
+
+from apps.utils.redis_client import async_redis_client, redis_client
+
+
+class RedisTestCase(SimpleTestCase):
+    """
+    Runs against the test Redis. Subclasses list the keys their tests write in redis_keys,
+    which are deleted before and after every test.
+    """
+    redis_keys = ()
+
+    def setUp(self):
+        super().setUp()
+        # Every async test runs on a loop of its own, the connections of the last one are unusable.
+        async_redis_client.connection_pool.reset()
+        self.delete_redis_keys()
+
+    def tearDown(self):
+        self.delete_redis_keys()
+        super().tearDown()
+
+    def delete_redis_keys(self):
+        if self.redis_keys:
+            redis_client.delete(*self.redis_keys)
+
+    @staticmethod
+    def redis_now():
+        """ Seconds by the clock of the Redis server, which the scripts read. """
+        seconds, microseconds = redis_client.time()
+        return seconds + microseconds / 1e6
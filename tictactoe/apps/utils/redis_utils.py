@@ -1,59 +1,159 @@
 import json
 import logging
 
-from apps.utils.redis_client import redis_client
+from apps.utils.redis_client import (REDIS_CHAT_HISTORY_BATCH,
+                                     REDIS_GAMEROOM_EXPIRATION_SECONDS,
+                                     REDIS_QUEUE_LEASE_SECONDS,
+                                     REDIS_QUEUE_WAIT_BUCKET_SIZE,
+                                     async_redis_client,
+                                     redis_client)
 
 logger = logging.getLogger(__name__)
 
 """
-Client Settings
+Helper functions
 """
+def queue_key(game_mode='1v1'):
+    """ Sorted set of the ids of the searching players, scored by skill rating. """
+    return f"queue:{game_mode}"
+
+def queue_hosts_key(game_mode='1v1'):
+    """ Hash of player id -> host code of the socket searching for them. """
+    return f"queue:{game_mode}:hosts"
+
+def queue_joined_key(game_mode='1v1'):
+    """ Hash of player id -> enqueue time in seconds, by the clock of the Redis server. """
+    return f"queue:{game_mode}:joined"
+
+def queue_waits_key(game_mode='1v1'):
+    """ Hash of skill bucket -> moving average of the seconds its players waited for a match. """
+    return f"queue:{game_mode}:waits"
+
+def queue_leases_key(game_mode='1v1'):
+    """ Sorted set of player id -> time their queue entry expires unless the searching socket renews it. """
+    return f"queue:{game_mode}:leases"
+
+def queue_keys(game_mode='1v1'):
+    return (queue_key(game_mode), queue_hosts_key(game_mode), queue_joined_key(game_mode),
+            queue_waits_key(game_mode), queue_leases_key(game_mode))
+
+def room_key(room_code):
+    """ Hash with everything a live game room keeps in Redis: ready flags and the game state. """
+    return f"room:{room_code}"
 
-def set_redis_expiation(list, time=3600):
-    redis_client.expire(list, time)
+def room_chat_key(room_code):
+    return f"room:{room_code}:chat"
+
+def room_events_key(room_code):
+    """ Capped list of the move frames of a room, oldest first; the last one is the frame of the current seq. """
+    return f"room:{room_code}:events"
+
+def room_keys(room_code):
+    return room_key(room_code), room_chat_key(room_code), room_events_key(room_code)
 
 """
-Helper functions
+Game Room Lifecycle
 """
-def _generate_queue_key(game_mode='1v1'):
-    return f"game_queue_{game_mode}"
 
-def _generate_member(player_id, host):
-    return json.dumps({'player_id': player_id, 'host': host})
+async def refresh_room_ttl(room_code, time=REDIS_GAMEROOM_EXPIRATION_SECONDS):
+    async with async_redis_client.pipeline(transaction=False) as pipe:
+        for key in room_keys(room_code):
+            pipe.expire(key, time)
+        await pipe.execute()
+
+async def purge_room(room_code):
+    """ Deletes the keys of a finished room and returns the cell indexes of its logged moves, in order. """
+    try:
+        async with async_redis_client.pipeline(transaction=True) as pipe:
+            pipe.lrange(room_events_key(room_code), 0, -1)
+            pipe.delete(*room_keys(room_code))
+            frames, _ = await pipe.execute()
+        return [json.loads(frame)['index'] for frame in frames]
+    except Exception as e:
+        logger.error(f"Error purging Redis keys of room {room_code}: {e}")
+        return []
+
+def purge_rooms(room_codes):
+    """ Sync variant for Celery tasks and views, which only drop the keys. """
+    keys = [key for room_code in room_codes for key in room_keys(room_code)]
+    if not keys:
+        return
+    try:
+        redis_client.delete(*keys)
+    except Exception as e:
+        logger.error(f"Error purging Redis keys of rooms {room_codes}: {e}")
 
 """
 Search Queue Logic
+
+Enqueueing and cancelling go through scripts, see add_user_to_queue and delete_user_from_queue
+in apps.utils.redis_scripts.
 """
 
-def add_user_to_queue(player_id, skill_rating, host, game_mode='1v1'):
-    queue_key = _generate_queue_key(game_mode)
-    member = _generate_member(player_id, host)
-    redis_client.zadd(queue_key, {member: skill_rating})
+def requeue_players(pipe, players, now, game_mode='1v1'):
+    """
+    Queues on pipe the commands that put (player data, skill, joined) entries taken by the matcher back
+    with their host, enqueue time and a fresh lease, e.g. when their game room could not be created.
+    now is by the Redis clock. Only buffers commands, so the sweep and the consumers share it on sync
+    and async pipelines; the caller executes the pipeline.
+    """
+    pipe.zadd(queue_key(game_mode), {player['player_id']: skill for player, skill, _ in players})
+    pipe.hset(queue_hosts_key(game_mode), mapping={player['player_id']: player['host'] for player, _, _ in players})
+    pipe.hset(queue_joined_key(game_mode), mapping={player['player_id']: joined for player, _, joined in players})
+    pipe.zadd(queue_leases_key(game_mode), {player['player_id']: now + REDIS_QUEUE_LEASE_SECONDS for player, _, _ in players})
 
-def delete_user_from_queue(player_id, host, game_mode='1v1'):
-    queue_key = _generate_queue_key(game_mode)
-    member = _generate_member(player_id, host)
-    redis_client.zrem(queue_key, member)
+async def expected_wait(skill_rating, game_mode='1v1'):
+    """ Average seconds recent players of this skill waited for a match, None before the first match. """
+    try:
+        bucket = int(skill_rating // REDIS_QUEUE_WAIT_BUCKET_SIZE)
+        average = await async_redis_client.hget(queue_waits_key(game_mode), bucket)
+        return None if average is None else round(float(average), 1)
+    except Exception as e:
+        logger.error(f"Error reading expected wait for skill {skill_rating}: {e}")
+        return None
 
 
 """
 MainChat and GameChat Messages Logic
+
+Chats are Redis streams capped with XADD MAXLEN ~, so a busy chat never grows past its cap and
+the entry id doubles as the paging cursor.
 """
-def fetch_redis_list(list_name):
+async def store_chat_message(stream, message, sender, timestamp, maxlen):
+    """ Appends a message and returns its entry id, None if it could not be stored. """
     try:
-        messages = redis_client.lrange(list_name, 0, -1)
-        return [json.loads(message) for message in messages]
+        return await async_redis_client.xadd(stream,
+                                             {'message': message, 'sender': sender, 'timestamp': timestamp},
+                                             maxlen=maxlen, approximate=True)
     except Exception as e:
-        logger.error(f"Error retrieving messages from Redis: {e}")
-        return []
+        logger.error(f"Error storing message in Redis {stream}: {e}")
+        return None
+
+async def fetch_chat_history(stream, before=None, count=REDIS_CHAT_HISTORY_BATCH):
+    """
+    Returns (messages, cursor): up to count messages older than the entry id before (the newest ones
+    without it), oldest first, and the cursor for the page before them, None once the start is reached.
+    """
+    try:
+        # One extra entry tells whether an older page exists; the range end is inclusive, so the
+        # entry at the cursor itself is skipped.
+        entries = await async_redis_client.xrevrange(stream, max=before or '+', min='-', count=count + 2)
+    except Exception as e:
+        logger.error(f"Error retrieving messages from Redis {stream}: {e}")
+        return [], None
+
+    if before is not None and entries and entries[0][0] == before:
+        entries = entries[1:]
+    has_older = len(entries) > count
+    entries = entries[:count]
+    messages = [chat_frame(entry_id, fields) for entry_id, fields in reversed(entries)]
+    return messages, entries[-1][0] if has_older else None
 
-def store_message_in_redis_list(list_name, message, sender, timestamp):
-        try:
-            redis_client.rpush(list_name, json.dumps({
-                'type': 'chat',
-                'message': message,
-                'sender': sender,
-                'timestamp': timestamp
-            }))
-        except Exception as e:
-            logger.error(f"Error storing message in Redis {list_name}: {e}")
+def chat_frame(entry_id, fields):
+    return {
+        'type': 'chat',
+        'id': entry_id,
+        'message': fields['message'],
+        'sender': fields['sender'],
+        'timestamp': fields['timestamp'],
+    }
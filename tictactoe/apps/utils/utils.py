@@ -1,4 +1,5 @@
 import socket
+import time
 from django.utils.timezone import now
 
 
@@ -6,6 +7,10 @@ def get_current_timestamp():
     return now().strftime("%d.%m.%Y %H:%M:%S")
 
 
+def get_current_time_ms():
+    return int(time.time() * 1000)
+
+
 def get_ipaddress():
    host_name = socket.gethostname()
    ip_address = socket.gethostbyname(host_name) 
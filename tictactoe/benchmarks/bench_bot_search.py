@@ -0,0 +1,105 @@
+"""
+Event loop responsiveness while many bot games are thinking.
+
+Starts one search per game through the bot SearchService from a single event loop, as the
+consumers of one daphne worker would, and samples how late a 10 ms sleep wakes up meanwhile.
+Searches run in the service's worker processes, so the lag should stay flat however many games
+are waiting for a move; the time to answer them all grows with games / workers instead.
+--inline runs the same searches on the event loop itself, which is what a consumer calling the
+search directly would do.
+
+    python -m benchmarks.bench_bot_search --games 100 300 --level medium [--inline]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tictactoe.settings')
+django.setup()
+
+from apps.core.bots.search import SEARCH_LEVELS, SEARCH_WORKERS, SearchService, drop_table, search_move
+from apps.core.engine import Board
+
+PROBE_SECONDS = 0.01
+
+
+def _opening(size, win_length, game):
+    """ A few stones around the centre, varied per game so the transposition tables differ. """
+    board = Board(size=size, win_length=win_length)
+    center = size * size // 2
+    for step, offset in enumerate((0, 1, size, size + 1 + game % 3)):
+        board.play(center + offset, 'X' if step % 2 == 0 else 'O')
+    return board
+
+
+class _InlineService:
+    """SearchService interface, searching on the calling event loop."""
+
+    async def best_move(self, game_id, board, level):
+        await asyncio.sleep(0)
+        budget, max_depth = SEARCH_LEVELS[level]
+        return search_move(game_id, 0, board.x_bits, board.o_bits, board.size, board.win_length, budget, max_depth)
+
+    def release(self, game_id):
+        drop_table(game_id)
+
+    def shutdown(self):
+        pass
+
+
+async def _probe(stop, lags):
+    while not stop.is_set():
+        start = time.monotonic()
+        await asyncio.sleep(PROBE_SECONDS)
+        lags.append(time.monotonic() - start - PROBE_SECONDS)
+
+
+async def _measure(service, games, level, size, win_length):
+    stop, lags = asyncio.Event(), []
+    probe = asyncio.create_task(_probe(stop, lags))
+    start = time.monotonic()
+    moves = await asyncio.gather(*(service.best_move(f'bench{game}', _opening(size, win_length, game), level)
+                                   for game in range(games)))
+    elapsed = time.monotonic() - start
+    stop.set()
+    await probe
+    for game in range(games):
+        service.release(f'bench{game}')
+
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] if len(lags) > 1 else lags[-1]
+    print(f"{games:>6} {sum(move is not None for move in moves):>6} {elapsed:>9.2f} "
+          f"{statistics.median(lags) * 1e3:>9.2f} {p99 * 1e3:>9.2f} {lags[-1] * 1e3:>9.2f}")
+
+
+async def _run(args):
+    service = _InlineService() if args.inline else SearchService(workers=args.workers)
+    # Start the worker processes before measuring.
+    await service.best_move('warmup', _opening(args.size, args.win_length, 0), 'easy')
+    print(f"{'games':>6} {'moves':>6} {'seconds':>9} {'lag p50':>9} {'lag p99':>9} {'lag max':>9}  (ms)")
+    for games in args.games:
+        await _measure(service, games, args.level, args.size, args.win_length)
+    service.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--games', type=int, nargs='+', default=[100, 300])
+    parser.add_argument('--level', default='medium')
+    parser.add_argument('--size', type=int, default=15)
+    parser.add_argument('--win-length', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=SEARCH_WORKERS)
+    parser.add_argument('--inline', action='store_true', help="search on the event loop for comparison")
+    args = parser.parse_args(argv)
+    asyncio.run(_run(args))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
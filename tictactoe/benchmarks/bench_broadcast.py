@@ -0,0 +1,92 @@
+"""
+CPU cost of fanning one group event out to every member of a group.
+
+Compares the handlers the consumers used to run, which rebuilt the frame and called json.dumps in
+every receiving consumer, with the current ones that forward the text the sender encoded once.
+Both variants get the same event delivered by the channel layer; only the per member handler work
+differs, and that is what this measures (process CPU time, websocket writes stubbed out).
+
+    python -m benchmarks.bench_broadcast --members 1000 10000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tictactoe.settings')
+django.setup()
+
+from apps.core.consumers import ChatConsumer
+
+
+class _Member(ChatConsumer):
+    """ChatConsumer with the websocket write replaced by a counter."""
+
+    def __init__(self):
+        super().__init__()
+        self.sent_bytes = 0
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        self.sent_bytes += len(text_data)
+
+    async def legacy_chat_message(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'chat',
+            'message': event['message'],
+            'sender': event['sender'],
+            'timestamp': event.get('timestamp', '')
+        }))
+
+
+def _chat_frame():
+    return {
+        'type': 'chat',
+        'message': 'gg, rematch? ' * 4,
+        'sender': 'player_x',
+        'timestamp': '01.01.2025 12:00:00',
+    }
+
+
+async def _fan_out(handlers, event, rounds):
+    start = time.process_time()
+    for _ in range(rounds):
+        for handler in handlers:
+            await handler(event)
+    return (time.process_time() - start) / rounds
+
+
+async def _measure(member_count, rounds):
+    members = [_Member() for _ in range(member_count)]
+    frame = _chat_frame()
+
+    legacy_event = {'type': 'chat_message', **{key: value for key, value in frame.items() if key != 'type'}}
+    legacy = await _fan_out([member.legacy_chat_message for member in members], legacy_event, rounds)
+
+    encode_start = time.process_time()
+    event = {'type': 'chat_message', 'text': json.dumps(frame)}
+    encode = time.process_time() - encode_start
+    forwarded = await _fan_out([member.chat_message for member in members], event, rounds) + encode
+
+    for label, seconds in (('encode per member', legacy), ('encode once', forwarded)):
+        print(f"{member_count:>7} {label:<18} {seconds * 1e3:>10.2f} {seconds / member_count * 1e9:>12.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(f"{'members':>7} {'handler':<18} {'ms CPU/msg':>10} {'ns/member':>12}")
+    for member_count in args.members:
+        asyncio.run(_measure(member_count, args.rounds))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Concurrent game rooms per worker.
+
+Opens two sockets per room against GameRoomConsumer inside a single event loop (one daphne worker),
+lets every room ping-pong `acknowledgement` frames through the channel layer and reports the
+round-trip latency per room count. A room count is "sustained" while the p95 round trip stays
+below --max-p95-ms.
+
+Needs the Redis from docker-compose (the consumers touch it on connect):
+
+    python -m benchmarks.bench_consumers --rooms 50 100 250 500 1000
+
+Run it once on the commit before the asyncio consumers and once after to compare.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tictactoe.settings')
+django.setup()
+
+from django.conf import settings
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+
+from apps.core import routing
+
+
+def _build_application(layer):
+    if layer == 'memory':
+        settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+    return URLRouter(routing.websocket_urlpatterns)
+
+
+async def _connect(application, room_code):
+    communicator = WebsocketCommunicator(application, f"/ws/tictactoe-game-socket/{room_code}/")
+    connected, _ = await communicator.connect(timeout=30)
+    if not connected:
+        raise RuntimeError(f"Could not connect to room {room_code}")
+    await communicator.receive_json_from(timeout=30)  # connection_established
+    return communicator
+
+
+async def _play_room(application, room_code, rounds, latencies):
+    player_x = await _connect(application, room_code)
+    player_o = await _connect(application, room_code)
+    try:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            await player_x.send_json_to({'type': 'acknowledgement', 'player_x': 'bench_x', 'player_o': 'bench_o'})
+            await player_x.receive_json_from(timeout=60)
+            await player_o.receive_json_from(timeout=60)
+            latencies.append(time.perf_counter() - started)
+    finally:
+        await player_x.disconnect()
+        await player_o.disconnect()
+
+
+async def _run(application, rooms, rounds):
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _play_room(application, f"BENCH{index}", rounds, latencies) for index in range(rooms)
+    ))
+    elapsed = time.perf_counter() - started
+    return latencies, elapsed
+
+
+async def _benchmark(application, room_counts, rounds, max_p95_ms):
+    sustained = 0
+
+    print(f"{'rooms':>6} {'msgs/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for rooms in room_counts:
+        latencies, elapsed = await _run(application, rooms, rounds)
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+        throughput = len(latencies) * 2 / elapsed
+        print(f"{rooms:>6} {throughput:>10.0f} {p50:>8.1f} {p95:>8.1f} {latencies[-1] * 1000:>8.1f}")
+        if p95 > max_p95_ms:
+            break
+        sustained = rooms
+
+    print(f"Sustained rooms per worker (p95 <= {max_p95_ms:.0f} ms): {sustained}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, nargs='+', default=[10, 50, 100, 250, 500, 1000])
+    parser.add_argument('--rounds', type=int, default=20, help="acknowledgement round trips per room")
+    parser.add_argument('--layer', choices=('memory', 'redis'), default='memory',
+                        help="channel layer to fan out through (redis = settings.CHANNEL_LAYERS)")
+    parser.add_argument('--max-p95-ms', type=float, default=100.0)
+    args = parser.parse_args(argv)
+
+    application = _build_application(args.layer)
+    asyncio.run(_benchmark(application, args.rooms, args.rounds, args.max_p95_ms))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
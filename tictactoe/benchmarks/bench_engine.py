@@ -0,0 +1,105 @@
+"""
+Win detection microbenchmark: the list based calculate_winner the consumers used to run on every
+state message against the bitboard engine, plus the per move cost of Board.play() and the draw check that
+follows it on small and gomoku sized boards.
+
+    python -m benchmarks.bench_engine
+"""
+
+import argparse
+import random
+import sys
+import timeit
+
+from apps.core import engine
+
+
+def legacy_calculate_winner(squares):
+    winning_combination = [
+        [0, 1, 2],
+        [3, 4, 5],
+        [6, 7, 8],
+        [0, 3, 6],
+        [1, 4, 7],
+        [2, 5, 8],
+        [0, 4, 8],
+        [2, 4, 6]
+    ]
+
+    for combination in winning_combination:
+        a, b, c = combination
+        if squares[a] and squares[a] == squares[b] and squares[a] == squares[c]:
+            return squares[a]
+
+    return None
+
+
+def _random_positions(count, seed):
+    rng = random.Random(seed)
+    positions = []
+    for _ in range(count):
+        cells = list(range(engine.BOARD_CELLS))
+        rng.shuffle(cells)
+        board = engine.Board()
+        for turn, index in enumerate(cells[:rng.randint(0, engine.BOARD_CELLS)]):
+            board.play(index, 'X' if turn % 2 == 0 else 'O')
+        positions.append(board)
+    return positions
+
+
+def _random_games(size, count, seed):
+    rng = random.Random(seed)
+    games = []
+    for _ in range(count):
+        cells = list(range(size * size))
+        rng.shuffle(cells)
+        games.append(cells)
+    return games
+
+
+def _measure_moves(size, win_length, games, repeat):
+    def play_all():
+        moves = 0
+        for cells in games:
+            board = engine.Board(size=size, win_length=win_length)
+            for turn, index in enumerate(cells):
+                moves += 1
+                if board.play(index, 'X' if turn % 2 == 0 else 'O') or board.is_draw():
+                    break
+        return moves
+
+    moves = play_all()
+    best = min(timeit.repeat(play_all, number=1, repeat=repeat))
+    label = f"play() + is_draw() {size}x{size}, {win_length} in a row"
+    print(f"{label:<40} {best / moves * 1e9:>8.0f} ns/move")
+
+
+def _measure(label, func, positions, repeat):
+    best = min(timeit.repeat(lambda: [func(position) for position in positions], number=1, repeat=repeat))
+    print(f"{label:<40} {best / len(positions) * 1e9:>8.0f} ns/position")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--positions', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    boards = _random_positions(args.positions, args.seed)
+    squares = [board.to_squares() for board in boards]
+    bitboards = [(board.x_bits, board.o_bits) for board in boards]
+
+    _measure("legacy calculate_winner(squares)", legacy_calculate_winner, squares, args.repeat)
+    _measure("engine.calculate_winner(squares)", engine.calculate_winner, squares, args.repeat)
+    _measure("engine.get_winner(x, o)", lambda bits: engine.get_winner(*bits), bitboards, args.repeat)
+    _measure("engine.is_draw(x, o)", lambda bits: engine.is_draw(*bits), bitboards, args.repeat)
+
+    for size, win_length in ((3, 3), (15, 5)):
+        games = _random_games(size, max(args.positions // (size * size), 10), args.seed)
+        _measure_moves(size, win_length, games, args.repeat)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+Redis traffic and wall time of one matchmaking sweep over a large queue.
+
+Compares the loop process_queue used to run over JSON queue members, which for every pair asked
+Redis for the queue size, the lowest player and every candidate in the skill window of that
+player before removing the pair with two ZREMs, with the current sweep over player ids: one
+ZRANGE of the whole queue, one pairing pass in Python and one script call that takes every pair. Rooms are not created, only the queue work is
+measured. Both variants run on the same seeded queue in a scratch key of the compose Redis.
+
+    python -m benchmarks.bench_matchmaking --players 1000 10000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tictactoe.settings')
+django.setup()
+
+from apps.api.matchmaking import SkillWindow, pair_players
+from apps.utils.redis_client import redis_client
+from apps.utils.redis_scripts import take_pairs
+from apps.utils.redis_utils import queue_key, queue_keys
+
+GAME_MODE = 'bench'
+SKILL_RANGE = 200  # the fixed range process_queue used to run with
+
+
+def _fill_queue(player_count, seed, legacy):
+    rng = random.Random(seed)
+    key = queue_key(GAME_MODE)
+    redis_client.delete(*queue_keys(GAME_MODE))
+    members = {(json.dumps({'player_id': player_id, 'host': f"H{player_id}"}) if legacy else player_id):
+               max(0, round(rng.gauss(1000, 300)))
+               for player_id in range(player_count)}
+    for start in range(0, player_count, 5000):
+        redis_client.zadd(key, dict(list(members.items())[start:start + 5000]))
+    return key
+
+
+def legacy_sweep(key, skill_range):
+    """ The previous process_queue loop, minus the room creation. Returns (pairs, round trips). """
+    pairs = round_trips = 0
+    while True:
+        round_trips += 1
+        if redis_client.zcard(key) <= 1:
+            break
+        round_trips += 1
+        member, skill = redis_client.zrange(key, 0, 0, withscores=True)[0]
+        player = json.loads(member)
+        round_trips += 1
+        candidates = redis_client.zrangebyscore(key, skill - skill_range, skill + skill_range, withscores=True)
+        match = next((candidate for candidate, _ in candidates
+                      if json.loads(candidate)['player_id'] != player['player_id']), None)
+        if match is None:
+            break
+        round_trips += 2
+        redis_client.zrem(key, member)
+        redis_client.zrem(key, match)
+        pairs += 1
+    return pairs, round_trips
+
+
+def sweep(key, skill_range):
+    entries = redis_client.zrange(key, 0, -1, withscores=True)
+    players = [(int(player_id), skill, None) for player_id, skill in entries]
+    # A window that does not widen, so both variants pair by the same fixed range
+    window = SkillWindow(base=skill_range, growth=0, cap=skill_range)
+    pairs = pair_players(players, time.time(), window)
+    taken = take_pairs([(players[i][0], players[j][0]) for i, j in pairs], GAME_MODE)
+    return len(taken), 2
+
+
+def _measure(player_count, skill_range, seed):
+    for label, run in (('legacy loop', legacy_sweep), ('single pass', sweep)):
+        key = _fill_queue(player_count, seed, legacy=run is legacy_sweep)
+        start = time.perf_counter()
+        pairs, round_trips = run(key, skill_range)
+        seconds = time.perf_counter() - start
+        left = redis_client.zcard(key)
+        print(f"{player_count:>7} {label:<12} {seconds * 1e3:>10.1f} {round_trips:>12} {pairs:>7} {left:>7}")
+    redis_client.delete(*queue_keys(GAME_MODE))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--skill-range', type=int, default=SKILL_RANGE)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    print(f"{'players':>7} {'sweep':<12} {'ms':>10} {'round trips':>12} {'pairs':>7} {'left':>7}")
+    for player_count in args.players:
+        _measure(player_count, args.skill_range, args.seed)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,49 +8,73 @@ document.addEventListener('DOMContentLoaded', () => {
     let url = `${protocol}://${window.location.host}/ws/main-chat-socket/`;
     const chatSocket = new WebSocket(url);
 
+    let historyCursor = null;    // Stream id of the oldest message shown, null once the start is reached
+    let loadingHistory = false;
+
     chatSocket.onopen = function () {
         console.log("WebSocket is open now.");
-        chatSocket.send(JSON.stringify({ 'type': "latest_messages_request" }));
     };
 
-    chatSocket.onmessage = function (e) {
-        let data = JSON.parse(e.data);
-        console.log('Received data:', data);
-
-        if (data.type === 'chat') {
-            let messages = document.getElementById('messages');
-            let username = document.getElementById('username');
+    const renderMessage = (data) => {
+        let username = document.getElementById('username');
 
-            let timestampParts = data.timestamp.split(' ');
-            let dateParts = timestampParts[0].split('.');
-            let timeParts = timestampParts[1].split(':');
+        let timestampParts = data.timestamp.split(' ');
+        let dateParts = timestampParts[0].split('.');
+        let timeParts = timestampParts[1].split(':');
 
-            let formattedDate = `${dateParts[2]}-${dateParts[1]}-${dateParts[0]}T${timeParts[0]}:${timeParts[1]}:${timeParts[2]}`;
+        let formattedDate = `${dateParts[2]}-${dateParts[1]}-${dateParts[0]}T${timeParts[0]}:${timeParts[1]}:${timeParts[2]}`;
 
-            let timestamp = new Date(formattedDate);
-            let formattedTime;
+        let timestamp = new Date(formattedDate);
+        let formattedTime;
 
-            if (isNaN(timestamp.getTime())) {
-                console.warn('Invalid timestamp:', data.timestamp);
-                formattedTime = 'Invalid Time';
-            } else {
-                formattedTime = timestamp.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
-            }
+        if (isNaN(timestamp.getTime())) {
+            console.warn('Invalid timestamp:', data.timestamp);
+            formattedTime = 'Invalid Time';
+        } else {
+            formattedTime = timestamp.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+        }
 
-            let sender = data.sender === data.today ? '' : `<strong>${data.sender}</strong>`;
-            let rightSide = (username.value === data.sender);
-            let messageClass = rightSide ? 'message-right' : 'message-left';
+        let sender = data.sender === data.today ? '' : `<strong>${data.sender}</strong>`;
+        let rightSide = (username.value === data.sender);
+        let messageClass = rightSide ? 'message-right' : 'message-left';
 
-            messages.insertAdjacentHTML('beforeend',
-                `<div class="message ${messageClass}">
+        return `<div class="message ${messageClass}">
                     <p>${sender} [${formattedTime}]: ${data.message}</p>
-                </div>`
-            );
+                </div>`;
+    };
 
+    chatSocket.onmessage = function (e) {
+        let data = JSON.parse(e.data);
+        console.log('Received data:', data);
+        let messages = document.getElementById('messages');
+
+        if (data.type === 'chat') {
+            messages.insertAdjacentHTML('beforeend', renderMessage(data));
             messages.scrollTop = messages.scrollHeight;
+        } else if (data.type === 'chat_history') {
+            let html = data.messages.map(renderMessage).join('');
+            if (loadingHistory) {
+                // Older page: prepend it and keep the visible messages where they are
+                let previousHeight = messages.scrollHeight;
+                messages.insertAdjacentHTML('afterbegin', html);
+                messages.scrollTop += messages.scrollHeight - previousHeight;
+            } else {
+                messages.innerHTML = html;
+                messages.scrollTop = messages.scrollHeight;
+            }
+            historyCursor = data.cursor;
+            loadingHistory = false;
         }
     };
 
+    // Scrolling to the top loads the page of messages before the oldest one shown
+    document.getElementById('messages').addEventListener('scroll', (e) => {
+        if (e.target.scrollTop === 0 && historyCursor && !loadingHistory) {
+            loadingHistory = true;
+            chatSocket.send(JSON.stringify({ 'type': "chat_history_request", 'before': historyCursor }));
+        }
+    });
+
     // Form handling for chat messages
     const form = document.getElementById('main-chat-form');
     form.addEventListener('submit', (e) => {
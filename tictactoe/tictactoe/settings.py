@@ -97,10 +97,11 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'apps.api.tasks.delete_unused_gamerooms',
         'schedule': 7200.0,  # 7200 seconds = 2 hours
     },
-    'process_game_queue_every_5_seconds': {
+    # Players are paired when they enqueue, this only sweeps up what that missed
+    'sweep_game_queue_every_30_seconds': {
         'task': 'apps.api.tasks.process_queue',
-        'schedule': 5.0,
-        'args': ('1v1', 50),
+        'schedule': 30.0,
+        'args': ('1v1',),
     },
 }
 
@@ -118,6 +119,17 @@ REDIS_CONFIG = {
 }
 
 
+"""
+Rate limits of inbound websocket frames, per user (per socket for anonymous users)
+rate: tokens refilled per second, burst: bucket size,
+strikes: frames denied in a row before the socket is closed
+"""
+RATE_LIMITS = {
+    'chat': {'rate': 1, 'burst': 5, 'strikes': 20},
+    'game': {'rate': 10, 'burst': 20, 'strikes': 50},
+}
+
+
 """
 Logging configuration
 """